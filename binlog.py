@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+二进制日志解码模块
+固件只通过RTT发送格式字符串编号和原始参数，主机从固件ELF文件的格式字符串节中
+读取格式字符串，将二进制上行数据解码为文本后再转发；
+每个格式字符串在首次出现时编译为解码器并缓存
+"""
+
+import logging
+import re
+import struct
+from elf_reader import ElfFile, resolve_elf_path
+
+# 存放格式字符串的ELF节
+FORMAT_SECTION = ".rtt_fmt"
+
+# 帧头：格式字符串在节内的偏移(uint16，小端)
+FRAME_HEADER = struct.Struct("<H")
+
+# printf转换说明
+CONVERSION_PATTERN = re.compile(
+    r"%(?P<flags>[-+ #0]*)(?P<width>\d+)?(?:\.(?P<precision>\d+))?"
+    r"(?P<length>hh|h|ll|l|z|j|t|L)?(?P<conversion>[diouxXcsfFeEgGp%])"
+)
+
+# (转换字符, 长度修饰) -> struct格式字符；未列出的长度修饰按默认长度处理
+INTEGER_CODES = {
+    "signed": {"hh": "b", "h": "h", "ll": "q", None: "i"},
+    "unsigned": {"hh": "B", "h": "H", "ll": "Q", None: "I"},
+}
+FLOAT_CODES = {"l": "d", "L": "d", None: "f"}
+
+
+class CompiledFormat:
+    """编译后的格式字符串
+
+    相邻的定长参数合并为一个struct一次解包；%s参数以uint8长度加字节编码
+    """
+    def __init__(self, format_string):
+        self.format_string = format_string
+        self.steps = []  # 每项为 struct.Struct（定长参数组）或 None（字符串参数）
+        self.converters = []  # 每个参数在格式化前的转换函数，None表示不转换
+        template = []
+        codes = ""
+        position = 0
+        for match in CONVERSION_PATTERN.finditer(format_string):
+            template.append(format_string[position:match.start()].replace("%", "%%"))
+            position = match.end()
+            conversion = match.group("conversion")
+            if conversion == "%":
+                template.append("%%")
+                continue
+
+            length = match.group("length")
+            spec = "%" + match.group("flags") + (match.group("width") or "")
+            if match.group("precision") is not None:
+                spec += "." + match.group("precision")
+
+            if conversion == "s":
+                if codes:
+                    self.steps.append(struct.Struct("<" + codes))
+                    codes = ""
+                self.steps.append(None)
+                self.converters.append(None)
+                template.append(spec + "s")
+                continue
+
+            if conversion in "di":
+                codes += INTEGER_CODES["signed"].get(length, "i")
+                self.converters.append(None)
+                template.append(spec + "d")
+            elif conversion in "ouxX":
+                codes += INTEGER_CODES["unsigned"].get(length, "I")
+                self.converters.append(None)
+                template.append(spec + ("d" if conversion == "u" else conversion))
+            elif conversion == "c":
+                codes += "B"
+                self.converters.append(chr)
+                template.append(spec + "s")
+            elif conversion == "p":
+                codes += "I"
+                self.converters.append(None)
+                template.append("0x%08x")
+            else:
+                codes += FLOAT_CODES.get(length, "f")
+                self.converters.append(None)
+                template.append(spec + conversion)
+        template.append(format_string[position:].replace("%", "%%"))
+        if codes:
+            self.steps.append(struct.Struct("<" + codes))
+        self.template = "".join(template)
+        self.has_converters = any(self.converters)
+
+    def decode(self, data, position):
+        """从position开始解码参数并格式化
+
+        Returns:
+            tuple: (文本, 新位置)，数据不完整时返回None
+        """
+        args = []
+        for step in self.steps:
+            if step is None:
+                if position >= len(data):
+                    return None
+                size = data[position]
+                end = position + 1 + size
+                if end > len(data):
+                    return None
+                args.append(data[position + 1:end].decode("utf-8", errors="replace"))
+                position = end
+            else:
+                end = position + step.size
+                if end > len(data):
+                    return None
+                args.extend(step.unpack_from(data, position))
+                position = end
+
+        if self.has_converters:
+            args = [converter(arg) if converter else arg for converter, arg in zip(self.converters, args)]
+        try:
+            return self.template % tuple(args), position
+        except (TypeError, ValueError, OverflowError):
+            return f"<格式化失败: {self.format_string!r} {args!r}>", position
+
+
+def load_format_table(elf_path, section=FORMAT_SECTION):
+    """从ELF文件读取格式字符串表
+
+    Returns:
+        dict: 格式字符串在节内的偏移 -> 格式字符串
+    """
+    data = ElfFile(elf_path).section_data(section)
+    if data is None:
+        raise ValueError(f"固件文件中没有 {section} 节: {elf_path}")
+    table = {}
+    position = 0
+    while position < len(data):
+        end = data.find(b"\0", position)
+        if end < 0:
+            end = len(data)
+        if end > position:
+            table[position] = data[position:end].decode("utf-8", errors="replace")
+        position = end + 1
+    return table
+
+
+class BinaryLogDecoder:
+    def __init__(self, formats):
+        """创建二进制日志解码器，作为RTTUDPForwarder的数据处理阶段使用
+
+        Args:
+            formats: 格式字符串在节内的偏移 -> 格式字符串
+        """
+        self.formats = formats
+        self.logger = logging.getLogger(__name__)
+        self._compiled = {}  # 偏移 -> CompiledFormat，首次出现时编译
+        self._pending = b""  # 未完整接收的帧
+        self.frames = 0  # 已解码的帧数
+        self.skipped_bytes = 0  # 因编号未知而跳过的字节数，用于重新同步
+
+    @classmethod
+    def from_config(cls, config):
+        """根据配置加载固件的格式字符串表
+
+        Returns:
+            BinaryLogDecoder: 解码器，找不到固件文件或格式字符串节时返回None
+        """
+        logger = logging.getLogger(__name__)
+        elf_path = resolve_elf_path(config.elf_file_path, config.map_file_path)
+        if not elf_path:
+            logger.error("未找到固件ELF文件，请设置elf_file_path或在Map文件同一目录下放置同名的ELF文件")
+            return None
+        try:
+            formats = load_format_table(elf_path)
+        except Exception as e:
+            logger.error(f"读取格式字符串失败: {str(e)}")
+            return None
+        logger.info(f"已从 {elf_path} 加载 {len(formats)} 个格式字符串")
+        return cls(formats)
+
+    def _formatter(self, format_id):
+        """获取编译后的格式字符串，编号未知时返回None"""
+        compiled = self._compiled.get(format_id)
+        if compiled is None:
+            format_string = self.formats.get(format_id)
+            if format_string is None:
+                return None
+            compiled = CompiledFormat(format_string)
+            self._compiled[format_id] = compiled
+        return compiled
+
+    def process(self, data):
+        """解码一次读取的数据
+
+        Args:
+            data: RTT上行的二进制数据
+
+        Returns:
+            bytes: 解码后的文本，末尾不完整的帧留到下一次
+        """
+        if self._pending:
+            data = self._pending + data
+        header_size = FRAME_HEADER.size
+        output = []
+        position = 0
+        size = len(data)
+        while position + header_size <= size:
+            format_id, = FRAME_HEADER.unpack_from(data, position)
+            compiled = self._formatter(format_id)
+            if compiled is None:
+                # 编号未知，逐字节滑动直到重新同步
+                position += 1
+                self.skipped_bytes += 1
+                continue
+            result = compiled.decode(data, position + header_size)
+            if result is None:
+                break
+            text, position = result
+            output.append(text)
+            self.frames += 1
+        self._pending = data[position:]
+        return "".join(output).encode("utf-8")
+
+    def report(self):
+        """生成解码统计文本"""
+        return (f"二进制日志: 已解码 {self.frames} 帧，跳过 {self.skipped_bytes} 字节，"
+                f"已编译 {len(self._compiled)}/{len(self.formats)} 个格式字符串")
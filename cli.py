@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RTT2UDP无界面命令行程序
+不加载Tk和GUI模块，适用于无显示器的服务器、容器和systemd服务
+"""
+
+from startup_profile import profiler, PROFILE_FLAG
+import argparse
+import collections
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from config import Config, SESSION_FIELDS
+from probe_pool import ProbePool
+from session import ProbeSession
+from worker import ProcessProbeSession
+from merger import StreamMerger
+from metrics_server import MetricsServer, session_snapshot
+from profiling import SamplingProfiler, profile_path
+
+profiler.mark("imports")
+
+# 退出码
+EXIT_OK = 0
+EXIT_START_FAILED = 1
+EXIT_CONNECTION_LOST = 2
+
+# 命令行参数到配置字段的映射
+OPTION_FIELDS = {
+    "device": "target_device",
+    "interface": "debug_interface",
+    "speed": "debug_speed",
+    "rtt_addr": "rtt_ctrl_block_addr",
+    "map_file": "map_file_path",
+    "elf_file": "elf_file_path",
+    "buffer_index": "rtt_buffer_index",
+    "udp_ip": "udp_ip",
+    "udp_port": "udp_port",
+    "local_port": "local_port",
+    "polling_interval": "polling_interval",
+    "execution_mode": "execution_mode",
+}
+
+
+def sd_notify(state):
+    """向systemd发送状态通知，未在systemd下运行时忽略"""
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address or not hasattr(socket, "AF_UNIX"):
+        return
+    if address.startswith("@"):
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode("utf-8"))
+    except OSError as e:
+        logging.getLogger(__name__).debug(f"systemd通知失败: {str(e)}")
+
+
+def parse_value(text):
+    """解析 --set 的值，能按JSON解析的按JSON，否则作为字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def build_parser():
+    """创建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="rtt2udp",
+        description="RTT2UDP无界面模式：将JLink RTT数据转发到UDP",
+    )
+    parser.add_argument("-c", "--config", help="配置文件路径，默认使用系统配置目录中的config.json")
+    parser.add_argument("-s", "--serial", action="append", default=[],
+                        help="JLink序列号，可重复指定以同时运行多个会话；未指定时使用配置文件中保存的所有会话")
+    parser.add_argument("--list", action="store_true", help="列出已连接的JLink后退出")
+
+    overrides = parser.add_argument_group("配置覆盖（仅对本次运行生效）")
+    overrides.add_argument("-d", "--device", help="目标设备类型")
+    overrides.add_argument("--interface", choices=["SWD", "JTAG"], help="调试接口")
+    overrides.add_argument("--speed", help='调试速度，"auto"、"adaptive"、"calibrated"或数值(kHz)')
+    overrides.add_argument("--rtt-addr", type=lambda text: int(text, 0), help="RTT控制块地址")
+    overrides.add_argument("--map-file", help="Map文件路径，指定后使用Map文件模式")
+    overrides.add_argument("--elf-file", help="固件ELF文件路径，用于解码二进制日志")
+    overrides.add_argument("--binlog", action="store_true", help="将二进制日志解码为文本后再转发")
+    overrides.add_argument("--buffer-index", type=int, help="RTT缓冲区索引")
+    overrides.add_argument("--udp-ip", help="UDP目标IP地址")
+    overrides.add_argument("--udp-port", type=int, help="UDP目标端口")
+    overrides.add_argument("--local-port", type=int, help="本地端口，0表示自动分配")
+    overrides.add_argument("--polling-interval", type=float, help="轮询间隔，单位秒")
+    overrides.add_argument("--execution-mode", choices=["thread", "process"], help="会话执行模式")
+    overrides.add_argument("--metrics-port", type=int, help="启用指标服务并监听该端口")
+    overrides.add_argument("--trace", action="store_true", help="将数据路径追踪事件实时输出到日志")
+    overrides.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                           help="覆盖任意配置字段，值按JSON解析，可重复指定")
+    overrides.add_argument("--save", action="store_true", help="将本次覆盖的配置保存到配置文件")
+
+    runtime = parser.add_argument_group("运行")
+    runtime.add_argument("--retry-interval", type=float, default=0,
+                         help="连接丢失后重新连接的间隔秒数，0表示以退出码2退出交给服务管理器重启")
+    runtime.add_argument("--log-level", default="INFO",
+                         choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="日志级别")
+    runtime.add_argument("--log-file", help="日志文件路径，默认输出到标准错误")
+    runtime.add_argument(PROFILE_FLAG, action="store_true", help="输出启动耗时时间线")
+    return parser
+
+
+def collect_overrides(args):
+    """从命令行参数收集配置覆盖"""
+    overrides = {}
+    for option, field in OPTION_FIELDS.items():
+        value = getattr(args, option)
+        if value is not None:
+            overrides[field] = value
+    if args.metrics_port is not None:
+        overrides["metrics_enabled"] = True
+        overrides["metrics_port"] = args.metrics_port
+    if args.binlog:
+        overrides["binlog_enabled"] = True
+    if args.trace:
+        overrides["trace_tail"] = True
+    if args.map_file:
+        overrides["rtt_mode"] = "map"
+    elif args.rtt_addr is not None:
+        overrides["rtt_mode"] = "manual"
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"无效的 --set 参数: {item}，应为 KEY=VALUE")
+        overrides[key.strip()] = parse_value(value)
+    return overrides
+
+
+def setup_logging(args):
+    """配置日志输出，在journald下运行时省略时间戳"""
+    if os.environ.get("JOURNAL_STREAM"):
+        fmt = "%(levelname)s - %(name)s - %(message)s"
+    else:
+        fmt = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+    handler = logging.FileHandler(args.log_file, encoding="utf-8") if args.log_file else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(fmt))
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [handler]
+    root_logger.setLevel(args.log_level)
+
+
+class HeadlessApplication:
+    def __init__(self, config, serials, overrides, retry_interval=0):
+        self.config = config
+        self.serials = serials
+        self.overrides = overrides
+        self.retry_interval = retry_interval
+        self.logger = logging.getLogger(__name__)
+
+        self.probe_pool = ProbePool()
+        self.merger = None
+        self.sessions = {}
+        self.lost_sessions = queue.Queue()  # 连接丢失的会话，由主循环处理
+        self.pending_restarts = {}  # 序列号 -> 下次重连时间
+        self.stop_event = threading.Event()
+        self.exit_code = EXIT_OK
+        
+        # 连接丢失和重连次数，按探针序列号统计
+        self.connection_losses = collections.Counter()
+        self.reconnects = collections.Counter()
+        self.metrics_server = None
+        
+        # 性能分析请求，由信号处理函数设置，在主循环中处理
+        self.sampler = SamplingProfiler(config.profile_sample_interval)
+        self.dump_profile_requested = threading.Event()
+        self.sampling_requested = threading.Event()
+
+    def _create_session(self, serial):
+        """按配置创建会话，命令行覆盖优先于配置文件中保存的会话配置"""
+        session_config = self.config.for_session(serial)
+        for key, value in self.overrides.items():
+            setattr(session_config, key, value)
+
+        if session_config.execution_mode == "process":
+            return ProcessProbeSession(serial, session_config, self.probe_pool,
+                                       on_connection_lost=self.lost_sessions.put)
+        return ProbeSession(serial, session_config, self.probe_pool,
+                            on_connection_lost=self.lost_sessions.put, merger=self.merger)
+
+    def _start_session(self, serial):
+        """启动一个会话"""
+        session = self._create_session(serial)
+        if not session.start():
+            return False
+        self.sessions[serial] = session
+        if serial in self.connection_losses:
+            self.reconnects[serial] += 1
+        return True
+
+    def get_metrics_snapshot(self):
+        """获取指标快照，在指标服务线程中调用"""
+        return {
+            "sessions": session_snapshot(self.sessions),
+            "connection_losses": dict(self.connection_losses),
+            "reconnects": dict(self.reconnects),
+        }
+
+    def request_dump_profile(self, signum=None, frame=None):
+        """信号处理：请求输出各阶段耗时和最近的追踪事件"""
+        self.dump_profile_requested.set()
+
+    def request_sampling(self, signum=None, frame=None):
+        """信号处理：请求开始或提前结束采样分析"""
+        self.sampling_requested.set()
+
+    def _handle_profile_requests(self):
+        """处理性能分析请求"""
+        if self.dump_profile_requested.is_set():
+            self.dump_profile_requested.clear()
+            for session in self.sessions.values():
+                session.dump_profile()
+                session.dump_trace()
+        if self.sampling_requested.is_set():
+            self.sampling_requested.clear()
+            if self.sampler.running:
+                self.sampler.stop()
+                return
+            duration = self.config.profile_sample_duration
+            if self.sampler.start(profile_path(self.config, "profile"), duration):
+                # 进程模式的会话在各自的工作进程中采样
+                for serial, session in self.sessions.items():
+                    session.sample_profile(profile_path(self.config, f"profile-{serial}"), duration)
+
+    def request_stop(self, signum=None, frame=None):
+        """信号处理：请求退出"""
+        if signum is not None:
+            self.logger.info(f"收到信号 {signum}，正在停止...")
+        self.stop_event.set()
+
+    def run(self):
+        """运行直到收到退出信号或连接丢失"""
+        if self.config.merge_enabled:
+            self.merger = StreamMerger(self.config)
+            self.merger.start()
+
+        if self.config.metrics_enabled:
+            self.metrics_server = MetricsServer(self.config, self.get_metrics_snapshot)
+            self.metrics_server.start()
+
+        for serial in self.serials:
+            if not self._start_session(serial):
+                self.logger.error(f"JLink {serial} 的会话启动失败")
+                self.exit_code = EXIT_START_FAILED
+                self.shutdown()
+                return self.exit_code
+
+        profiler.mark("forwarding")
+        profiler.report()
+        sd_notify(f"READY=1\nSTATUS=正在转发 {len(self.sessions)} 个会话")
+        self.logger.info(f"已启动 {len(self.sessions)} 个会话，按Ctrl+C或发送SIGTERM停止")
+
+        watchdog_usec = int(os.environ.get("WATCHDOG_USEC", "0") or 0)
+        tick = min(1.0, watchdog_usec / 2e6) if watchdog_usec else 1.0
+
+        while not self.stop_event.wait(tick):
+            if watchdog_usec:
+                sd_notify("WATCHDOG=1")
+            self._handle_lost_sessions()
+            if self.stop_event.is_set():
+                break
+            self._retry_pending()
+            self._handle_profile_requests()
+            if self.config.trace_tail:
+                for session in self.sessions.values():
+                    session.tail_trace()
+
+        self.shutdown()
+        return self.exit_code
+
+    def _handle_lost_sessions(self):
+        """停止连接丢失的会话，按配置安排重连或退出"""
+        while True:
+            try:
+                session = self.lost_sessions.get_nowait()
+            except queue.Empty:
+                return
+            serial = session.serial_number
+            if self.sessions.get(serial) is not session:
+                continue
+            self.logger.warning(f"JLink {serial} 连接丢失，停止该会话")
+            self.connection_losses[serial] += 1
+            self.sessions.pop(serial).stop()
+
+            if self.retry_interval > 0:
+                self.pending_restarts[serial] = time.monotonic() + self.retry_interval
+            else:
+                self.exit_code = EXIT_CONNECTION_LOST
+                self.stop_event.set()
+
+    def _retry_pending(self):
+        """到期后重新连接丢失的会话"""
+        now = time.monotonic()
+        for serial, due in list(self.pending_restarts.items()):
+            if now < due:
+                continue
+            self.logger.info(f"尝试重新连接JLink {serial}...")
+            if self._start_session(serial):
+                del self.pending_restarts[serial]
+                sd_notify(f"STATUS=正在转发 {len(self.sessions)} 个会话")
+            else:
+                self.pending_restarts[serial] = now + self.retry_interval
+
+    def shutdown(self):
+        """停止所有会话并释放资源"""
+        sd_notify("STOPPING=1")
+        self.sampler.stop()
+        for session in self.sessions.values():
+            session.stop()
+        self.sessions.clear()
+        if self.merger:
+            self.merger.stop()
+            self.merger = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self.probe_pool.close_all()
+        self.logger.info("所有会话已停止")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(args)
+    logger = logging.getLogger(__name__)
+
+    config = Config(args.config)
+
+    if args.list:
+        for serial in ProbePool().connected_emulators():
+            print(serial.SerialNumber)
+        return EXIT_OK
+
+    try:
+        overrides = collect_overrides(args)
+    except ValueError as e:
+        logger.error(str(e))
+        return EXIT_START_FAILED
+
+    unknown = [key for key in overrides if not hasattr(config, key)]
+    if unknown:
+        logger.error(f"未知的配置字段: {', '.join(unknown)}")
+        return EXIT_START_FAILED
+
+    # 全局配置字段直接作用于配置，会话字段在创建会话时覆盖
+    for key, value in overrides.items():
+        if key not in SESSION_FIELDS:
+            setattr(config, key, value)
+
+    serials = [str(serial) for serial in args.serial] or list(config.sessions)
+    if not serials:
+        logger.error("未指定JLink序列号，且配置文件中没有保存的会话，请使用 --serial 指定")
+        return EXIT_START_FAILED
+
+    if args.save:
+        for serial in serials:
+            fields = config.for_session(serial).session_fields()
+            fields.update({key: value for key, value in overrides.items() if key in SESSION_FIELDS})
+            config.sessions[serial] = fields
+        config.save()
+
+    # 运行期间不改写配置文件，无界面时不需要终端数据
+    config.auto_save = False
+    config.terminal_buffer_size = 0
+
+    app = HeadlessApplication(config, serials, overrides, retry_interval=args.retry_interval)
+    signal.signal(signal.SIGINT, app.request_stop)
+    signal.signal(signal.SIGTERM, app.request_stop)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, app.request_dump_profile)
+        signal.signal(signal.SIGUSR2, app.request_sampling)
+    return app.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,19 +5,50 @@
 RTT2UDP配置文件
 """
 
+import copy
 import json
 import os
 import sys
 import logging
 from pathlib import Path
 
+# 每个探针会话可单独配置的字段
+SESSION_FIELDS = (
+    "target_device",
+    "debug_interface",
+    "debug_speed",
+    "rtt_ctrl_block_addr",
+    "rtt_buffer_index",
+    "rtt_mode",
+    "map_file_path",
+    "elf_file_path",
+    "binlog_enabled",
+    "terminal_routes",
+    "rules_file",
+    "acquisition_mode",
+    "sample_variables",
+    "sample_rate",
+    "telemetry_enabled",
+    "telemetry_layout",
+    "telemetry_sync",
+    "telemetry_ip",
+    "telemetry_port",
+    "telemetry_csv_path",
+    "telemetry_decimation",
+    "telemetry_decimated_port",
+    "udp_ip",
+    "udp_port",
+    "local_port",
+    "polling_interval",
+)
+
 class Config:
-    def __init__(self):
+    def __init__(self, config_file=None, load=True):
         # 设置应用程序名称
         self.app_name = "RTT2UDP"
         
-        # 配置文件路径
-        self.config_file = self._get_config_path()
+        # 配置文件路径，未指定时使用系统默认位置
+        self.config_file = os.path.abspath(config_file) if config_file else self._get_config_path()
         
         # 确保配置目录存在
         os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
@@ -28,7 +59,10 @@ class Config:
         # JLink配置
         self.target_device = ""  # 目标设备类型，根据实际情况修改
         self.debug_interface = "SWD"  # 可选: "SWD" 或 "JTAG"
-        self.debug_speed = "auto"  # 调试速度，可选: "auto"、"adaptive" 或具体数值(kHz)
+        self.debug_speed = "auto"  # 调试速度，可选: "auto"、"adaptive"、"calibrated" 或具体数值(kHz)
+        self.calibrated_speeds = {}  # 速度校准结果，键为 "探针序列号|目标设备"
+        self.calibration_block_size = 16384  # 速度校准每次读取的字节数，应足够大使耗时由调试时钟决定
+        self.connect_timeout = 3.0  # 连接就绪等待超时，单位秒
         
         # RTT配置
         self.rtt_ctrl_block_addr = 0  # RTT控制块地址
@@ -38,6 +72,32 @@ class Config:
         # Map文件配置
         self.map_file_path = ""  # Map文件路径
         
+        # 二进制日志配置
+        self.binlog_enabled = False  # 是否将二进制日志解码为文本后再转发
+        self.elf_file_path = ""  # 固件ELF文件路径，为空时在Map文件同一目录下查找同名文件
+        
+        # 虚拟终端配置
+        self.terminal_routes = {}  # 虚拟终端编号 -> [IP, 端口]，配置后按终端拆分上行数据，未配置的终端沿原路径转发
+        
+        # 过滤和路由规则配置
+        self.rules_file = ""  # 规则文件路径(JSON)，修改后自动重新加载，为空表示不过滤
+        
+        # 内存采样配置
+        self.acquisition_mode = "rtt"  # 数据来源，可选: "rtt" 或 "memory"(按固定频率直接读取变量)
+        self.sample_variables = []  # 采样变量，每项为 [符号名称或地址, 类型]，类型同遥测帧结构
+        self.sample_rate = 1000  # 采样频率，单位Hz
+        self.sample_merge_gap = 16  # 变量间隔不超过该字节数时合并为一次读取
+        
+        # 遥测配置
+        self.telemetry_enabled = False  # 是否将RTT通道作为定长二进制采样帧解码
+        self.telemetry_layout = []  # 帧结构，每项为 [信号名称, 类型]，类型如 "u32"、"i16"、"f32"
+        self.telemetry_sync = ""  # 每帧开头的同步标记，十六进制字符串如 "A55A"，为空表示没有同步标记
+        self.telemetry_ip = "127.0.0.1"  # 各信号数组的UDP目标IP地址
+        self.telemetry_port = 9300  # 各信号数组的UDP目标端口，0表示不发送
+        self.telemetry_csv_path = ""  # 解码后的帧追加写入的CSV文件，为空表示不写入
+        self.telemetry_decimation = 0  # 降采样窗口帧数，小于2表示不降采样
+        self.telemetry_decimated_port = 9301  # 降采样数据的UDP目标端口，IP与telemetry_ip相同
+        
         # UDP配置
         self.udp_ip = "127.0.0.1"  # UDP目标IP地址
         self.udp_port = 8888  # UDP目标端口
@@ -46,9 +106,46 @@ class Config:
         # 其他配置
         self.polling_interval = 0.001  # 轮询间隔，单位秒
         self.auto_save = True  # 是否自动保存配置
+        self.execution_mode = "thread"  # 会话执行模式，可选: "thread"(同进程线程) 或 "process"(每个探针独立进程)
+        
+        # 多探针合并流配置
+        self.merge_enabled = False  # 是否将所有会话的数据按时间合并为一路输出
+        self.merge_window_ms = 50  # 重排序窗口，单位毫秒，即合并引入的最大额外延迟
+        self.merge_sink = "udp"  # 合并流输出协议，可选: "udp" 或 "tcp"
+        self.merge_ip = "127.0.0.1"  # 合并流目标IP地址
+        self.merge_port = 8890  # 合并流目标端口
+        self.merge_prefix = True  # 是否在每行前添加 [探针序列号] 标签
+        self.merge_max_pending_lines = 20000  # 每个输入流的最大待合并行数
+        self.merge_max_line_length = 4096  # 单行最大长度，超过时强制切分
+        
+        # 指标服务配置
+        self.metrics_enabled = False  # 是否启用Prometheus格式的指标服务
+        self.metrics_host = "127.0.0.1"  # 指标服务监听地址，默认只允许本机访问
+        self.metrics_port = 9464  # 指标服务端口
+        
+        # 性能分析配置
+        self.profile_sample_interval = 0.005  # 采样分析的采样间隔，单位秒
+        self.profile_sample_duration = 10.0  # 采样分析的时长，单位秒
+        
+        # 延迟测量配置
+        self.latency_mode = False  # 是否识别并移除固件插入的延迟标记，统计各阶段延迟分布
         
-        # 尝试加载配置文件
-        self.load()
+        # 数据路径追踪配置
+        self.trace_buffer_events = 4096  # 每个会话的追踪环形缓冲区保留的事件数
+        self.trace_tail = False  # 是否将追踪事件实时输出到日志
+        self.error_log_interval = 5.0  # 相同数据路径错误的最小日志间隔，单位秒
+        
+        # RTT终端配置
+        self.terminal_buffer_size = 1048576  # 终端环形缓冲区容量，单位字节，0表示不显示终端数据
+        
+        # 多探针会话配置，键为探针序列号，值为该会话覆盖的SESSION_FIELDS字段
+        self.sessions = {}
+        self.parent = None  # 会话配置副本所属的全局配置
+        self.serial_number = None  # 会话配置副本对应的探针序列号
+        
+        # 尝试加载配置文件，工作进程的配置由控制进程传入，不读取文件
+        if load:
+            self.load()
     
     def _get_config_path(self):
         """获取配置文件路径
@@ -77,30 +174,151 @@ class Config:
         """获取搜索范围"""
         return (0, 0)
     
+    def session_fields(self):
+        """获取当前配置中可按会话覆盖的字段"""
+        return {key: getattr(self, key) for key in SESSION_FIELDS}
+    
+    def for_session(self, serial_number):
+        """生成指定探针会话使用的配置副本
+        
+        副本以当前配置为基础，叠加该探针保存的会话字段；
+        对副本的保存会写回到全局配置的sessions中。
+        """
+        session_config = copy.copy(self)
+        session_config.parent = self
+        session_config.serial_number = str(serial_number)
+        for key, value in self.sessions.get(str(serial_number), {}).items():
+            if key in SESSION_FIELDS:
+                setattr(session_config, key, value)
+        return session_config
+    
+    def to_dict(self):
+        """将配置转换为可保存的字典"""
+        return {
+            "target_device": self.target_device,
+            "debug_interface": self.debug_interface,
+            "debug_speed": self.debug_speed,
+            "connect_timeout": self.connect_timeout,
+            "calibrated_speeds": self.calibrated_speeds,
+            "calibration_block_size": self.calibration_block_size,
+            "rtt_ctrl_block_addr": self.rtt_ctrl_block_addr,
+            "rtt_buffer_index": self.rtt_buffer_index,
+            "rtt_mode": self.rtt_mode,
+            "map_file_path": self.map_file_path,
+            "binlog_enabled": self.binlog_enabled,
+            "elf_file_path": self.elf_file_path,
+            "terminal_routes": self.terminal_routes,
+            "rules_file": self.rules_file,
+            "acquisition_mode": self.acquisition_mode,
+            "sample_variables": self.sample_variables,
+            "sample_rate": self.sample_rate,
+            "sample_merge_gap": self.sample_merge_gap,
+            "telemetry_enabled": self.telemetry_enabled,
+            "telemetry_layout": self.telemetry_layout,
+            "telemetry_sync": self.telemetry_sync,
+            "telemetry_ip": self.telemetry_ip,
+            "telemetry_port": self.telemetry_port,
+            "telemetry_csv_path": self.telemetry_csv_path,
+            "telemetry_decimation": self.telemetry_decimation,
+            "telemetry_decimated_port": self.telemetry_decimated_port,
+            "udp_ip": self.udp_ip,
+            "udp_port": self.udp_port,
+            "local_port": self.local_port,
+            "polling_interval": self.polling_interval,
+            "execution_mode": self.execution_mode,
+            "merge_enabled": self.merge_enabled,
+            "merge_window_ms": self.merge_window_ms,
+            "merge_sink": self.merge_sink,
+            "merge_ip": self.merge_ip,
+            "merge_port": self.merge_port,
+            "merge_prefix": self.merge_prefix,
+            "merge_max_pending_lines": self.merge_max_pending_lines,
+            "merge_max_line_length": self.merge_max_line_length,
+            "metrics_enabled": self.metrics_enabled,
+            "metrics_host": self.metrics_host,
+            "metrics_port": self.metrics_port,
+            "profile_sample_interval": self.profile_sample_interval,
+            "profile_sample_duration": self.profile_sample_duration,
+            "latency_mode": self.latency_mode,
+            "trace_buffer_events": self.trace_buffer_events,
+            "trace_tail": self.trace_tail,
+            "error_log_interval": self.error_log_interval,
+            "terminal_buffer_size": self.terminal_buffer_size,
+            "auto_save": self.auto_save,
+            "sessions": self.sessions
+        }
+    
+    def update_from_dict(self, config_data):
+        """从字典更新配置，缺少的字段保持不变"""
+        self.target_device = config_data.get("target_device", self.target_device)
+        self.debug_interface = config_data.get("debug_interface", self.debug_interface)
+        self.debug_speed = config_data.get("debug_speed", self.debug_speed)
+        self.connect_timeout = config_data.get("connect_timeout", self.connect_timeout)
+        self.calibrated_speeds = config_data.get("calibrated_speeds", self.calibrated_speeds)
+        self.calibration_block_size = config_data.get("calibration_block_size", self.calibration_block_size)
+        self.rtt_ctrl_block_addr = config_data.get("rtt_ctrl_block_addr", self.rtt_ctrl_block_addr)
+        self.rtt_buffer_index = config_data.get("rtt_buffer_index", self.rtt_buffer_index)
+        self.rtt_mode = config_data.get("rtt_mode", self.rtt_mode)
+        self.map_file_path = config_data.get("map_file_path", self.map_file_path)
+        self.binlog_enabled = config_data.get("binlog_enabled", self.binlog_enabled)
+        self.elf_file_path = config_data.get("elf_file_path", self.elf_file_path)
+        self.terminal_routes = config_data.get("terminal_routes", self.terminal_routes)
+        self.rules_file = config_data.get("rules_file", self.rules_file)
+        self.acquisition_mode = config_data.get("acquisition_mode", self.acquisition_mode)
+        self.sample_variables = config_data.get("sample_variables", self.sample_variables)
+        self.sample_rate = config_data.get("sample_rate", self.sample_rate)
+        self.sample_merge_gap = config_data.get("sample_merge_gap", self.sample_merge_gap)
+        self.telemetry_enabled = config_data.get("telemetry_enabled", self.telemetry_enabled)
+        self.telemetry_layout = config_data.get("telemetry_layout", self.telemetry_layout)
+        self.telemetry_sync = config_data.get("telemetry_sync", self.telemetry_sync)
+        self.telemetry_ip = config_data.get("telemetry_ip", self.telemetry_ip)
+        self.telemetry_port = config_data.get("telemetry_port", self.telemetry_port)
+        self.telemetry_csv_path = config_data.get("telemetry_csv_path", self.telemetry_csv_path)
+        self.telemetry_decimation = config_data.get("telemetry_decimation", self.telemetry_decimation)
+        self.telemetry_decimated_port = config_data.get("telemetry_decimated_port", self.telemetry_decimated_port)
+        self.udp_ip = config_data.get("udp_ip", self.udp_ip)
+        self.udp_port = config_data.get("udp_port", self.udp_port)
+        self.local_port = config_data.get("local_port", self.local_port)
+        self.polling_interval = config_data.get("polling_interval", self.polling_interval)
+        self.execution_mode = config_data.get("execution_mode", self.execution_mode)
+        self.merge_enabled = config_data.get("merge_enabled", self.merge_enabled)
+        self.merge_window_ms = config_data.get("merge_window_ms", self.merge_window_ms)
+        self.merge_sink = config_data.get("merge_sink", self.merge_sink)
+        self.merge_ip = config_data.get("merge_ip", self.merge_ip)
+        self.merge_port = config_data.get("merge_port", self.merge_port)
+        self.merge_prefix = config_data.get("merge_prefix", self.merge_prefix)
+        self.merge_max_pending_lines = config_data.get("merge_max_pending_lines", self.merge_max_pending_lines)
+        self.merge_max_line_length = config_data.get("merge_max_line_length", self.merge_max_line_length)
+        self.metrics_enabled = config_data.get("metrics_enabled", self.metrics_enabled)
+        self.metrics_host = config_data.get("metrics_host", self.metrics_host)
+        self.metrics_port = config_data.get("metrics_port", self.metrics_port)
+        self.profile_sample_interval = config_data.get("profile_sample_interval", self.profile_sample_interval)
+        self.profile_sample_duration = config_data.get("profile_sample_duration", self.profile_sample_duration)
+        self.latency_mode = config_data.get("latency_mode", self.latency_mode)
+        self.trace_buffer_events = config_data.get("trace_buffer_events", self.trace_buffer_events)
+        self.trace_tail = config_data.get("trace_tail", self.trace_tail)
+        self.error_log_interval = config_data.get("error_log_interval", self.error_log_interval)
+        self.terminal_buffer_size = config_data.get("terminal_buffer_size", self.terminal_buffer_size)
+        self.auto_save = config_data.get("auto_save", self.auto_save)
+        self.sessions = config_data.get("sessions", self.sessions)
+    
     def save(self):
         """保存配置到文件"""
         self.save_config()
         
     def save_config(self):
         """保存配置到文件"""
+        if self.parent is not None:
+            # 会话配置副本只保存会话字段，由全局配置写入文件
+            self.parent.sessions[self.serial_number] = self.session_fields()
+            self.parent.save_config()
+            return
+        
         try:
             # 确保配置目录存在
             os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
             
-            config_data = {
-                "target_device": self.target_device,
-                "debug_interface": self.debug_interface,
-                "debug_speed": self.debug_speed,
-                "rtt_ctrl_block_addr": self.rtt_ctrl_block_addr,
-                "rtt_buffer_index": self.rtt_buffer_index,
-                "rtt_mode": self.rtt_mode,
-                "map_file_path": self.map_file_path,
-                "udp_ip": self.udp_ip,
-                "udp_port": self.udp_port,
-                "local_port": self.local_port,
-                "polling_interval": self.polling_interval,
-                "auto_save": self.auto_save
-            }
+            config_data = self.to_dict()
             
             with open(self.config_file, 'w', encoding="utf-8") as f:
                 json.dump(config_data, f, indent=4, ensure_ascii=False)
@@ -116,18 +334,7 @@ class Config:
                 with open(self.config_file, "r", encoding="utf-8") as f:
                     config_data = json.load(f)
                     
-                    self.target_device = config_data.get("target_device", self.target_device)
-                    self.debug_interface = config_data.get("debug_interface", self.debug_interface)
-                    self.debug_speed = config_data.get("debug_speed", self.debug_speed)
-                    self.rtt_ctrl_block_addr = config_data.get("rtt_ctrl_block_addr", self.rtt_ctrl_block_addr)
-                    self.rtt_buffer_index = config_data.get("rtt_buffer_index", self.rtt_buffer_index)
-                    self.rtt_mode = config_data.get("rtt_mode", self.rtt_mode)
-                    self.map_file_path = config_data.get("map_file_path", self.map_file_path)
-                    self.udp_ip = config_data.get("udp_ip", self.udp_ip)
-                    self.udp_port = config_data.get("udp_port", self.udp_port)
-                    self.local_port = config_data.get("local_port", self.local_port)
-                    self.polling_interval = config_data.get("polling_interval", self.polling_interval)
-                    self.auto_save = config_data.get("auto_save", self.auto_save)
+                    self.update_from_dict(config_data)
                 
                 self.logger.info(f"已从 {self.config_file} 加载配置")
             else:
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JLink支持设备目录模块
+单次遍历J-Link DLL的设备列表生成按制造商分组的设备目录，
+并以压缩的列式JSON缓存到配置目录，以DLL路径、版本、大小和修改时间作为缓存键
+"""
+
+import ctypes
+import gzip
+import json
+import logging
+import os
+import re
+
+# 缓存文件格式版本，格式变化时递增以使旧缓存失效
+CATALOG_FORMAT = 1
+
+# 缓存文件名
+CACHE_FILE_NAME = "device_catalog.json.gz"
+
+# 内核类型条目的制造商名称
+CORE_MANUFACTURER = "Unspecified"
+
+# 内核类型条目在目录中的分类名称
+CORE_CATEGORY = "内核类型"
+
+# 制造商未知时根据设备名称前缀推断
+MANUFACTURER_PREFIXES = (
+    ("STM32", "STMicroelectronics"),
+    ("nRF", "Nordic Semiconductor"),
+    ("LPC", "NXP"),
+    ("ATSAM", "Microchip"),
+)
+
+# 内核和制造商名称的分词规则
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _decode_string(value):
+    """将DLL返回的设备名称或制造商转换为字符串"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if hasattr(value, '_type_'):  # 处理ctypes字符指针
+        if not value:
+            return "-"
+        return ctypes.string_at(value).decode('utf-8', errors='replace')
+    return value
+
+
+def catalog_key(jlink):
+    """获取设备目录的缓存键，DLL被替换或升级后缓存键随之变化
+
+    Args:
+        jlink: 已加载DLL的JLink实例，无需打开探针
+
+    Returns:
+        dict: 缓存键
+    """
+    key = {"format": CATALOG_FORMAT, "dll_version": str(jlink.version)}
+    library = getattr(jlink, "_library", None)
+    path = getattr(library, "_path", None)
+    key["dll_path"] = path
+    if path and os.path.isfile(path):
+        stat = os.stat(path)
+        key["dll_size"] = stat.st_size
+        key["dll_mtime"] = int(stat.st_mtime)
+    return key
+
+
+def build_catalog(jlink, logger=None):
+    """单次遍历DLL的设备列表生成设备目录
+
+    Args:
+        jlink: 已加载DLL的JLink实例，无需打开探针
+        logger: 日志记录器
+
+    Returns:
+        dict: 制造商 -> 按名称排序的设备信息列表
+    """
+    logger = logger or logging.getLogger(__name__)
+    num_devices = jlink.num_supported_devices()
+    logger.info(f"JLink支持的设备总数: {num_devices}")
+
+    # 只读取一次DLL，内核类型映射在遍历结束后再应用
+    entries = []
+    core_map = {}  # Core值 -> 内核类型名称
+    for i in range(num_devices):
+        device_info = jlink.supported_device(i)
+        name = _decode_string(device_info.sName)
+        manufacturer = _decode_string(device_info.sManu)
+        if manufacturer == CORE_MANUFACTURER:
+            core_map[device_info.Core] = name
+        entries.append((name, manufacturer, device_info.Core, device_info.FlashSize, device_info.RAMSize))
+    logger.info(f"找到 {len(core_map)} 个内核类型映射")
+
+    devices = {}
+    for name, manufacturer, core, flash_size, ram_size in entries:
+        if manufacturer == CORE_MANUFACTURER:
+            manufacturer = CORE_CATEGORY
+        elif not manufacturer or manufacturer == "-":
+            manufacturer = next(
+                (manu for prefix, manu in MANUFACTURER_PREFIXES if name.startswith(prefix)),
+                "其他"
+            )
+
+        devices.setdefault(manufacturer, []).append({
+            'name': name,
+            'core': core_map.get(core, "-") if manufacturer != CORE_CATEGORY else "-",
+            'flash': flash_size // 1024 if flash_size else 0,  # 转换为KB
+            'ram': ram_size // 1024 if ram_size else 0  # 转换为KB
+        })
+
+    for device_list in devices.values():
+        device_list.sort(key=lambda x: x['name'])
+
+    logger.info(f"设备列表获取成功，共有 {len(devices)} 个制造商")
+    return devices
+
+
+class DeviceCatalog:
+    def __init__(self, cache_dir=None):
+        """创建设备目录
+
+        Args:
+            cache_dir: 缓存目录，None表示不使用缓存
+        """
+        self.cache_path = os.path.join(cache_dir, CACHE_FILE_NAME) if cache_dir else None
+        self.logger = logging.getLogger(__name__)
+        self.key = None  # 已加载的设备目录对应的缓存键
+
+    def load_cached(self):
+        """从缓存加载设备目录，不加载J-Link DLL
+
+        Returns:
+            dict: 设备目录，缓存不存在或无效时返回None
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with gzip.open(self.cache_path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("key", {}).get("format") != CATALOG_FORMAT:
+                return None
+
+            manufacturers = data["manufacturers"]
+            cores = data["cores"]
+            devices = {manufacturer: [] for manufacturer in manufacturers}
+            for name, manufacturer, core, flash, ram in data["devices"]:
+                devices[manufacturers[manufacturer]].append({
+                    'name': name,
+                    'core': cores[core],
+                    'flash': flash,
+                    'ram': ram
+                })
+            self.key = data["key"]
+            self.logger.info(f"已从缓存加载设备列表，共有 {len(devices)} 个制造商")
+            return devices
+        except Exception as e:
+            self.logger.warning(f"读取设备列表缓存失败: {str(e)}")
+            return None
+
+    def refresh(self):
+        """加载J-Link DLL并在DLL变化时重新生成设备目录，可在后台线程中调用
+
+        Returns:
+            dict: 新的设备目录，DLL与缓存一致时返回None
+        """
+        import pylink
+        jlink = pylink.JLink()
+        try:
+            key = catalog_key(jlink)
+            if key == self.key:
+                self.logger.info("J-Link DLL未变化，设备列表缓存有效")
+                return None
+            if self.key is not None:
+                self.logger.info(f"J-Link DLL已变化 (版本 {key['dll_version']})，重新生成设备列表")
+            devices = build_catalog(jlink, self.logger)
+        finally:
+            try:
+                jlink.close()
+            except Exception:
+                pass
+
+        self.key = key
+        self._save(key, devices)
+        return devices
+
+    def _save(self, key, devices):
+        """以列式结构保存设备目录，制造商和内核名称只保存一次"""
+        if not self.cache_path:
+            return
+        manufacturers = list(devices)
+        cores = []
+        core_index = {}
+        rows = []
+        for manufacturer_index, manufacturer in enumerate(manufacturers):
+            for device in devices[manufacturer]:
+                core = device['core']
+                if core not in core_index:
+                    core_index[core] = len(cores)
+                    cores.append(core)
+                rows.append([device['name'], manufacturer_index, core_index[core], device['flash'], device['ram']])
+
+        data = {"key": key, "manufacturers": manufacturers, "cores": cores, "devices": rows}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # 先写临时文件再替换，避免其他实例读到不完整的缓存
+            temp_path = self.cache_path + ".tmp"
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_path, self.cache_path)
+            self.logger.info(f"设备列表已缓存到: {self.cache_path}")
+        except Exception as e:
+            self.logger.error(f"保存设备列表缓存失败: {str(e)}")
+
+
+class DeviceIndex:
+    """设备目录的搜索索引
+
+    设备名称按子串匹配，使用三字母组倒排索引缩小候选范围；
+    内核和制造商按单词前缀匹配，如 "m4" 匹配 Cortex-M4、"st" 匹配 STMicroelectronics。
+    空格分隔的多个关键字需同时匹配。
+    """
+    def __init__(self, devices):
+        self.devices = devices
+        self._records = []  # (制造商, 设备信息)，序号即目录中的顺序
+        for manufacturer, device_list in devices.items():
+            for device in device_list:
+                self._records.append((manufacturer, device))
+        self._names = [device['name'].lower() for _, device in self._records]
+        self._manufacturers = [manufacturer.lower() for manufacturer, _ in self._records]
+        self._cores = [device['core'].lower() for _, device in self._records]
+
+        # 索引在第一次搜索时建立，只浏览不搜索时不需要
+        self._trigrams = None  # 三字母组 -> 设备名称包含它的记录序号列表
+        self._field_ids = None  # 小写的内核或制造商名称 -> 记录序号列表
+        self._field_words = None  # 小写的内核或制造商名称 -> 单词列表
+
+        # 上一次搜索，用于关键字延长时在上一次结果中继续筛选
+        self._last_query = None
+        self._last_ids = None
+
+    def build(self):
+        """建立索引，可在后台线程中提前调用"""
+        trigrams = {}
+        for i, name in enumerate(self._names):
+            for gram in {name[j:j + 3] for j in range(len(name) - 2)}:
+                trigrams.setdefault(gram, []).append(i)
+
+        field_ids = {}
+        for i in range(len(self._records)):
+            field_ids.setdefault(self._manufacturers[i], []).append(i)
+            if self._cores[i] != "-":
+                field_ids.setdefault(self._cores[i], []).append(i)
+
+        self._trigrams = trigrams
+        self._field_ids = field_ids
+        self._field_words = {value: _WORD_PATTERN.findall(value) for value in field_ids}
+
+    def _matching_fields(self, token):
+        """获取有单词以关键字开头的内核和制造商名称"""
+        return {
+            value for value, words in self._field_words.items()
+            if any(word.startswith(token) for word in words)
+        }
+
+    def _lookup(self, token):
+        """通过索引获取匹配单个关键字的记录序号集合"""
+        if len(token) >= 3:
+            # 从最短的倒排列表开始求交集，再逐一验证子串
+            postings = sorted(
+                (self._trigrams.get(token[j:j + 3], ()) for j in range(len(token) - 2)),
+                key=len
+            )
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(posting)
+            ids = {i for i in candidates if token in self._names[i]}
+        else:
+            # 一两个字符的关键字直接扫描小写名称
+            ids = {i for i, name in enumerate(self._names) if token in name}
+
+        for value in self._matching_fields(token):
+            ids.update(self._field_ids[value])
+        return ids
+
+    def _filter(self, ids, token):
+        """在候选记录中筛选匹配关键字的记录"""
+        fields = self._matching_fields(token)
+        return {
+            i for i in ids
+            if token in self._names[i] or self._manufacturers[i] in fields or self._cores[i] in fields
+        }
+
+    def search(self, query):
+        """搜索设备
+
+        Args:
+            query: 搜索文本
+
+        Returns:
+            dict: 制造商 -> 匹配的设备信息列表，保持目录中的顺序
+        """
+        query = query.lower()
+        tokens = query.split()
+        if not tokens:
+            self._last_query = None
+            self._last_ids = None
+            return self.devices
+
+        if self._trigrams is None:
+            self.build()
+
+        if self._last_query and query.startswith(self._last_query):
+            # 关键字延长后的结果一定是上一次结果的子集
+            ids = self._last_ids
+            remaining = tokens
+        else:
+            # 最长的关键字通常最有区分度，先用索引查找
+            tokens.sort(key=len, reverse=True)
+            ids = self._lookup(tokens[0])
+            remaining = tokens[1:]
+
+        for token in remaining:
+            if not ids:
+                break
+            ids = self._filter(ids, token)
+
+        self._last_query = query
+        self._last_ids = ids
+
+        result = {}
+        for i in sorted(ids):
+            manufacturer, device = self._records[i]
+            result.setdefault(manufacturer, []).append(device)
+        return result
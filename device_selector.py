@@ -7,12 +7,20 @@ JLink设备选择对话框
 
 import tkinter as tk
 from tkinter import ttk
-import pylink
 import tkinter.messagebox
 import logging
+import queue
+import threading
+from device_catalog import DeviceCatalog, DeviceIndex
+
+# 搜索框停止输入后执行搜索的延迟，单位毫秒
+SEARCH_DEBOUNCE_MS = 150
+
+# 搜索结果不超过该数量时自动展开所有制造商节点
+AUTO_EXPAND_LIMIT = 500
 
 class DeviceSelector(tk.Toplevel):
-    def __init__(self, parent, logger=None):
+    def __init__(self, parent, logger=None, cache_dir=None):
         super().__init__(parent)
         
         self.title("选择目标设备")
@@ -27,145 +35,64 @@ class DeviceSelector(tk.Toplevel):
         self.selected_device = None
         self.logger = logger or logging.getLogger(__name__)
         
-        # 获取JLink支持的设备列表
-        try:
-            self.jlink = pylink.JLink()
-            self.devices = self.get_supported_devices()
-        except Exception as e:
-            self.devices = {}
-            self.logger.error(f"获取设备列表失败: {str(e)}")
-            tkinter.messagebox.showerror("错误", f"获取设备列表失败: {str(e)}")
+        # 先显示缓存的设备列表，J-Link DLL的检查和设备列表的重新生成在后台线程中进行
+        self.catalog = DeviceCatalog(cache_dir)
+        self.devices = self.catalog.load_cached() or {}
+        self.index = DeviceIndex(self.devices)
+        self._catalog_results = queue.Queue()
+        self._pending_devices = {}  # 尚未插入设备节点的制造商节点 -> 设备列表
+        self._search_job = None
         
         # 创建界面
         self.create_widgets()
         
         # 填充设备列表
         self.populate_devices()
+        if not self.devices:
+            self.status_var.set("正在读取JLink支持的设备列表...")
         
         # 居中显示
         self.center_window()
-    
-    def get_supported_devices(self):
-        """获取JLink支持的设备列表"""
-        devices = {}
-        core_map = {}  # 用于存储Core值到内核类型的映射
         
+        thread = threading.Thread(target=self._refresh_catalog)
+        thread.daemon = True
+        thread.start()
+        self.after(50, self._poll_catalog)
+    
+    def _refresh_catalog(self):
+        """后台线程：检查J-Link DLL并在变化时重新生成设备目录"""
         try:
-            # 获取支持的设备数量
-            num_devices = self.jlink.num_supported_devices()
-            self.logger.info(f"JLink支持的设备总数: {num_devices}")
-            
-            # 第一遍扫描：获取所有内核类型的映射
-            for i in range(num_devices):
-                device_info = self.jlink.supported_device(i)
-                
-                # 获取设备名称
-                device_name = device_info.sName
-                if isinstance(device_name, bytes):
-                    device_name = device_name.decode('utf-8', errors='replace')
-                elif hasattr(device_name, '_type_'):  # 处理ctypes字符指针
-                    import ctypes
-                    if device_name:
-                        device_name = ctypes.string_at(device_name).decode('utf-8', errors='replace')
-                    else:
-                        device_name = "-"
-                
-                # 获取制造商信息
-                manufacturer = device_info.sManu
-                if isinstance(manufacturer, bytes):
-                    manufacturer = manufacturer.decode('utf-8', errors='replace')
-                elif hasattr(manufacturer, '_type_'):  # 处理ctypes字符指针
-                    import ctypes
-                    if manufacturer:
-                        manufacturer = ctypes.string_at(manufacturer).decode('utf-8', errors='replace')
-                    else:
-                        manufacturer = "-"
-                
-                # 如果制造商是Unspecified，说明这是内核类型
-                if manufacturer == "Unspecified":
-                    core_map[device_info.Core] = device_name
-                    self.logger.debug(f"找到内核类型映射: {device_name} -> Core={device_info.Core}")
-            
-            self.logger.info(f"找到 {len(core_map)} 个内核类型映射")
-            
-            # 第二遍扫描：处理所有设备
-            for i in range(num_devices):
-                device_info = self.jlink.supported_device(i)
-                
-                # 获取设备名称
-                device_name = device_info.sName
-                if isinstance(device_name, bytes):
-                    device_name = device_name.decode('utf-8', errors='replace')
-                elif hasattr(device_name, '_type_'):  # 处理ctypes字符指针
-                    import ctypes
-                    if device_name:
-                        device_name = ctypes.string_at(device_name).decode('utf-8', errors='replace')
-                    else:
-                        device_name = "-"
-                
-                # 获取制造商信息
-                manufacturer = device_info.sManu
-                if isinstance(manufacturer, bytes):
-                    manufacturer = manufacturer.decode('utf-8', errors='replace')
-                elif hasattr(manufacturer, '_type_'):  # 处理ctypes字符指针
-                    import ctypes
-                    if manufacturer:
-                        manufacturer = ctypes.string_at(manufacturer).decode('utf-8', errors='replace')
-                    else:
-                        manufacturer = "-"
-                
-                # 如果是内核类型设备，归类到"内核类型"分类下
-                if manufacturer == "Unspecified":
-                    manufacturer = "内核类型"
-                # 否则，如果制造商为空或未知，尝试从设备名称判断
-                elif not manufacturer or manufacturer == "-":
-                    if device_name.startswith("STM32"):
-                        manufacturer = "STMicroelectronics"
-                    elif device_name.startswith("nRF"):
-                        manufacturer = "Nordic Semiconductor"
-                    elif device_name.startswith("LPC"):
-                        manufacturer = "NXP"
-                    elif device_name.startswith("ATSAM"):
-                        manufacturer = "Microchip"
-                    else:
-                        manufacturer = "其他"
-                
-                # 获取内核类型
-                core_name = core_map.get(device_info.Core, "-")
-                if core_name == "-":
-                    self.logger.debug(f"未找到设备 {device_name} 的内核类型映射 (Core={device_info.Core})")
-                
-                # 获取Flash和RAM大小
-                flash_size = device_info.FlashSize
-                ram_size = device_info.RAMSize
-                
-                device_detail = {
-                    'name': device_name,
-                    'core': core_name if manufacturer != "内核类型" else "-",
-                    'flash': flash_size // 1024 if flash_size else 0,  # 转换为KB
-                    'ram': ram_size // 1024 if ram_size else 0  # 转换为KB
-                }
-                
-                # 将设备添加到对应的制造商类别中
-                if manufacturer not in devices:
-                    devices[manufacturer] = []
-                devices[manufacturer].append(device_detail)
-            
-            # 对每个制造商的设备列表进行排序
-            for manufacturer in devices:
-                devices[manufacturer].sort(key=lambda x: x['name'])
-            
-            self.logger.info(f"设备列表获取成功，共有 {len(devices)} 个制造商")
-            return devices
+            devices = self.catalog.refresh()
+            result = None
+            if devices is not None:
+                # 搜索索引也在后台线程中建立
+                index = DeviceIndex(devices)
+                index.build()
+                result = (devices, index)
+            self._catalog_results.put(("ok", result))
         except Exception as e:
-            self.logger.error(f"获取设备列表失败: {str(e)}")
-            tkinter.messagebox.showerror("错误", f"获取设备列表失败: {str(e)}")
-            return {}
-        finally:
-            try:
-                self.jlink.close()
-            except:
-                pass
+            self._catalog_results.put(("error", str(e)))
+    
+    def _poll_catalog(self):
+        """在主线程中接收后台线程生成的设备目录"""
+        if not self.winfo_exists():
+            return
+        try:
+            status, result = self._catalog_results.get_nowait()
+        except queue.Empty:
+            self.after(50, self._poll_catalog)
+            return
+        
+        if status == "error":
+            self.logger.error(f"获取设备列表失败: {result}")
+            if not self.devices:
+                self.status_var.set("获取设备列表失败")
+                tkinter.messagebox.showerror("错误", f"获取设备列表失败: {result}", parent=self)
+            return
+        
+        if result is not None:
+            self.devices, self.index = result
+            self.populate_devices(self.search_var.get())
     
     def create_widgets(self):
         """创建界面组件"""
@@ -181,6 +108,7 @@ class DeviceSelector(tk.Toplevel):
         # 设备树形视图
         self.tree = ttk.Treeview(self, selectmode='browse')
         self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.tree.bind("<<TreeviewOpen>>", self._on_tree_open)
         
         # 设置列
         self.tree["columns"] = ("core", "flash", "ram")
@@ -207,34 +135,65 @@ class DeviceSelector(tk.Toplevel):
         
         ttk.Button(button_frame, text="确定", command=self.on_ok).pack(side=tk.RIGHT, padx=5)
         ttk.Button(button_frame, text="取消", command=self.on_cancel).pack(side=tk.RIGHT)
+        
+        # 设备列表加载状态
+        self.status_var = tk.StringVar()
+        ttk.Label(button_frame, textvariable=self.status_var).pack(side=tk.LEFT)
     
     def populate_devices(self, search_text=""):
-        """填充设备列表"""
-        # 清空现有项目
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        """填充设备列表
         
-        # 添加制造商和设备
-        for manufacturer, device_list in self.devices.items():
-            # 过滤设备列表
-            filtered_devices = [dev for dev in device_list 
-                              if search_text.lower() in dev['name'].lower()]
-            
-            if filtered_devices:
-                manufacturer_id = self.tree.insert("", "end", text=manufacturer)
-                for device in filtered_devices:
-                    self.tree.insert(manufacturer_id, "end", text=device['name'],
-                                   values=(device['core'],
-                                          f"{device['flash']:,}" if device['flash'] else "-",
-                                          f"{device['ram']:,}" if device['ram'] else "-"))
+        只插入制造商节点，设备节点在制造商节点展开时才插入；
+        匹配的设备较少时直接展开所有制造商节点
+        """
+        result = self.index.search(search_text)
         
-        # 如果有搜索文本，展开所有节点
-        if search_text:
-            for item in self.tree.get_children():
-                self.tree.item(item, open=True)
+        # 清空现有项目
+        self.tree.delete(*self.tree.get_children())
+        self._pending_devices.clear()
+        
+        total = sum(len(device_list) for device_list in result.values())
+        expand = bool(search_text.strip()) and total <= AUTO_EXPAND_LIMIT
+        
+        # 添加制造商，设备节点按需插入
+        for manufacturer, device_list in result.items():
+            manufacturer_id = self.tree.insert("", "end", text=f"{manufacturer} ({len(device_list)})")
+            if expand:
+                self._insert_devices(manufacturer_id, device_list)
+                self.tree.item(manufacturer_id, open=True)
+            else:
+                # 占位节点使制造商节点显示展开标记
+                self.tree.insert(manufacturer_id, "end", text="...", tags=("placeholder",))
+                self._pending_devices[manufacturer_id] = device_list
+        
+        self.status_var.set(f"找到 {total} 个设备" if search_text.strip() else "")
+    
+    def _insert_devices(self, manufacturer_id, device_list):
+        """在制造商节点下插入设备节点"""
+        for device in device_list:
+            self.tree.insert(manufacturer_id, "end", text=device['name'],
+                           values=(device['core'],
+                                  f"{device['flash']:,}" if device['flash'] else "-",
+                                  f"{device['ram']:,}" if device['ram'] else "-"))
+    
+    def _on_tree_open(self, event=None):
+        """制造商节点展开时插入其设备节点"""
+        manufacturer_id = self.tree.focus()
+        device_list = self._pending_devices.pop(manufacturer_id, None)
+        if device_list is None:
+            return
+        self.tree.delete(*self.tree.get_children(manufacturer_id))
+        self._insert_devices(manufacturer_id, device_list)
     
     def on_search(self, *args):
-        """搜索框内容变化时的处理函数"""
+        """搜索框内容变化时的处理函数，连续输入时只在停顿后搜索一次"""
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DEBOUNCE_MS, self._run_search)
+    
+    def _run_search(self):
+        """执行搜索"""
+        self._search_job = None
         self.populate_devices(self.search_var.get())
     
     def on_ok(self):
@@ -243,7 +202,7 @@ class DeviceSelector(tk.Toplevel):
         if selection:
             item = self.tree.item(selection[0])
             # 如果选中的是设备而不是制造商
-            if self.tree.parent(selection[0]):
+            if self.tree.parent(selection[0]) and not self.tree.tag_has("placeholder", selection[0]):
                 self.selected_device = item["text"]
                 self.logger.info(f"已选择设备: {self.selected_device}")
                 self.destroy()
@@ -264,8 +223,14 @@ class DeviceSelector(tk.Toplevel):
         self.geometry(f"{width}x{height}+{x}+{y}")
     
     @staticmethod
-    def show_dialog(parent, logger=None):
-        """显示设备选择对话框"""
-        dialog = DeviceSelector(parent, logger)
+    def show_dialog(parent, logger=None, cache_dir=None):
+        """显示设备选择对话框
+        
+        Args:
+            parent: 父窗口
+            logger: 日志记录器
+            cache_dir: 设备列表缓存目录，None表示不使用缓存
+        """
+        dialog = DeviceSelector(parent, logger, cache_dir)
         dialog.wait_window()
         return dialog.selected_device
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ELF文件读取模块
+只解析节头表和符号表，按名称读取节内容和符号地址，支持32/64位和大小端的ELF文件
+"""
+
+import logging
+import os
+import struct
+
+# ELF标识
+ELF_MAGIC = b"\x7fELF"
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+# 不占用文件空间的节类型
+SHT_NOBITS = 8
+
+# 符号类型，只有数据对象和未指定类型的符号可作为变量
+STT_NOTYPE = 0
+STT_OBJECT = 1
+
+# 固件文件的常见扩展名，按Map文件推断ELF文件时依次尝试
+ELF_EXTENSIONS = (".elf", ".axf", ".out")
+
+
+class ElfSection:
+    """ELF节"""
+    def __init__(self, name, section_type, address, offset, size):
+        self.name = name
+        self.type = section_type
+        self.address = address
+        self.offset = offset
+        self.size = size
+
+
+class ElfFile:
+    def __init__(self, path):
+        """读取ELF文件的节头表
+
+        Args:
+            path: ELF文件路径
+
+        Raises:
+            ValueError: 不是有效的ELF文件
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = f.read()
+        self.sections = {}
+        self._symbols = None  # 符号名称 -> (地址, 大小)，首次查询时解析
+        self._parse()
+
+    def _parse(self):
+        """解析ELF头和节头表"""
+        data = self._data
+        if len(data) < 16 or data[:4] != ELF_MAGIC:
+            raise ValueError(f"不是有效的ELF文件: {self.path}")
+        elf_class = data[4]
+        if data[5] == ELFDATA2LSB:
+            endian = "<"
+        elif data[5] == ELFDATA2MSB:
+            endian = ">"
+        else:
+            raise ValueError(f"未知的ELF字节序: {data[5]}")
+
+        if elf_class == ELFCLASS32:
+            shoff, = struct.unpack_from(endian + "I", data, 0x20)
+            shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x2E)
+            section_format = struct.Struct(endian + "IIIIIIIIII")
+            # (名称偏移, 地址, 大小, 类型信息, 其他, 节序号)
+            self._symbol_format = struct.Struct(endian + "IIIBBH")
+        elif elf_class == ELFCLASS64:
+            shoff, = struct.unpack_from(endian + "Q", data, 0x28)
+            shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x3A)
+            section_format = struct.Struct(endian + "IIQQQQIIQQ")
+            # (名称偏移, 类型信息, 其他, 节序号, 地址, 大小)
+            self._symbol_format = struct.Struct(endian + "IBBHQQ")
+        else:
+            raise ValueError(f"未知的ELF类别: {elf_class}")
+
+        if not shoff or shoff + shnum * shentsize > len(data):
+            raise ValueError(f"ELF文件没有有效的节头表: {self.path}")
+
+        headers = []
+        for index in range(shnum):
+            fields = section_format.unpack_from(data, shoff + index * shentsize)
+            # (名称偏移, 类型, 地址, 文件偏移, 大小)
+            headers.append((fields[0], fields[1], fields[3], fields[4], fields[5]))
+
+        _, _, _, names_offset, names_size = headers[shstrndx]
+        names = data[names_offset:names_offset + names_size]
+        for name_offset, section_type, address, offset, size in headers:
+            end = names.find(b"\0", name_offset)
+            name = names[name_offset:end if end >= 0 else None].decode("ascii", errors="replace")
+            if name:
+                self.sections[name] = ElfSection(name, section_type, address, offset, size)
+
+    def section_data(self, name):
+        """读取节内容
+
+        Returns:
+            bytes: 节内容，节不存在或不占用文件空间时返回None
+        """
+        section = self.sections.get(name)
+        if section is None or section.type == SHT_NOBITS:
+            return None
+        return self._data[section.offset:section.offset + section.size]
+
+    def symbol(self, name):
+        """查询数据符号
+
+        Returns:
+            tuple: (地址, 大小)，符号不存在时返回None
+        """
+        if self._symbols is None:
+            self._symbols = self._parse_symbols()
+        return self._symbols.get(name)
+
+    def _parse_symbols(self):
+        """解析.symtab中的数据对象符号"""
+        symbols = {}
+        table = self.section_data(".symtab")
+        names = self.section_data(".strtab")
+        if table is None or names is None:
+            return symbols
+        symbol_format = self._symbol_format
+        is_32bit = symbol_format.size == 16
+        for offset in range(0, len(table) - symbol_format.size + 1, symbol_format.size):
+            fields = symbol_format.unpack_from(table, offset)
+            if is_32bit:
+                name_offset, address, size, info, _, section_index = fields
+            else:
+                name_offset, info, _, section_index, address, size = fields
+            if not name_offset or not section_index or (info & 0xF) not in (STT_NOTYPE, STT_OBJECT):
+                continue
+            end = names.find(b"\0", name_offset)
+            name = names[name_offset:end if end >= 0 else None].decode("ascii", errors="replace")
+            # 同名的局部符号以第一个为准
+            symbols.setdefault(name, (address, size))
+        return symbols
+
+
+def resolve_elf_path(elf_file_path, map_file_path):
+    """确定固件ELF文件路径
+
+    Args:
+        elf_file_path: 配置中指定的ELF文件路径，为空时根据Map文件推断
+        map_file_path: Map文件路径，在同一目录下查找同名的ELF文件
+
+    Returns:
+        str: ELF文件路径，找不到时返回None
+    """
+    if elf_file_path:
+        return elf_file_path if os.path.isfile(elf_file_path) else None
+    if not map_file_path:
+        return None
+    base = os.path.splitext(map_file_path)[0]
+    for extension in ELF_EXTENSIONS:
+        if os.path.isfile(base + extension):
+            logging.getLogger(__name__).info(f"根据Map文件使用固件文件: {base + extension}")
+            return base + extension
+    return None
@@ -8,7 +8,13 @@
 
 import time
 import logging
+import queue
 import threading
+from profiling import SpanHistogram
+from latency import LatencyTracker
+
+# UDP接收等待超时，单位秒，也是终端输入排队后等待写入的最长时间
+RECEIVE_TIMEOUT = 0.02
 
 class RTTUDPForwarder:
     def __init__(self, rtt_manager, udp_manager, config):
@@ -21,6 +27,52 @@ class RTTUDPForwarder:
         self.data_buffer = bytearray()
         self.buffer_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        
+        # 转发统计，各计数只由一个线程写入
+        self.bytes_read = 0
+        self.bytes_sent = 0
+        self.datagrams_sent = 0
+        self.send_errors = 0
+        
+        # 数据旁路监听器，在读取线程中以 (数据, 单调时钟时间戳) 调用，不得阻塞
+        self.taps = []
+        
+        # 数据处理阶段，在读取线程中依次调用process(数据)，返回值替代原数据转发和通知旁路监听器；
+        # 阶段可提供flush()，读取线程空闲时调用，返回缓存超时后应输出的数据
+        self.stages = []
+        
+        # 转发各阶段耗时，单位纳秒
+        self.spans = {
+            "taps": SpanHistogram(),  # 调用旁路监听器
+            "buffer_append": SpanHistogram(),  # 读取线程等待锁并追加到发送缓冲区
+            "send_lock_wait": SpanHistogram(),  # 发送线程等待缓冲区锁，只统计取出了数据的轮次
+            "send_copy": SpanHistogram(),  # 发送线程取出缓冲区数据
+        }
+        
+        # 延迟测量模式，记录每个数据块的读取和发送时间
+        self.latency = LatencyTracker() if config.latency_mode else None
+        self.pending_chunks = []  # 发送缓冲区中各数据块的 (读取开始, 读取完成, 固件到读取延迟列表)
+    
+    @property
+    def pending_bytes(self):
+        """发送缓冲区中等待发送的字节数"""
+        return len(self.data_buffer)
+    
+    def add_tap(self, callback):
+        """添加数据旁路监听器"""
+        self.taps = self.taps + [callback]
+    
+    def remove_tap(self, callback):
+        """移除数据旁路监听器"""
+        self.taps = [tap for tap in self.taps if tap is not callback]
+    
+    def add_stage(self, stage):
+        """添加数据处理阶段"""
+        self.stages = self.stages + [stage]
+    
+    def remove_stage(self, stage):
+        """移除数据处理阶段"""
+        self.stages = [item for item in self.stages if item is not stage]
     
     def start(self):
         """启动转发"""
@@ -67,50 +119,122 @@ class RTTUDPForwarder:
         # 清空缓冲区
         with self.buffer_lock:
             self.data_buffer = bytearray()
+            self.pending_chunks = []
         
         self.logger.info("RTT到UDP转发服务已停止")
     
     def _read_loop(self):
         """读取数据的循环"""
+        latency = self.latency
         try:
             while self.running:
                 # 读取RTT数据
+                if latency:
+                    read_start = time.perf_counter_ns()
                 data = self.rtt_manager.read_data()
                 
+                if data and latency:
+                    # 移除延迟标记，只含标记的数据块不参与统计
+                    read_end = time.perf_counter_ns()
+                    data, transits = latency.extract(data, read_end)
+                    if not data:
+                        continue
+                
                 if data:
-                    # 将数据添加到缓冲区
-                    with self.buffer_lock:
-                        self.data_buffer.extend(data)
+                    self.bytes_read += len(data)
+                    
+                    # 依次经过数据处理阶段，阶段可能缓存不完整的数据而暂不输出
+                    for stage in self.stages:
+                        data = stage.process(data)
+                    if data:
+                        self._publish(data, (read_start, read_end, transits) if latency else None)
                     
                     # 如果有数据，立即继续读取，不等待
                     continue
                 
-                # 短暂休眠以避免CPU占用过高
-                time.sleep(self.config.polling_interval)
+                # 空闲时取出各阶段缓存超时的数据，如规则阶段中不以换行结尾的提示符
+                if self.stages:
+                    data = self._flush_stages()
+                    if data:
+                        self._publish(data, None)
+                
+                # 短暂休眠以避免CPU占用过高，目标暂停时降为心跳频率
+                time.sleep(self.rtt_manager.get_idle_interval())
         except Exception as e:
             self.logger.error(f"数据读取过程中发生错误: {str(e)}")
             self.running = False
     
+    def _flush_stages(self):
+        """依次取出各阶段缓存超时的数据，前面阶段输出的数据继续经过后面的阶段"""
+        data = b""
+        for stage in self.stages:
+            if data:
+                data = stage.process(data)
+            flush = getattr(stage, "flush", None)
+            if flush:
+                data += flush()
+        return data
+    
+    def _publish(self, data, chunk):
+        """通知旁路监听器并将数据添加到发送缓冲区
+        
+        Args:
+            data: 经过数据处理阶段后的数据
+            chunk: 延迟测量模式下数据块的 (读取开始, 读取完成, 固件到读取延迟列表)，否则为None
+        """
+        # 通知旁路监听器
+        if self.taps:
+            span_start = time.perf_counter_ns()
+            timestamp = time.monotonic()
+            for tap in self.taps:
+                tap(data, timestamp)
+            self.spans["taps"].record(time.perf_counter_ns() - span_start)
+        
+        # 将数据添加到缓冲区
+        span_start = time.perf_counter_ns()
+        with self.buffer_lock:
+            self.data_buffer.extend(data)
+            if chunk:
+                self.pending_chunks.append(chunk)
+        self.spans["buffer_append"].record(time.perf_counter_ns() - span_start)
+    
     def _send_loop(self):
         """发送数据的循环"""
+        latency = self.latency
         try:
             last_send_time = time.time()
             
             while self.running:
                 current_time = time.time()
                 buffer_to_send = None
+                chunks = None
                 
                 # 检查是否有数据需要发送
+                span_start = time.perf_counter_ns()
                 with self.buffer_lock:
+                    locked = time.perf_counter_ns()
                     if len(self.data_buffer) > 0:
                         # 如果缓冲区超过阈值或距离上次发送超过时间阈值，则发送数据
                         if len(self.data_buffer) >= 8192 or (current_time - last_send_time) >= 0.005:
                             buffer_to_send = bytes(self.data_buffer)
                             self.data_buffer = bytearray()
+                            chunks = self.pending_chunks
+                            self.pending_chunks = []
+                if buffer_to_send:
+                    # 空闲轮次不记录，否则直方图被空闲采样占满，反映不出实际的锁竞争
+                    self.spans["send_lock_wait"].record(locked - span_start)
+                    self.spans["send_copy"].record(time.perf_counter_ns() - locked)
                 
                 # 发送数据
                 if buffer_to_send:
-                    self.udp_manager.send_data(buffer_to_send)
+                    send_start = time.perf_counter_ns()
+                    if self.udp_manager.send_data(buffer_to_send):
+                        self.bytes_sent += len(buffer_to_send)
+                        self.datagrams_sent += 1
+                        if latency:
+                            latency.complete(chunks, locked, send_start, time.perf_counter_ns())
+                    else:
+                        self.send_errors += 1
                     last_send_time = time.time()
                 
                 # 短暂休眠以避免CPU占用过高
@@ -130,6 +254,14 @@ class UDPRTTForwarder:
         self.data_buffer = bytearray()
         self.buffer_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        
+        # 其他线程提交的下行数据（如终端输入），由接收线程统一写入RTT，RTT写入只有这一个调用线程
+        self.pending_writes = queue.Queue()
+        
+        # 转发统计
+        self.bytes_received = 0
+        self.datagrams_received = 0
+        self.write_errors = 0
     
     def start(self):
         """启动UDP到RTT转发"""
@@ -146,6 +278,17 @@ class UDPRTTForwarder:
         self.logger.info("UDP到RTT转发服务已启动")
         return True
     
+    def submit(self, data):
+        """提交要写入RTT下行通道的数据，不等待写入完成
+        
+        Returns:
+            bool: 是否已加入写入队列
+        """
+        if not self.running or not data:
+            return False
+        self.pending_writes.put(data)
+        return True
+    
     def stop(self):
         """停止UDP到RTT转发"""
         if not self.running:
@@ -165,6 +308,7 @@ class UDPRTTForwarder:
         # 清空缓冲区
         with self.buffer_lock:
             self.data_buffer = bytearray()
+        self.pending_writes = queue.Queue()
         
         self.logger.info("UDP到RTT转发服务已停止")
     
@@ -172,17 +316,32 @@ class UDPRTTForwarder:
         """接收UDP数据并转发到RTT的循环"""
         try:
             while self.running:
+                # 先写入其他线程提交的数据
+                self._drain_pending_writes()
+                
                 # 接收UDP数据
-                data = self.udp_manager.receive_data(timeout=0.1)
+                data = self.udp_manager.receive_data(timeout=RECEIVE_TIMEOUT)
                 
                 if data:
-                    # 将数据写入RTT
-                    success = self.rtt_manager.write(data)
-                    if not success:
-                        self.logger.warning("写入RTT数据失败")
+                    self.bytes_received += len(data)
+                    self.datagrams_received += 1
+                    
+                    # 将数据写入RTT，失败原因由RTT管理器限流输出
+                    if not self.rtt_manager.write(data):
+                        self.write_errors += 1
                 
                 # 短暂休眠以避免CPU占用过高
                 time.sleep(0.001)
         except Exception as e:
             self.logger.error(f"UDP接收过程中发生错误: {str(e)}")
             self.running = False
+    
+    def _drain_pending_writes(self):
+        """将写入队列中的数据依次写入RTT"""
+        while True:
+            try:
+                data = self.pending_writes.get_nowait()
+            except queue.Empty:
+                return
+            if not self.rtt_manager.write(data):
+                self.write_errors += 1
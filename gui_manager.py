@@ -8,35 +8,94 @@ GUI管理器模块
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
+import codecs
 import logging
 import queue
 import os
-from device_selector import DeviceSelector
+import re
+import time
+from startup_profile import profiler
+from stats import StatsHistory, format_rate
 from rtt_manager import extract_rtt_address_from_map
 
+# 日志队列容量，超出后丢弃新日志，避免日志突发时阻塞或拖慢产生日志的转发线程
+LOG_QUEUE_SIZE = 5000
+
+# 日志刷新间隔，单位毫秒
+LOG_REFRESH_INTERVAL_MS = 100
+
+# 每次刷新渲染日志的时间预算，单位秒，剩余日志留到下一次刷新
+LOG_RENDER_BUDGET = 0.02
+
+# 日志级别对应的显示标签
+LOG_LEVEL_TAGS = (
+    (logging.ERROR, "error"),
+    (logging.WARNING, "warning"),
+    (logging.INFO, "info"),
+)
+
+# 终端刷新间隔，单位毫秒
+TERMINAL_REFRESH_INTERVAL_MS = 50
+
+# 终端每次刷新最多渲染的字节数，数据更快时跳过被环形缓冲区覆盖的部分
+TERMINAL_FRAME_BYTES = 32768
+
+# 终端最大保留行数
+TERMINAL_MAX_LINES = 2000
+
+# 切换终端会话时显示的历史数据字节数
+TERMINAL_BACKLOG_BYTES = 16384
+
+# ANSI控制序列，终端中不解释颜色和光标控制，直接去除
+ANSI_ESCAPE_PATTERN = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+# 统计面板采样间隔，单位毫秒
+STATS_REFRESH_INTERVAL_MS = 500
+
+# 统计面板趋势图，(指标名称, 标题, 数值格式)
+SPARKLINES = (
+    ("rtt_read_rate", "RTT读取", format_rate),
+    ("udp_receive_rate", "UDP接收", format_rate),
+    ("buffer_fill", "缓冲区占用", lambda value: f"{value:.0f}%"),
+    ("probe_latency_avg", "探针延迟", lambda value: f"{value:.2f} ms"),
+)
+
 class QueueHandler(logging.Handler):
-    """日志队列处理器"""
+    """日志队列处理器，队列满时丢弃日志并计数"""
     def __init__(self, log_queue):
         super().__init__()
         self.log_queue = log_queue
+        self.dropped = 0  # 只由产生日志的线程递增，界面只读取
 
     def emit(self, record):
-        self.log_queue.put(record)
+        try:
+            self.log_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 class GUIManager:
-    def __init__(self, root, config, on_start, on_stop):
+    def __init__(self, root, config, on_start, on_stop, on_calibrate=None, probe_pool=None,
+                 on_terminal_input=None, stats_provider=None, on_dump_diagnostics=None,
+                 on_toggle_sampling=None, sampling_active=None):
         self.root = root
         self.config = config
         self.on_start = on_start
         self.on_stop = on_stop
+        self.on_calibrate = on_calibrate
+        self.probe_pool = probe_pool
+        self.on_terminal_input = on_terminal_input
+        self.stats_provider = stats_provider  # 返回 {探针序列号: 会话累计统计} 的回调函数
+        self.on_dump_diagnostics = on_dump_diagnostics
+        self.on_toggle_sampling = on_toggle_sampling  # 返回采样分析是否正在运行
+        self.sampling_active = sampling_active  # 返回采样分析是否正在运行的回调函数
         
         # 设置窗口
         self.root.title("RTT2UDP 转换器")
-        self.root.geometry("800x700")  # 增加窗口高度
-        self.root.minsize(800, 700)    # 增加最小窗口高度
+        self.root.geometry("800x820")  # 增加窗口高度
+        self.root.minsize(800, 820)    # 增加最小窗口高度
         
         # 创建日志队列和处理器
-        self.log_queue = queue.Queue()
+        self.log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
         self.queue_handler = QueueHandler(self.log_queue)
         self.queue_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
         
@@ -47,12 +106,37 @@ class GUIManager:
         # 日志窗口配置
         self.max_log_lines = 1000  # 最大日志行数
         self.current_log_lines = 0  # 当前日志行数
+        self.shown_dropped = 0  # 界面上已显示的丢弃日志数
+        
+        # 运行中的会话数
+        self.session_count = 0
+        
+        # RTT终端数据源，键为探针序列号，值为会话的终端环形缓冲区
+        self.terminal_sources = {}
+        self.terminal_serial = None
+        self.terminal_cursor = 0
+        self.terminal_decoder = None
+        self.terminal_lines = 0
+        self.terminal_skipped = 0
+        
+        # 各会话的统计采样历史
+        self.stats_histories = {}
         
         # 创建UI组件
         self._create_ui()
         
         # 启动日志处理
         self._start_log_processing()
+        self.root.after(TERMINAL_REFRESH_INTERVAL_MS, self._process_terminal)
+        self.root.after(STATS_REFRESH_INTERVAL_MS, self._process_stats)
+        
+        # 窗口显示后再加载JLink DLL并枚举探针，避免拖慢首个窗口的显示
+        self.root.after_idle(self._on_window_shown)
+    
+    def _on_window_shown(self):
+        """首个窗口显示后的初始化"""
+        profiler.mark("window")
+        self.root.after(50, self._refresh_jlink_devices)
     
     def _create_ui(self):
         """创建用户界面"""
@@ -69,8 +153,15 @@ class GUIManager:
         # 控制按钮
         self._create_control_section(main_frame)
         
-        # 日志区域
-        self._create_log_section(main_frame)
+        # 会话列表
+        self._create_session_section(main_frame)
+        
+        # 日志和RTT终端
+        self.output_notebook = ttk.Notebook(main_frame)
+        self.output_notebook.pack(fill=tk.BOTH, expand=True, pady=5)
+        self._create_log_section(self.output_notebook)
+        self._create_terminal_section(self.output_notebook)
+        self._create_stats_section(self.output_notebook)
     
     def _create_variables(self):
         """创建所有UI变量"""
@@ -104,6 +195,7 @@ class GUIManager:
         # 其他配置
         self.polling_interval_var = tk.DoubleVar(value=self.config.polling_interval)
         self.auto_save_var = tk.BooleanVar(value=self.config.auto_save)
+        self.process_mode_var = tk.BooleanVar(value=self.config.execution_mode == "process")
         
         # 状态
         self.status_var = tk.StringVar(value="就绪")
@@ -142,6 +234,7 @@ class GUIManager:
             width=30
         )
         self.jlink_device_combo.pack(side=tk.LEFT, padx=5)
+        self.jlink_device_combo.bind("<<ComboboxSelected>>", self._on_jlink_selected)
         
         ttk.Button(
             device_frame,
@@ -196,7 +289,7 @@ class GUIManager:
         
         ttk.Label(speed_frame, text="调试速度:").pack(side=tk.LEFT)
         speed_values = [
-            "auto", "adaptive",
+            "auto", "adaptive", "calibrated",
             50000, 33000, 25000, 20000, 10000,
             5000, 3000, 2000, 1000, 500,
             200, 100, 50, 20, 10, 5
@@ -209,6 +302,15 @@ class GUIManager:
             command=lambda _: self._on_config_change()
         ).pack(side=tk.LEFT, padx=5)
         ttk.Label(speed_frame, text="kHz").pack(side=tk.LEFT)
+        
+        # 速度校准
+        if self.on_calibrate:
+            self.calibrate_button = ttk.Button(
+                speed_frame,
+                text="速度校准",
+                command=self._on_calibrate_click
+            )
+            self.calibrate_button.pack(side=tk.LEFT, padx=5)
     
     def _create_rtt_config(self, parent):
         """创建RTT配置区域"""
@@ -345,6 +447,14 @@ class GUIManager:
             text="自动保存配置",
             variable=self.auto_save_var
         ).pack(side=tk.LEFT, padx=5)
+        
+        # 执行模式
+        ttk.Checkbutton(
+            frame,
+            text="独立进程运行会话",
+            variable=self.process_mode_var,
+            command=self._on_config_change
+        ).pack(side=tk.LEFT, padx=5)
     
     def _create_control_section(self, parent):
         """创建控制按钮区域"""
@@ -359,7 +469,7 @@ class GUIManager:
         )
         self.start_button.pack(side=tk.LEFT, padx=5)
         
-        # 停止按钮
+        # 停止按钮，停止会话列表中选中的会话，未选中时停止所有会话
         self.stop_button = ttk.Button(
             control_frame,
             text="停止",
@@ -375,10 +485,31 @@ class GUIManager:
             textvariable=self.status_var
         ).pack(side=tk.RIGHT, padx=5)
     
+    def _create_session_section(self, parent):
+        """创建会话列表区域"""
+        session_frame = ttk.LabelFrame(parent, text="会话", padding="5")
+        session_frame.pack(fill=tk.X, pady=5)
+        
+        self.session_tree = ttk.Treeview(
+            session_frame,
+            columns=("device", "destination", "status"),
+            height=4,
+            selectmode="extended"
+        )
+        self.session_tree.column("#0", width=150, minwidth=100)
+        self.session_tree.column("device", width=200, minwidth=100)
+        self.session_tree.column("destination", width=200, minwidth=100)
+        self.session_tree.column("status", width=100, minwidth=80)
+        self.session_tree.heading("#0", text="JLink序列号")
+        self.session_tree.heading("device", text="目标设备")
+        self.session_tree.heading("destination", text="UDP目标")
+        self.session_tree.heading("status", text="状态")
+        self.session_tree.pack(fill=tk.X)
+    
     def _create_log_section(self, parent):
         """创建日志区域"""
-        log_frame = ttk.LabelFrame(parent, text="日志", padding="5")
-        log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        log_frame = ttk.Frame(parent, padding="5")
+        parent.add(log_frame, text="日志")
         
         # 添加日志控制按钮区域
         log_control_frame = ttk.Frame(log_frame)
@@ -399,80 +530,371 @@ class GUIManager:
         # 日志文本区域
         self.log_text = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=25)  # 增加日志窗口高度
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_text.tag_config("error", foreground="red")
+        self.log_text.tag_config("warning", foreground="orange")
+        self.log_text.tag_config("info", foreground="blue")
         self.log_text.config(state=tk.DISABLED)
     
+    def _create_terminal_section(self, parent):
+        """创建RTT终端区域"""
+        self.terminal_frame = ttk.Frame(parent, padding="5")
+        parent.add(self.terminal_frame, text="RTT终端")
+        
+        control_frame = ttk.Frame(self.terminal_frame)
+        control_frame.pack(fill=tk.X, pady=2)
+        
+        ttk.Label(control_frame, text="会话:").pack(side=tk.LEFT)
+        self.terminal_session_var = tk.StringVar()
+        self.terminal_session_combo = ttk.Combobox(
+            control_frame,
+            textvariable=self.terminal_session_var,
+            state="readonly",
+            width=20
+        )
+        self.terminal_session_combo.pack(side=tk.LEFT, padx=5)
+        self.terminal_session_combo.bind("<<ComboboxSelected>>", self._on_terminal_session_selected)
+        
+        self.terminal_status_label = ttk.Label(control_frame, text="")
+        self.terminal_status_label.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(
+            control_frame,
+            text="清除",
+            command=self._clear_terminal
+        ).pack(side=tk.RIGHT, padx=5)
+        
+        # 输入区域，输入内容写入RTT下行通道
+        input_frame = ttk.Frame(self.terminal_frame)
+        input_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=2)
+        
+        self.terminal_input_var = tk.StringVar()
+        terminal_entry = ttk.Entry(input_frame, textvariable=self.terminal_input_var)
+        terminal_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        terminal_entry.bind("<Return>", self._on_terminal_send)
+        
+        self.terminal_newline_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            input_frame,
+            text="追加换行",
+            variable=self.terminal_newline_var
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(
+            input_frame,
+            text="发送",
+            command=self._on_terminal_send
+        ).pack(side=tk.LEFT)
+        
+        self.terminal_text = scrolledtext.ScrolledText(
+            self.terminal_frame,
+            wrap=tk.CHAR,
+            height=25,
+            font="TkFixedFont"
+        )
+        self.terminal_text.pack(fill=tk.BOTH, expand=True)
+        self.terminal_text.tag_config("skipped", foreground="gray")
+        self.terminal_text.config(state=tk.DISABLED)
+    
+    def _create_stats_section(self, parent):
+        """创建统计面板"""
+        stats_frame = ttk.Frame(parent, padding="5")
+        parent.add(stats_frame, text="统计")
+        
+        columns = (
+            ("rtt_read", "RTT读取", 90),
+            ("udp_send", "UDP发送", 90),
+            ("datagrams", "数据报/s", 70),
+            ("udp_receive", "UDP接收", 90),
+            ("buffer_fill", "缓冲区占用", 75),
+            ("send_queue", "发送队列", 75),
+            ("drops", "错误/丢弃", 70),
+            ("latency", "探针延迟(均/峰)", 110),
+        )
+        self.stats_tree = ttk.Treeview(
+            stats_frame,
+            columns=[name for name, _, _ in columns],
+            height=4,
+            selectmode="browse"
+        )
+        self.stats_tree.column("#0", width=100, minwidth=80)
+        self.stats_tree.heading("#0", text="JLink序列号")
+        for name, title, width in columns:
+            self.stats_tree.column(name, width=width, minwidth=50, anchor=tk.E)
+            self.stats_tree.heading(name, text=title)
+        self.stats_tree.pack(fill=tk.X)
+        
+        # 性能分析
+        profile_frame = ttk.Frame(stats_frame)
+        profile_frame.pack(fill=tk.X, pady=(5, 0))
+        self.dump_diagnostics_button = ttk.Button(profile_frame, text="输出诊断信息", command=self._on_dump_diagnostics_click)
+        self.dump_diagnostics_button.pack(side=tk.LEFT)
+        self.sampling_button = ttk.Button(profile_frame, text="开始采样分析", command=self._on_sampling_click)
+        self.sampling_button.pack(side=tk.LEFT, padx=5)
+        if not self.on_dump_diagnostics:
+            self.dump_diagnostics_button.config(state=tk.DISABLED)
+        if not self.on_toggle_sampling:
+            self.sampling_button.config(state=tk.DISABLED)
+        
+        # 趋势图显示选中会话（未选中时为第一个会话）最近的采样
+        spark_frame = ttk.Frame(stats_frame)
+        spark_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.sparklines = {}
+        for column, (name, title, _) in enumerate(SPARKLINES):
+            cell = ttk.Frame(spark_frame)
+            cell.grid(row=column // 2, column=column % 2, sticky="nsew", padx=5, pady=5)
+            label = ttk.Label(cell, text=title)
+            label.pack(anchor=tk.W)
+            canvas = tk.Canvas(cell, height=60, background="white", highlightthickness=1,
+                               highlightbackground="gray")
+            canvas.pack(fill=tk.BOTH, expand=True)
+            self.sparklines[name] = (label, canvas)
+        spark_frame.columnconfigure(0, weight=1)
+        spark_frame.columnconfigure(1, weight=1)
+    
+    def _on_dump_diagnostics_click(self):
+        """输出各会话数据路径的阶段耗时和最近的追踪事件"""
+        self.on_dump_diagnostics()
+    
+    def _on_sampling_click(self):
+        """开始或结束采样分析"""
+        self._update_sampling_button(self.on_toggle_sampling())
+    
+    def _update_sampling_button(self, active):
+        """根据采样分析状态更新按钮文字"""
+        self.sampling_button.config(text="结束采样分析" if active else "开始采样分析")
+    
+    def _process_stats(self):
+        """低频采样各会话的累计统计并刷新统计面板"""
+        if self.sampling_active:
+            # 采样分析到时自动结束
+            self._update_sampling_button(self.sampling_active())
+        if self.stats_provider:
+            try:
+                self._update_stats(self.stats_provider())
+            except Exception as e:
+                self.logger.error(f"更新统计失败: {str(e)}")
+        self.root.after(STATS_REFRESH_INTERVAL_MS, self._process_stats)
+    
+    def _update_stats(self, session_stats):
+        """用采样结果刷新统计表格和趋势图"""
+        for serial in list(self.stats_histories):
+            if serial not in session_stats:
+                del self.stats_histories[serial]
+                if self.stats_tree.exists(serial):
+                    self.stats_tree.delete(serial)
+        
+        for serial, stats in session_stats.items():
+            history = self.stats_histories.setdefault(serial, StatsHistory())
+            metrics = history.sample(stats)
+            fill = metrics["buffer_fill"]
+            values = (
+                format_rate(metrics["rtt_read_rate"]),
+                format_rate(metrics["udp_send_rate"]),
+                f"{metrics['udp_datagram_rate']:.0f}",
+                format_rate(metrics["udp_receive_rate"]),
+                f"{fill:.0f}%" if fill is not None else "-",
+                f"{metrics['send_queue']:,.0f} B",
+                f"{metrics['drops']:,.0f}",
+                f"{metrics['probe_latency_avg']:.2f}/{metrics['probe_latency_peak']:.1f} ms",
+            )
+            if self.stats_tree.exists(serial):
+                self.stats_tree.item(serial, values=values)
+            else:
+                self.stats_tree.insert("", "end", iid=serial, text=serial, values=values)
+        
+        # 统计页不可见时只采样不绘图
+        if self.output_notebook.select() != str(self.stats_tree.master):
+            return
+        selection = self.stats_tree.selection()
+        serial = selection[0] if selection else next(iter(self.stats_histories), None)
+        self._draw_sparklines(self.stats_histories.get(serial))
+    
+    def _draw_sparklines(self, history):
+        """绘制趋势图"""
+        for name, title, formatter in SPARKLINES:
+            label, canvas = self.sparklines[name]
+            canvas.delete("all")
+            values = list(history.history[name]) if history else []
+            if not values:
+                label.config(text=title)
+                continue
+            label.config(text=f"{title}: {formatter(values[-1])}")
+            
+            width = max(canvas.winfo_width(), 2)
+            height = max(canvas.winfo_height(), 2)
+            peak = max(values) or 1
+            step = width / max(history.length - 1, 1)
+            x0 = width - step * (len(values) - 1)
+            points = []
+            for index, value in enumerate(values):
+                points.append(x0 + index * step)
+                points.append(height - 2 - (height - 4) * value / peak)
+            if len(points) >= 4:
+                canvas.create_line(*points, fill="blue")
+    
+    def set_terminal_sources(self, sources):
+        """设置可在终端中显示的会话
+        
+        Args:
+            sources: 字典，键为探针序列号，值为会话的终端环形缓冲区
+        """
+        self.terminal_sources = dict(sources)
+        self.terminal_session_combo['values'] = list(self.terminal_sources)
+        if self.terminal_serial not in self.terminal_sources:
+            serial = next(iter(self.terminal_sources), None)
+            self.terminal_session_var.set(serial or "")
+            self._select_terminal_source(serial)
+    
+    def _on_terminal_session_selected(self, event=None):
+        """终端会话选择变化"""
+        self._select_terminal_source(self.terminal_session_var.get() or None)
+    
+    def _select_terminal_source(self, serial):
+        """切换终端显示的会话，从最近的一段历史数据开始显示"""
+        self.terminal_serial = serial
+        self.terminal_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.terminal_skipped = 0
+        ring = self.terminal_sources.get(serial)
+        if ring:
+            self.terminal_cursor = max(0, ring.position - TERMINAL_BACKLOG_BYTES)
+        self._clear_terminal()
+    
+    def _clear_terminal(self):
+        """清除终端内容"""
+        self.terminal_text.config(state=tk.NORMAL)
+        self.terminal_text.delete(1.0, tk.END)
+        self.terminal_text.config(state=tk.DISABLED)
+        self.terminal_lines = 0
+    
+    def _process_terminal(self):
+        """将终端环形缓冲区中的新数据渲染到终端，每次刷新最多渲染一帧的数据量"""
+        ring = self.terminal_sources.get(self.terminal_serial)
+        # 终端页不可见时不渲染，切回时跳过被覆盖的数据
+        if ring and self.output_notebook.select() == str(self.terminal_frame):
+            data, self.terminal_cursor, skipped = ring.read(self.terminal_cursor, TERMINAL_FRAME_BYTES)
+            if skipped:
+                self.terminal_skipped += skipped
+                self.terminal_decoder.reset()
+            if data or skipped:
+                self._display_terminal(self.terminal_decoder.decode(data), skipped)
+        
+        self.root.after(TERMINAL_REFRESH_INTERVAL_MS, self._process_terminal)
+    
+    def _display_terminal(self, text, skipped):
+        """插入终端文本，超过最大行数时删除最早的行"""
+        text = ANSI_ESCAPE_PATTERN.sub("", text.replace("\r\n", "\n").replace("\r", ""))
+        chunks = []
+        if skipped:
+            chunks += [f"\n[已跳过 {skipped} 字节]\n", "skipped"]
+            self.terminal_status_label.config(text=f"显示跟不上数据速率，共跳过 {self.terminal_skipped} 字节")
+        if text:
+            chunks += [text, ""]
+        
+        # 用户向上滚动查看时不自动滚动到底部
+        at_bottom = self.terminal_text.yview()[1] >= 1.0
+        self.terminal_text.config(state=tk.NORMAL)
+        self.terminal_text.insert(tk.END, *chunks)
+        self.terminal_lines += sum(chunk.count("\n") for chunk in chunks[::2])
+        if self.terminal_lines > TERMINAL_MAX_LINES:
+            lines_to_delete = self.terminal_lines - TERMINAL_MAX_LINES + TERMINAL_MAX_LINES // 10
+            self.terminal_text.delete("1.0", f"{lines_to_delete + 1}.0")
+            self.terminal_lines -= lines_to_delete
+        if at_bottom:
+            self.terminal_text.see(tk.END)
+        self.terminal_text.config(state=tk.DISABLED)
+    
+    def _on_terminal_send(self, event=None):
+        """将终端输入发送到RTT下行通道"""
+        if not self.terminal_serial or not self.on_terminal_input:
+            return
+        text = self.terminal_input_var.get()
+        if self.terminal_newline_var.get():
+            text += "\n"
+        if not text:
+            return
+        if self.on_terminal_input(self.terminal_serial, text.encode("utf-8")):
+            self.terminal_input_var.set("")
+    
     def _clear_log(self):
         """清除日志内容"""
         self.log_text.config(state=tk.NORMAL)
         self.log_text.delete(1.0, tk.END)
         self.current_log_lines = 0  # 重置行数计数
-        self.log_lines_label.config(text="日志行数: 0")  # 更新显示
+        self._update_log_label()
         self.log_text.config(state=tk.DISABLED)
         self.logger.info("日志已清除")
     
     def _start_log_processing(self):
         """启动日志处理"""
         self.log_thread_running = True
-        self.root.after(100, self._process_logs)
+        self.root.after(LOG_REFRESH_INTERVAL_MS, self._process_logs)
     
     def _process_logs(self):
-        """处理日志队列"""
-        while True:
+        """处理日志队列，每次刷新在时间预算内取出日志并一次性插入"""
+        deadline = time.perf_counter() + LOG_RENDER_BUDGET
+        chunks = []  # 交替的文本和标签，作为一次insert的参数
+        new_lines = 0
+        while time.perf_counter() < deadline:
             try:
                 record = self.log_queue.get_nowait()
-                self._display_log(record)
             except queue.Empty:
                 break
+            msg = self.queue_handler.format(record) + '\n'
+            chunks.append(msg)
+            chunks.append(self._log_tag(record))
+            new_lines += msg.count('\n')
+        
+        if chunks:
+            self._display_logs(chunks, new_lines)
+        
+        dropped = self.queue_handler.dropped
+        if chunks or dropped != self.shown_dropped:
+            self.shown_dropped = dropped
+            self._update_log_label()
         
         if self.log_thread_running:
-            self.root.after(100, self._process_logs)
+            self.root.after(LOG_REFRESH_INTERVAL_MS, self._process_logs)
+    
+    @staticmethod
+    def _log_tag(record):
+        """获取日志记录的显示标签"""
+        for level, tag in LOG_LEVEL_TAGS:
+            if record.levelno >= level:
+                return tag
+        return "normal"
     
-    def _display_log(self, record):
-        """显示日志记录"""
-        msg = self.queue_handler.format(record)
+    def _display_logs(self, chunks, new_lines):
+        """插入一批日志，超过最大行数时删除最早的日志"""
         self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, *chunks)
+        self.current_log_lines += new_lines
         
-        # 检查是否超过最大行数限制
-        if self.current_log_lines >= self.max_log_lines:
-            # 删除最早的10%的日志
-            lines_to_delete = self.max_log_lines // 10
-            # 获取要删除的行的结束位置
-            end_pos = self.log_text.index(f"{lines_to_delete + 1}.0")
-            # 删除这些行
-            self.log_text.delete("1.0", end_pos)
+        # 检查是否超过最大行数限制，超出时多删除10%以减少删除次数
+        if self.current_log_lines > self.max_log_lines:
+            lines_to_delete = self.current_log_lines - self.max_log_lines + self.max_log_lines // 10
+            self.log_text.delete("1.0", f"{lines_to_delete + 1}.0")
             self.current_log_lines -= lines_to_delete
         
-        # 添加新日志
-        self.log_text.insert(tk.END, msg + '\n')
-        self.current_log_lines += 1
         self.log_text.see(tk.END)
-        
-        # 更新日志行数显示
-        self.log_lines_label.config(text=f"日志行数: {self.current_log_lines}")
-        
-        # 设置日志颜色
-        tag = "normal"
-        if record.levelno >= logging.ERROR:
-            tag = "error"
-        elif record.levelno >= logging.WARNING:
-            tag = "warning"
-        elif record.levelno >= logging.INFO:
-            tag = "info"
-        
-        self.log_text.tag_add(tag, "end-{}c linestart".format(len(msg) + 1), "end-1c")
-        self.log_text.tag_config("error", foreground="red")
-        self.log_text.tag_config("warning", foreground="orange")
-        self.log_text.tag_config("info", foreground="blue")
-        
         self.log_text.config(state=tk.DISABLED)
     
+    def _update_log_label(self):
+        """更新日志行数和丢弃数显示"""
+        text = f"日志行数: {self.current_log_lines}"
+        if self.shown_dropped:
+            text += f"  已丢弃: {self.shown_dropped} 条"
+        self.log_lines_label.config(text=text)
+    
     def _refresh_jlink_devices(self):
         """刷新JLink设备列表"""
         import pylink
         try:
-            jlink = pylink.JLink()
-            devices = jlink.connected_emulators()
-            jlink.close()
+            if self.probe_pool:
+                devices = self.probe_pool.connected_emulators()
+            else:
+                jlink = pylink.JLink()
+                devices = jlink.connected_emulators()
+                jlink.close()
             
             if devices:
                 device_list = [
@@ -486,11 +908,39 @@ class GUIManager:
                 self.jlink_device_combo['values'] = ["未找到JLink设备"]
                 self.jlink_device_combo.current(0)
                 self.logger.warning("未找到JLink设备，请连接JLink并刷新")
+            profiler.mark("device_list")
         except Exception as e:
             self.logger.error(f"刷新JLink设备列表失败: {str(e)}")
             self.jlink_device_combo['values'] = ["刷新失败"]
             self.jlink_device_combo.current(0)
     
+    def _on_jlink_selected(self, event=None):
+        """JLink选择变化时，加载该探针保存的会话配置"""
+        serial = self.get_selected_jlink_serial()
+        if serial and serial in self.config.sessions:
+            self._load_session_config(self.config.sessions[serial])
+            self.logger.info(f"已加载JLink {serial} 的会话配置")
+    
+    def _load_session_config(self, fields):
+        """将会话配置字段加载到配置和界面"""
+        for key, value in fields.items():
+            if hasattr(self.config, key):
+                setattr(self.config, key, value)
+        
+        self.target_device_var.set(self.config.target_device)
+        self.debug_interface_var.set(self.config.debug_interface)
+        self.debug_speed_var.set(self.config.debug_speed)
+        self.buffer_index_var.set(self.config.rtt_buffer_index)
+        self.rtt_mode_var.set(self.config.rtt_mode)
+        self.map_file_path_var.set(self.config.map_file_path)
+        self.udp_ip_var.set(self.config.udp_ip)
+        self.udp_port_var.set(self.config.udp_port)
+        self.local_port_var.set(self.config.local_port)
+        self.polling_interval_var.set(self.config.polling_interval)
+        # 控制块地址最后设置，其变更回调会用界面变量同步整个配置
+        self.rtt_addr_var.set(f"0x{self.config.rtt_ctrl_block_addr:X}" if self.config.rtt_ctrl_block_addr else "")
+        self._on_rtt_mode_change()
+    
     def _on_config_change(self, *args):
         """配置更改回调"""
         self._update_config()
@@ -560,6 +1010,7 @@ class GUIManager:
         # 更新其他配置
         self.config.polling_interval = self.polling_interval_var.get()
         self.config.auto_save = self.auto_save_var.get()
+        self.config.execution_mode = "process" if self.process_mode_var.get() else "thread"
         
         # 保存配置
         if self.config.auto_save:
@@ -570,26 +1021,63 @@ class GUIManager:
         # 更新配置
         self._update_config()
         
-        # 如果是Map文件模式，确保已加载地址
-        if self.rtt_mode_var.get() == "map" and self.config.rtt_ctrl_block_addr == 0:
+        # 如果是Map文件模式，确保已加载地址；内存采样模式不使用RTT控制块
+        if (self.rtt_mode_var.get() == "map" and self.config.rtt_ctrl_block_addr == 0
+                and self.config.acquisition_mode != "memory"):
             if not self._load_from_map_file_path():
                 return
         
-        # 调用启动回调
-        if self.on_start():
-            # 更新UI状态
-            self.start_button.config(state=tk.DISABLED)
-            self.stop_button.config(state=tk.NORMAL)
-            self.status_var.set("运行中")
+        # 调用启动回调，会话列表和按钮状态由update_sessions更新
+        self.on_start()
         
     def _on_stop_click(self):
         """停止按钮点击回调"""
-        if self.on_stop():
-            # 更新UI状态
-            self.start_button.config(state=tk.NORMAL)
-            self.stop_button.config(state=tk.DISABLED)
+        self.on_stop(self.get_selected_session_serials() or None)
+    
+    def get_selected_session_serials(self):
+        """获取会话列表中选中的探针序列号"""
+        return list(self.session_tree.selection())
+    
+    def update_sessions(self, sessions):
+        """更新会话列表
+        
+        Args:
+            sessions: 会话信息列表，每项包含serial、target_device、destination和status
+        """
+        for item in self.session_tree.get_children():
+            self.session_tree.delete(item)
+        for info in sessions:
+            self.session_tree.insert(
+                "", "end", iid=info["serial"], text=info["serial"],
+                values=(info["target_device"], info["destination"], info["status"])
+            )
+        
+        self.session_count = len(sessions)
+        self.stop_button.config(state=tk.NORMAL if sessions else tk.DISABLED)
+        self._update_status()
+    
+    def _update_status(self):
+        """根据运行中的会话数更新状态显示"""
+        if self.session_count:
+            self.status_var.set(f"运行中 ({self.session_count}个会话)")
+        else:
             self.status_var.set("已停止")
     
+    def _on_calibrate_click(self):
+        """速度校准按钮点击回调"""
+        self._update_config()
+        self.on_calibrate()
+    
+    def set_calibrating(self, calibrating):
+        """更新速度校准期间的UI状态"""
+        state = tk.DISABLED if calibrating else tk.NORMAL
+        self.calibrate_button.config(state=state)
+        self.start_button.config(state=state)
+        if calibrating:
+            self.status_var.set("速度校准中")
+        else:
+            self._update_status()
+    
     def get_selected_jlink_serial(self):
         """获取选中的JLink序列号"""
         device = self.jlink_device_var.get()
@@ -605,12 +1093,6 @@ class GUIManager:
         """显示信息对话框"""
         messagebox.showinfo("信息", message)
     
-    def update_ui_on_stop(self):
-        """更新UI为停止状态"""
-        self.start_button.config(state=tk.NORMAL)
-        self.stop_button.config(state=tk.DISABLED)
-        self.status_var.set("已停止")
-    
     def on_closing(self):
         """窗口关闭回调"""
         # 保存配置
@@ -619,7 +1101,7 @@ class GUIManager:
             
         if self.stop_button['state'] == tk.NORMAL:
             if messagebox.askokcancel("退出", "转发服务正在运行，确定要退出吗？"):
-                self._on_stop_click()
+                self.on_stop(None)
                 # 窗口销毁由主程序处理
             else:
                 # 用户取消关闭
@@ -628,7 +1110,13 @@ class GUIManager:
     
     def _select_target_device(self):
         """选择目标设备"""
-        device = DeviceSelector.show_dialog(self.root, self.logger)
+        # 设备选择对话框按需加载
+        from device_selector import DeviceSelector
+        device = DeviceSelector.show_dialog(
+            self.root,
+            self.logger,
+            cache_dir=os.path.dirname(self.config.config_file)
+        )
         if device:
             self.target_device_var.set(device)
             self.config.target_device = device
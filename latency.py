@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+端到端延迟测量模块
+固件在RTT上行数据中插入带序号和目标时间戳的延迟标记，主机记录每个数据块的
+探针读取、移交发送线程和UDP发送时间，统计各阶段的延迟分布并指出拖长尾部的阶段
+"""
+
+import struct
+from profiling import SpanHistogram, format_spans
+
+# 延迟标记：魔数、序号(uint32)、目标时间戳(uint32，微秒)，小端
+MARKER_MAGIC = b"\x00LTM"
+MARKER_FORMAT = struct.Struct("<4sII")
+MARKER_SIZE = MARKER_FORMAT.size
+
+# 目标时间戳回绕周期，单位微秒
+TIMESTAMP_WRAP = 1 << 32
+
+# 统计的阶段，(名称, 说明)
+LATENCY_STAGES = (
+    ("target_to_read", "固件写入到探针读取（相对最小值）"),
+    ("probe_read", "探针读取调用"),
+    ("handoff", "读取完成到发送线程取出"),
+    ("send", "UDP发送调用"),
+    ("host_total", "主机侧合计（读取开始到发送完成）"),
+    ("end_to_end", "端到端（相对最小值）"),
+)
+
+# 参与尾部归因的阶段，合计类阶段除外
+TAIL_STAGES = ("target_to_read", "probe_read", "handoff", "send")
+
+
+class LatencyTracker:
+    """延迟测量状态
+
+    extract在读取线程中调用，complete在发送线程中调用，各自只写入自己负责的字段
+    """
+    def __init__(self):
+        self.stages = {name: SpanHistogram() for name, _ in LATENCY_STAGES}
+        self.markers = 0  # 收到的延迟标记数
+        self.lost_markers = 0  # 按序号推断丢失的标记数
+        self._last_sequence = None
+        # 主机时钟与目标时钟的差值的最小值，单位微秒；两个时钟没有同步，
+        # 以最小差值作为基准，固件到读取的延迟为超出最小值的部分
+        self._min_offset = None
+        self._carry = b""  # 被读取边界截断的标记，与下一次读取的数据拼接
+
+    def extract(self, data, read_end_ns):
+        """从读取的数据中移除延迟标记
+
+        Args:
+            data: 一次读取的数据
+            read_end_ns: 读取完成时间，time.perf_counter_ns
+
+        Returns:
+            tuple: (移除标记后的数据, 各标记的固件到读取延迟列表，单位纳秒)
+        """
+        if self._carry:
+            data = self._carry + data
+            self._carry = b""
+
+        position = data.find(MARKER_MAGIC)
+        if position < 0:
+            return self._hold_partial(data), ()
+
+        host_us = read_end_ns // 1000
+        transits = []
+        parts = []
+        start = 0
+        while position >= 0:
+            if position + MARKER_SIZE > len(data):
+                # 被读取边界截断的标记留到下一次读取
+                self._carry = data[position:]
+                parts.append(data[start:position])
+                return b"".join(parts), transits
+            _, sequence, target_us = MARKER_FORMAT.unpack_from(data, position)
+            transits.append(self._note_marker(sequence, target_us, host_us))
+            parts.append(data[start:position])
+            start = position + MARKER_SIZE
+            position = data.find(MARKER_MAGIC, start)
+        parts.append(self._hold_partial(data[start:]))
+        return b"".join(parts), transits
+
+    def _hold_partial(self, data):
+        """数据末尾可能是被截断的魔数时留到下一次读取"""
+        for size in range(len(MARKER_MAGIC) - 1, 0, -1):
+            if data.endswith(MARKER_MAGIC[:size]):
+                self._carry = data[-size:]
+                return data[:-size]
+        return data
+
+    def _note_marker(self, sequence, target_us, host_us):
+        """记录一个标记，返回相对最小值的固件到读取延迟，单位纳秒"""
+        self.markers += 1
+        if self._last_sequence is not None:
+            gap = (sequence - self._last_sequence - 1) % TIMESTAMP_WRAP
+            if gap < TIMESTAMP_WRAP // 2:
+                self.lost_markers += gap
+        self._last_sequence = sequence
+
+        offset = (host_us - target_us) % TIMESTAMP_WRAP
+        if self._min_offset is None:
+            self._min_offset = offset
+        transit = (offset - self._min_offset) % TIMESTAMP_WRAP
+        if transit >= TIMESTAMP_WRAP // 2:
+            # 比已知最小值更小，更新基准
+            self._min_offset = offset
+            transit = 0
+        return transit * 1000
+
+    def complete(self, chunks, handoff_ns, send_start_ns, send_end_ns):
+        """发送完成后记录这些数据块各阶段的耗时
+
+        Args:
+            chunks: 合并到本次发送的数据块，每项为 (读取开始, 读取完成, 固件到读取延迟列表)
+            handoff_ns: 发送线程取出数据的时间
+            send_start_ns: 发送调用开始时间
+            send_end_ns: 发送调用完成时间
+        """
+        stages = self.stages
+        send = send_end_ns - send_start_ns
+        for read_start, read_end, transits in chunks:
+            stages["probe_read"].record(read_end - read_start)
+            stages["handoff"].record(handoff_ns - read_end)
+            stages["send"].record(send)
+            stages["host_total"].record(send_end_ns - read_start)
+            for transit in transits:
+                stages["target_to_read"].record(transit)
+                stages["end_to_end"].record(transit + send_end_ns - read_end)
+
+    def tail_stage(self):
+        """找出拖长尾部的阶段
+
+        以各阶段p99与p50之差作为对尾部的贡献，没有样本的阶段不参与
+
+        Returns:
+            tuple: (阶段名称, 贡献，单位微秒)，没有样本时返回 (None, 0)
+        """
+        best = (None, 0.0)
+        for name in TAIL_STAGES:
+            histogram = self.stages[name]
+            if not histogram.count:
+                continue
+            spread = (histogram.percentile(99) - histogram.percentile(50)) / 1000
+            if best[0] is None or spread > best[1]:
+                best = (name, spread)
+        return best
+
+    def report(self):
+        """生成延迟报告文本"""
+        descriptions = dict(LATENCY_STAGES)
+        lines = [format_spans(self.stages)]
+        lines.append(f"延迟标记: {self.markers}，按序号推断丢失: {self.lost_markers}")
+        stage, spread = self.tail_stage()
+        if stage:
+            lines.append(f"尾部主要来自: {stage} ({descriptions[stage]})，p99比p50高 {spread:.1f}us")
+        if not self.markers:
+            lines.append("未收到延迟标记，只统计主机侧阶段")
+        return "\n".join(lines)
@@ -6,14 +6,23 @@ RTT2UDP主程序
 集成GUI、RTT和UDP管理器，实现RTT数据到UDP的转发和UDP数据到RTT的转发
 """
 
+from startup_profile import profiler
 import tkinter as tk
+import collections
 import logging
+import multiprocessing
 import os
+import threading
 from config import Config
-from rtt_manager import RTTManager
-from udp_manager import UDPManager
-from forwarder import RTTUDPForwarder, UDPRTTForwarder
+from probe_pool import ProbePool
 from gui_manager import GUIManager
+from profiling import SamplingProfiler, profile_path
+
+# 会话、工作进程和合并流模块在首次启动转发时才导入，JLink DLL在首次访问探针时才加载
+profiler.mark("imports")
+
+# 实时输出追踪事件的间隔，单位毫秒
+TRACE_TAIL_INTERVAL_MS = 500
 
 class RTT2UDPApplication:
     def __init__(self):
@@ -27,90 +36,275 @@ class RTT2UDPApplication:
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
         
-        # 创建管理器
-        self.rtt_manager = RTTManager(self.config)
-        self.udp_manager = UDPManager(self.config)
-        self.rtt_to_udp_forwarder = RTTUDPForwarder(self.rtt_manager, self.udp_manager, self.config)
-        self.udp_to_rtt_forwarder = UDPRTTForwarder(self.rtt_manager, self.udp_manager, self.config)
+        # 所有会话共享的探针会话池
+        self.probe_pool = ProbePool()
+        
+        # 探针会话，键为探针序列号
+        self.sessions = {}
+        
+        # 所有会话共享的多探针合并流，按需创建
+        self.merger = None
+        
         self.gui_manager = GUIManager(
             self.root,
             self.config,
             on_start=self.start_conversion,
-            on_stop=self.stop_conversion
+            on_stop=self.stop_conversion,
+            on_calibrate=self.calibrate_speed,
+            probe_pool=self.probe_pool,
+            on_terminal_input=self.write_terminal,
+            stats_provider=self.get_session_stats,
+            on_dump_diagnostics=self.dump_diagnostics,
+            on_toggle_sampling=self.toggle_sampling,
+            sampling_active=lambda: self.sampler.running
         )
         
-        # 转发服务状态
-        self.forwarding_active = False
+        # 速度校准状态
+        self.calibrating = False
+        
+        # 连接丢失和重连次数，按探针序列号统计
+        self.connection_losses = collections.Counter()
+        self.reconnects = collections.Counter()
+        
+        # 采样分析器，按需启动
+        self.sampler = SamplingProfiler(self.config.profile_sample_interval)
+        
+        # 指标服务
+        self.metrics_server = None
+        if self.config.metrics_enabled:
+            from metrics_server import MetricsServer
+            self.metrics_server = MetricsServer(self.config, self.get_metrics_snapshot)
+            self.metrics_server.start()
+        
+        # 实时输出数据路径追踪事件
+        if self.config.trace_tail:
+            self.root.after(TRACE_TAIL_INTERVAL_MS, self._tail_traces)
+    
+    @property
+    def forwarding_active(self):
+        """是否有会话正在转发"""
+        return any(session.running for session in self.sessions.values())
     
     def start_conversion(self):
-        """启动转发服务"""
+        """为选中的JLink启动转发会话"""
+        if self.calibrating:
+            self.logger.error("速度校准进行中，请稍后再启动")
+            return False
+        
         # 获取JLink序列号
         serial = self.gui_manager.get_selected_jlink_serial()
         if not serial:
             self.logger.error("未选择有效的JLink设备")
             return False
         
-        # 连接RTT，传入连接丢失回调
-        if not self.rtt_manager.connect(serial, on_connection_lost=self.on_connection_lost):
+        session = self.sessions.get(serial)
+        if session and session.running:
+            self.logger.error(f"JLink设备 {serial} 的会话已经在运行")
             return False
         
-        # 设置UDP
-        if not self.udp_manager.setup():
-            self.rtt_manager.disconnect()
-            return False
-        
-        # 启动RTT到UDP转发
-        if not self.rtt_to_udp_forwarder.start():
-            self.udp_manager.close()
-            self.rtt_manager.disconnect()
-            return False
+        # 以界面当前配置作为该探针的会话配置
+        self.config.sessions[serial] = self.config.session_fields()
+        if self.config.auto_save:
+            self.config.save()
         
-        # 启动UDP到RTT转发
-        if not self.udp_to_rtt_forwarder.start():
-            self.rtt_to_udp_forwarder.stop()
-            self.udp_manager.close()
-            self.rtt_manager.disconnect()
+        session_config = self.config.for_session(serial)
+        if self.config.execution_mode == "process":
+            from worker import ProcessProbeSession
+            # 读取和发送在独立工作进程中运行，数据不经过本进程
+            if self.config.merge_enabled:
+                self.logger.warning("进程模式下数据不经过主进程，该会话不参与多探针合并流")
+            session = ProcessProbeSession(
+                serial,
+                session_config,
+                self.probe_pool,
+                on_connection_lost=self.on_connection_lost
+            )
+        else:
+            from session import ProbeSession
+            session = ProbeSession(
+                serial,
+                session_config,
+                self.probe_pool,
+                on_connection_lost=self.on_connection_lost,
+                merger=self._get_merger()
+            )
+        if not session.start():
+            self._release_merger()
             return False
         
-        # 更新转发状态
-        self.forwarding_active = True
+        self.sessions[serial] = session
+        if serial in self.connection_losses:
+            self.reconnects[serial] += 1
+        self._refresh_sessions()
+        profiler.mark("forwarding")
+        profiler.report()
+        return True
+    
+    def stop_conversion(self, serials=None):
+        """停止转发会话
         
+        Args:
+            serials: 要停止的探针序列号列表，None表示停止所有会话
+        """
+        if serials is None:
+            serials = list(self.sessions)
+        for serial in serials:
+            session = self.sessions.pop(serial, None)
+            if session:
+                session.stop()
+        self._release_merger()
+        self._refresh_sessions()
         return True
     
-    def stop_conversion(self):
-        """停止转发服务"""
-        self.forwarding_active = False
-        self.rtt_to_udp_forwarder.stop()
-        self.udp_to_rtt_forwarder.stop()
-        self.udp_manager.close()
-        self.rtt_manager.disconnect()
+    def _get_merger(self):
+        """获取多探针合并流，未启用时返回None"""
+        if not self.config.merge_enabled:
+            return None
+        if not self.merger:
+            from merger import StreamMerger
+            self.merger = StreamMerger(self.config)
+            self.merger.start()
+        return self.merger
+    
+    def _release_merger(self):
+        """没有会话时停止多探针合并流"""
+        if self.merger and not self.sessions:
+            self.merger.stop()
+            self.merger = None
+    
+    def _refresh_sessions(self):
+        """刷新界面上的会话列表和终端数据源"""
+        self.gui_manager.update_sessions([session.describe() for session in self.sessions.values()])
+        self.gui_manager.set_terminal_sources({
+            serial: session.terminal
+            for serial, session in self.sessions.items()
+            if session.terminal
+        })
+    
+    def get_session_stats(self):
+        """获取各会话的累计统计"""
+        return {serial: session.stats() for serial, session in self.sessions.items()}
+    
+    def get_metrics_snapshot(self):
+        """获取指标快照，在指标服务线程中调用"""
+        from metrics_server import session_snapshot
+        return {
+            "sessions": session_snapshot(self.sessions),
+            "connection_losses": dict(self.connection_losses),
+            "reconnects": dict(self.reconnects),
+        }
+    
+    def dump_diagnostics(self):
+        """将各会话数据路径的阶段耗时和最近的追踪事件输出到日志"""
+        if not self.sessions:
+            self.logger.info("没有运行中的会话")
+            return
+        for session in self.sessions.values():
+            session.dump_profile()
+            session.dump_trace()
+    
+    def _tail_traces(self):
+        """将各会话的新追踪事件输出到日志"""
+        for session in self.sessions.values():
+            session.tail_trace()
+        self.root.after(TRACE_TAIL_INTERVAL_MS, self._tail_traces)
+    
+    def toggle_sampling(self):
+        """开始或提前结束采样分析
+        
+        Returns:
+            bool: 采样分析是否正在运行
+        """
+        if self.sampler.running:
+            self.sampler.stop()
+            return False
+        duration = self.config.profile_sample_duration
+        self.sampler.interval = self.config.profile_sample_interval
+        if not self.sampler.start(profile_path(self.config, "profile"), duration):
+            return False
+        # 进程模式的会话在各自的工作进程中采样
+        for serial, session in self.sessions.items():
+            session.sample_profile(profile_path(self.config, f"profile-{serial}"), duration)
         return True
     
-    def on_connection_lost(self):
+    def write_terminal(self, serial, data):
+        """将终端输入写入指定会话的RTT下行通道"""
+        session = self.sessions.get(serial)
+        if not session or not session.terminal:
+            return False
+        return session.write_terminal(data)
+    
+    def calibrate_speed(self):
+        """在后台线程中校准调试速度"""
+        serial = self.gui_manager.get_selected_jlink_serial()
+        if not serial:
+            self.logger.error("未选择有效的JLink设备")
+            return
+        
+        if serial in self.sessions:
+            self.gui_manager.show_error("请先停止该JLink的转发会话再进行速度校准")
+            return
+        
+        self.calibrating = True
+        self.gui_manager.set_calibrating(True)
+        thread = threading.Thread(target=self._calibrate_worker, args=(serial,))
+        thread.daemon = True
+        thread.start()
+    
+    def _calibrate_worker(self, serial):
+        """速度校准工作线程"""
+        from rtt_manager import RTTManager
+        best_speed = None
+        rtt_manager = RTTManager(self.config.for_session(serial), self.probe_pool)
+        try:
+            if rtt_manager.connect(serial):
+                best_speed, _ = rtt_manager.calibrate_speed(serial)
+        finally:
+            # 进程模式下工作进程需要独占打开探针，校准后不保留会话
+            rtt_manager.disconnect(close_probe=self.config.execution_mode == "process")
+            self.root.after(0, self._on_calibrate_done, best_speed)
+    
+    def _on_calibrate_done(self, best_speed):
+        """在主线程中处理速度校准结果"""
+        self.calibrating = False
+        self.gui_manager.set_calibrating(False)
+        if best_speed:
+            self.gui_manager.show_info(
+                f"速度校准完成，最佳调试速度为 {best_speed} kHz\n"
+                f"将调试速度设为 calibrated 即可在连接时使用该结果"
+            )
+        else:
+            self.gui_manager.show_error("速度校准失败，请查看日志")
+    
+    def on_connection_lost(self, session):
         """连接丢失回调函数"""
-        self.logger.warning("检测到JLink连接丢失，自动停止转发服务")
+        self.logger.warning(f"检测到JLink {session.serial_number} 连接丢失，自动停止该会话")
         
-        # 如果转发服务正在运行，则停止
-        if self.forwarding_active:
-            # 使用tkinter的after方法确保在主线程中执行UI更新
-            self.root.after(0, self._handle_connection_lost)
+        # 使用tkinter的after方法确保在主线程中执行UI更新
+        self.root.after(0, self._handle_connection_lost, session)
     
-    def _handle_connection_lost(self):
+    def _handle_connection_lost(self, session):
         """在主线程中处理连接丢失"""
-        # 停止转发服务
-        self.stop_conversion()
+        if self.sessions.get(session.serial_number) is not session:
+            return
         
-        # 更新UI状态
-        self.gui_manager.update_ui_on_stop()
+        # 停止该会话
+        self.connection_losses[session.serial_number] += 1
+        self.stop_conversion([session.serial_number])
         
         # 显示提示信息
-        self.gui_manager.show_info("JLink连接已断开，转发服务已自动停止")
+        self.gui_manager.show_info(f"JLink {session.serial_number} 连接已断开，该会话已自动停止")
     
     def on_closing(self):
         """窗口关闭处理"""
         # 确保停止所有转发服务
         self.stop_conversion()
+        self.sampler.stop()
         self.gui_manager.on_closing()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        # 关闭探针会话池中保留的JLink连接
+        self.probe_pool.close_all()
         # 手动销毁窗口
         self.root.destroy()
         
@@ -121,6 +315,8 @@ class RTT2UDPApplication:
         self.root.mainloop()
 
 def main():
+    # 打包后的程序以spawn方式启动工作进程时需要
+    multiprocessing.freeze_support()
     app = RTT2UDPApplication()
     app.run()
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+内存变量采样模块
+目标固件没有RTT时，按固定频率直接读取目标内存中的变量，类似J-Scope；
+变量地址从固件ELF文件的符号表或Map文件中解析，相邻变量合并为尽量少的内存读取，
+读取计划只在启动时计算一次，每个采样周期重复使用
+"""
+
+import logging
+import re
+import struct
+import time
+from elf_reader import ElfFile, resolve_elf_path
+
+# 变量类型名称 -> (字节数, struct格式字符)，与遥测帧结构的类型一致
+VARIABLE_TYPES = {
+    "u8": (1, "B"),
+    "i8": (1, "b"),
+    "u16": (2, "H"),
+    "i16": (2, "h"),
+    "u32": (4, "I"),
+    "i32": (4, "i"),
+    "u64": (8, "Q"),
+    "i64": (8, "q"),
+    "f32": (4, "f"),
+    "f64": (8, "d"),
+}
+
+# 采样帧开头的时间戳字段：采样开始以来的主机时间，单位微秒
+TIMESTAMP_FIELD = ["timestamp_us", "u64"]
+TIMESTAMP_FORMAT = struct.Struct("<Q")
+
+# 两个变量之间的间隔不超过该字节数时合并为一次读取，多读几个字节比多一次探针调用快
+DEFAULT_MERGE_GAP = 16
+
+# 单次内存读取的最大长度
+MAX_READ_SIZE = 1024
+
+
+def sample_layout(config):
+    """采样帧结构，可直接作为遥测帧结构使用
+
+    Returns:
+        list: 每项为 [名称, 类型]，第一项为时间戳
+    """
+    return [list(TIMESTAMP_FIELD)] + [[name, type_name] for name, type_name in config.sample_variables]
+
+
+def find_symbols_in_map(map_file_path, names):
+    """从Map文件中查找变量地址和大小
+
+    支持Keil格式（`name  0x20000010  Data  4  file.o(...)`）和GNU ld格式
+    （`.bss.name  0x20000010  0x4  file.o`），GNU ld的符号行（`0x20000010  name`）只有地址
+
+    Returns:
+        dict: 变量名称 -> (地址, 大小)，大小未知时为0
+    """
+    with open(map_file_path, "r", encoding="utf-8", errors="ignore") as f:
+        map_content = f.read()
+
+    symbols = {}
+    for name in names:
+        escaped = re.escape(name)
+        # 名称须在行首，否则 count 会匹配到 g_count 或 sample_count 的行
+        match = re.search(r"^\s*" + escaped + r"\s+0x([0-9a-fA-F]+)\s+Data\s+(\d+)", map_content, re.MULTILINE)
+        if match:
+            symbols[name] = (int(match.group(1), 16), int(match.group(2)))
+            continue
+        match = re.search(r"\.(?:bss|data|sbss|sdata)\." + escaped + r"\s+0x([0-9a-fA-F]+)\s+0x([0-9a-fA-F]+)", map_content)
+        if match:
+            symbols[name] = (int(match.group(1), 16), int(match.group(2), 16))
+            continue
+        match = re.search(r"^\s+0x([0-9a-fA-F]+)\s+" + escaped + r"\s*$", map_content, re.MULTILINE)
+        if match:
+            symbols[name] = (int(match.group(1), 16), 0)
+    return symbols
+
+
+class MemorySampler:
+    def __init__(self, variables, rate, merge_gap=DEFAULT_MERGE_GAP):
+        """根据已解析的变量地址计算读取计划
+
+        Args:
+            variables: 每项为 (名称, 类型, 地址)，顺序即采样帧中的顺序
+            rate: 采样频率，单位Hz
+            merge_gap: 合并读取的最大间隔，单位字节
+        """
+        self.logger = logging.getLogger(__name__)
+        self.variables = variables
+        self.period_ns = int(1e9 / rate)
+        self.frame_size = TIMESTAMP_FORMAT.size + sum(VARIABLE_TYPES[type_name][0] for _, type_name, _ in variables)
+
+        # 按地址排序后合并相邻变量，每项为 [起始地址, 长度]
+        self.reads = []
+        placements = {}  # 变量序号 -> (读取序号, 读取内偏移)
+        for index in sorted(range(len(variables)), key=lambda i: variables[i][2]):
+            _, type_name, address = variables[index]
+            size = VARIABLE_TYPES[type_name][0]
+            if self.reads:
+                start, length = self.reads[-1]
+                end = max(start + length, address + size)
+                if address <= start + length + merge_gap and end - start <= MAX_READ_SIZE:
+                    self.reads[-1][1] = end - start
+                    placements[index] = (len(self.reads) - 1, address - start)
+                    continue
+            self.reads.append([address, size])
+            placements[index] = (len(self.reads) - 1, 0)
+
+        # 每个变量从哪次读取的哪个位置复制到帧中的哪个位置
+        self.copies = []
+        position = TIMESTAMP_FORMAT.size
+        for index, (_, type_name, _) in enumerate(variables):
+            size = VARIABLE_TYPES[type_name][0]
+            read_index, offset = placements[index]
+            self.copies.append((read_index, offset, offset + size, position, position + size))
+            position += size
+        self.reads = [tuple(read) for read in self.reads]
+
+        self.samples = 0  # 已采样次数
+        self.overruns = 0  # 因读取耗时超过周期而跳过的采样次数
+        self._start_ns = 0
+        self._next_ns = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """从固件ELF文件或Map文件解析变量地址并创建采样器
+
+        变量名称也可以直接写地址，如 "0x20000010"
+
+        Raises:
+            ValueError: 没有配置变量、类型未知或找不到变量地址
+        """
+        logger = logging.getLogger(__name__)
+        if not config.sample_variables:
+            raise ValueError("未配置采样变量sample_variables")
+        if config.sample_rate <= 0:
+            raise ValueError(f"无效的采样频率: {config.sample_rate}")
+
+        names = []
+        for entry in config.sample_variables:
+            if len(entry) != 2:
+                raise ValueError(f"采样变量应为 [名称, 类型]: {entry!r}")
+            name, type_name = entry
+            if type_name not in VARIABLE_TYPES:
+                raise ValueError(f"未知的变量类型 {type_name}，可选: {', '.join(VARIABLE_TYPES)}")
+            names.append(name)
+
+        symbols = {}
+        wanted = [name for name in names if not re.match(r"^0x[0-9a-fA-F]+$", name)]
+        elf_path = resolve_elf_path(config.elf_file_path, config.map_file_path)
+        if wanted and elf_path:
+            elf = ElfFile(elf_path)
+            for name in wanted:
+                symbol = elf.symbol(name)
+                if symbol:
+                    symbols[name] = symbol
+        missing = [name for name in wanted if name not in symbols]
+        if missing and config.map_file_path:
+            symbols.update(find_symbols_in_map(config.map_file_path, missing))
+            missing = [name for name in wanted if name not in symbols]
+        if missing:
+            raise ValueError(f"在固件文件中找不到变量: {', '.join(missing)}")
+
+        variables = []
+        for name, type_name in config.sample_variables:
+            if name in symbols:
+                address, size = symbols[name]
+                if size and size < VARIABLE_TYPES[type_name][0]:
+                    logger.warning(f"变量 {name} 大小为 {size} 字节，小于类型 {type_name}")
+            else:
+                address = int(name, 16)
+            variables.append((name, type_name, address))
+
+        sampler = cls(variables, config.sample_rate, config.sample_merge_gap)
+        logger.info(f"内存采样: {len(variables)} 个变量合并为 {len(sampler.reads)} 次读取，"
+                    f"{config.sample_rate:g}Hz，{sampler.frame_size} 字节/帧")
+        for address, length in sampler.reads:
+            logger.debug(f"内存读取: 0x{address:08X} {length} 字节")
+        return sampler
+
+    def start(self):
+        """开始按固定周期采样"""
+        self._start_ns = time.perf_counter_ns()
+        self._next_ns = self._start_ns
+        self.samples = 0
+        self.overruns = 0
+
+    def wait(self):
+        """等待到下一个采样时刻
+
+        采样时刻按起始时间和周期计算，单次延迟不会累积；落后超过一个周期时跳过错过的采样
+        """
+        now = time.perf_counter_ns()
+        if now < self._next_ns:
+            time.sleep((self._next_ns - now) / 1e9)
+        elif now - self._next_ns >= self.period_ns:
+            missed = (now - self._next_ns) // self.period_ns
+            self.overruns += missed
+            self._next_ns += missed * self.period_ns
+        self._next_ns += self.period_ns
+
+    def read(self, memory_read):
+        """执行一次读取计划
+
+        Args:
+            memory_read: 读取目标内存的函数，参数为 (地址, 长度)，返回字节列表或bytes
+
+        Returns:
+            bytes: 采样帧，时间戳后依次为各变量的原始字节（目标字节序）
+        """
+        sample_ns = time.perf_counter_ns()
+        blocks = [bytes(memory_read(address, length)) for address, length in self.reads]
+        frame = bytearray(self.frame_size)
+        TIMESTAMP_FORMAT.pack_into(frame, 0, (sample_ns - self._start_ns) // 1000)
+        for read_index, start, end, frame_start, frame_end in self.copies:
+            frame[frame_start:frame_end] = blocks[read_index][start:end]
+        self.samples += 1
+        return bytes(frame)
+
+    def report(self):
+        """生成采样统计文本"""
+        return (f"内存采样: {self.samples} 次，跳过 {self.overruns} 次，"
+                f"每次 {len(self.reads)} 个读取共 {sum(length for _, length in self.reads)} 字节")
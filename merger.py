@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多探针数据流合并模块
+将多个探针会话的RTT数据按行切分并打上主机单调时钟时间戳，
+在重排序窗口内以k路堆归并按时间顺序合并，输出到一个UDP或TCP目标
+"""
+
+import collections
+import heapq
+import logging
+import socket
+import threading
+import time
+
+# 单个UDP数据报的最大合并长度
+MAX_DATAGRAM_SIZE = 8192
+
+
+class _MergeSource:
+    """单个探针会话的行缓冲"""
+    def __init__(self, source_id, prefix, max_pending_lines, max_line_length):
+        self.source_id = source_id
+        self.prefix = prefix
+        self.lines = collections.deque()  # (时间戳, 行数据)，按时间戳非递减
+        self.max_pending_lines = max_pending_lines
+        self.max_line_length = max(1, max_line_length)
+        self.partial = bytearray()
+        self.partial_timestamp = 0.0
+        self.dropped_lines = 0
+        self.retired = False  # 已移除，剩余行输出后删除
+
+    def push(self, data, timestamp):
+        """追加一个数据块，切分出完整的行，超过max_line_length的行强制切分
+
+        在探针会话的读取线程中调用；deque的append与合并线程的popleft是线程安全的
+        """
+        limit = self.max_line_length
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            if self.partial:
+                # 跨数据块的行以第一个字节到达的时间排序
+                self.partial += data[start:end + 1]
+                self._append_split(self.partial_timestamp, bytes(self.partial))
+                self.partial = bytearray()
+            elif end + 1 - start > limit:
+                self._append_split(timestamp, data[start:end + 1])
+            else:
+                self._append(timestamp, data[start:end + 1])
+            start = end + 1
+
+        if start < len(data):
+            if not self.partial:
+                self.partial_timestamp = timestamp
+            self.partial += data[start:]
+            # 不完整行达到上限的部分直接输出，保留的部分始终短于上限，保证内存有界
+            if len(self.partial) >= limit:
+                full = len(self.partial) - len(self.partial) % limit
+                self._append_split(self.partial_timestamp, bytes(self.partial[:full]))
+                del self.partial[:full]
+                self.partial_timestamp = timestamp
+
+    def flush_partial(self):
+        """将剩余的不完整行作为一行输出"""
+        if self.partial:
+            self._append(self.partial_timestamp, bytes(self.partial))
+            self.partial = bytearray()
+
+    def _append_split(self, timestamp, line):
+        """按max_line_length切分后追加"""
+        limit = self.max_line_length
+        for position in range(0, len(line), limit):
+            self._append(timestamp, line[position:position + limit])
+
+    def _append(self, timestamp, line):
+        """追加一行，待合并行数超过上限时丢弃"""
+        if len(self.lines) >= self.max_pending_lines:
+            self.dropped_lines += 1
+            return
+        self.lines.append((timestamp, line))
+
+
+class StreamMerger:
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.window = config.merge_window_ms / 1000.0  # 重排序窗口，单位秒
+        self.sink = config.merge_sink.lower()
+        self.target_addr = (config.merge_ip, config.merge_port)
+
+        self._sources = {}  # 输入序号 -> _MergeSource，序号同时作为同时间戳行的排序依据
+        self._source_index = {}  # 输入流标识 -> 输入序号
+        self._sources_lock = threading.Lock()
+        self._next_index = 0
+        self._socket = None
+        self._last_connect_attempt = 0
+        self.running = False
+        self.merge_thread = None
+
+        # 统计
+        self.lines_merged = 0
+        self.send_errors = 0
+
+    def add_source(self, source_id, label=None):
+        """添加一个输入流
+
+        Args:
+            source_id: 输入流标识，通常为探针序列号
+            label: 行前缀标签，None表示使用config.merge_prefix决定是否添加 [source_id]
+
+        Returns:
+            可作为RTTUDPForwarder旁路监听器的回调函数
+        """
+        if label is None and self.config.merge_prefix:
+            label = f"[{source_id}] "
+        prefix = label.encode("utf-8") if label else b""
+        source = _MergeSource(
+            source_id, prefix,
+            self.config.merge_max_pending_lines,
+            self.config.merge_max_line_length
+        )
+        with self._sources_lock:
+            self._sources[self._next_index] = source
+            self._source_index[source_id] = self._next_index
+            self._next_index += 1
+        self.logger.info(f"合并流已添加输入: {source_id}")
+        return source.push
+
+    def remove_source(self, source_id):
+        """移除一个输入流，剩余数据在下一次合并时输出"""
+        with self._sources_lock:
+            index = self._source_index.pop(source_id, None)
+            source = self._sources.get(index)
+        if source:
+            source.flush_partial()
+            # 等待窗口到期后由合并线程输出剩余行并删除
+            source.retired = True
+
+    def start(self):
+        """启动合并线程"""
+        if self.running:
+            return False
+        self.running = True
+        self.merge_thread = threading.Thread(target=self._merge_loop)
+        self.merge_thread.daemon = True
+        self.merge_thread.start()
+        self.logger.info(
+            f"合并流已启动，重排序窗口 {self.config.merge_window_ms} ms，"
+            f"输出到 {self.sink.upper()} {self.target_addr[0]}:{self.target_addr[1]}"
+        )
+        return True
+
+    def stop(self):
+        """停止合并线程并输出所有剩余数据"""
+        if not self.running:
+            return
+        self.running = False
+        if self.merge_thread and self.merge_thread.is_alive():
+            self.merge_thread.join(timeout=5.0)
+        self.merge_thread = None
+
+        with self._sources_lock:
+            sources = list(self._sources.values())
+        for source in sources:
+            source.flush_partial()
+        self._emit(self._merge(float("inf")))
+        self._close_socket()
+        self.logger.info("合并流已停止")
+
+    def _merge_loop(self):
+        """周期性输出重排序窗口之外的行"""
+        interval = max(self.window / 4, 0.001)
+        try:
+            while self.running:
+                time.sleep(interval)
+                self._emit(self._merge(time.monotonic() - self.window))
+        except Exception as e:
+            self.logger.error(f"合并流处理过程中发生错误: {str(e)}")
+            self.running = False
+
+    def _merge(self, cutoff):
+        """k路堆归并所有输入流中时间戳不晚于cutoff的行
+
+        每个输入流内部已按时间排序，堆中只保存各输入流的队首
+        """
+        with self._sources_lock:
+            entries = list(self._sources.items())
+
+        heap = [
+            (source.lines[0][0], index, source)
+            for index, source in entries
+            if source.lines
+        ]
+        heapq.heapify(heap)
+
+        output = []
+        while heap:
+            timestamp, index, source = heap[0]
+            if timestamp > cutoff:
+                break
+            _, line = source.lines.popleft()
+            output.append(source.prefix + line if source.prefix else line)
+            if source.lines:
+                heapq.heapreplace(heap, (source.lines[0][0], index, source))
+            else:
+                heapq.heappop(heap)
+
+        # 清理已移除且数据已输出的输入流
+        with self._sources_lock:
+            for index, source in list(self._sources.items()):
+                if source.retired and not source.lines:
+                    del self._sources[index]
+
+        self.lines_merged += len(output)
+        return output
+
+    def _emit(self, lines):
+        """将合并后的行输出到目标"""
+        if not lines:
+            return
+        try:
+            if self.sink == "tcp":
+                sock = self._get_tcp_socket()
+                if sock:
+                    sock.sendall(b"".join(lines))
+            else:
+                sock = self._get_udp_socket()
+                datagram = bytearray()
+                for line in lines:
+                    if datagram and len(datagram) + len(line) > MAX_DATAGRAM_SIZE:
+                        sock.sendto(datagram, self.target_addr)
+                        datagram = bytearray()
+                    datagram += line
+                if datagram:
+                    sock.sendto(datagram, self.target_addr)
+        except Exception as e:
+            self.send_errors += 1
+            self.logger.error(f"发送合并数据失败: {str(e)}")
+            if self.sink == "tcp":
+                self._close_socket()
+
+    def _get_udp_socket(self):
+        """获取UDP socket"""
+        if not self._socket:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        return self._socket
+
+    def _get_tcp_socket(self):
+        """获取TCP连接，断开后每秒最多重连一次，未连接期间的数据丢弃"""
+        if self._socket:
+            return self._socket
+        now = time.monotonic()
+        if now - self._last_connect_attempt < 1.0:
+            return None
+        self._last_connect_attempt = now
+        try:
+            self._socket = socket.create_connection(self.target_addr, timeout=1.0)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.logger.info(f"合并流已连接到 {self.target_addr[0]}:{self.target_addr[1]}")
+        except OSError as e:
+            self.logger.warning(f"连接合并流目标失败: {str(e)}")
+            self._socket = None
+        return self._socket
+
+    def _close_socket(self):
+        """关闭输出socket"""
+        if self._socket:
+            try:
+                self._socket.close()
+            except Exception:
+                pass
+            self._socket = None
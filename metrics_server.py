@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+指标服务模块
+在本机提供Prometheus文本格式的 /metrics 接口，
+每次抓取时读取各会话统计计数的快照，不在数据路径上加锁
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from stats import LATENCY_BUCKETS
+
+# Prometheus文本格式的内容类型
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 会话累计计数，(统计字段, 指标名称, 说明)
+COUNTER_METRICS = (
+    ("rtt_bytes_read", "rtt2udp_rtt_bytes_read_total", "从RTT上行通道读取的字节数"),
+    ("udp_bytes_sent", "rtt2udp_udp_bytes_sent_total", "发送到UDP目标的字节数"),
+    ("udp_datagrams_sent", "rtt2udp_udp_datagrams_sent_total", "发送的UDP数据报数"),
+    ("udp_send_errors", "rtt2udp_udp_send_errors_total", "UDP发送失败次数，失败的数据被丢弃"),
+    ("udp_bytes_received", "rtt2udp_udp_bytes_received_total", "接收的UDP字节数"),
+    ("udp_datagrams_received", "rtt2udp_udp_datagrams_received_total", "接收的UDP数据报数"),
+    ("rtt_write_errors", "rtt2udp_rtt_write_errors_total", "写入RTT下行通道失败次数，失败的数据被丢弃"),
+    ("rtt_read_errors", "rtt2udp_rtt_read_errors_total", "读取RTT上行通道失败次数"),
+)
+
+# 会话当前值，(统计字段, 指标名称, 说明)
+GAUGE_METRICS = (
+    ("rtt_buffer_peak", "rtt2udp_rtt_buffer_peak_bytes", "最近一秒内目标上行缓冲区中数据量的峰值"),
+    ("rtt_buffer_size", "rtt2udp_rtt_buffer_size_bytes", "目标上行缓冲区容量，0表示未知"),
+    ("send_queue_bytes", "rtt2udp_send_queue_bytes", "等待发送到UDP的字节数"),
+    ("poll_interval", "rtt2udp_poll_interval_seconds", "当前的RTT空闲轮询间隔"),
+)
+
+
+def _format_labels(labels):
+    """格式化标签，转义反斜杠、双引号和换行"""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return ",".join(parts)
+
+
+def _format_value(value):
+    """格式化样本值，整数值不使用科学计数法以免丢失精度"""
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def session_snapshot(sessions):
+    """读取会话统计快照
+
+    Args:
+        sessions: 探针序列号 -> 会话，可在其他线程中被修改
+
+    Returns:
+        list: render_metrics使用的会话列表
+    """
+    return [
+        {"serial": serial, "channel": session.config.rtt_buffer_index, "stats": session.stats()}
+        for serial, session in list(sessions.items())
+    ]
+
+
+def render_metrics(snapshot):
+    """将指标快照渲染为Prometheus文本格式
+
+    Args:
+        snapshot: 字典，包含
+            sessions: 列表，每项为 {"serial", "channel", "stats"}
+            connection_losses: 探针序列号 -> 连接丢失次数
+            reconnects: 探针序列号 -> 连接丢失后重新启动会话的次数
+
+    Returns:
+        str: 指标文本
+    """
+    sessions = snapshot.get("sessions", [])
+    lines = []
+
+    def metric_header(name, help_text, metric_type):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for field, name, help_text in COUNTER_METRICS:
+        metric_header(name, help_text, "counter")
+        for session in sessions:
+            labels = _format_labels({"serial": session["serial"], "channel": session["channel"]})
+            lines.append(f"{name}{{{labels}}} {_format_value(session['stats'].get(field, 0))}")
+
+    for field, name, help_text in GAUGE_METRICS:
+        metric_header(name, help_text, "gauge")
+        for session in sessions:
+            labels = _format_labels({"serial": session["serial"], "channel": session["channel"]})
+            lines.append(f"{name}{{{labels}}} {_format_value(session['stats'].get(field, 0))}")
+
+    name = "rtt2udp_probe_call_seconds"
+    metric_header(name, "成功的探针调用耗时", "histogram")
+    for session in sessions:
+        stats = session["stats"]
+        base = {"serial": session["serial"]}
+        cumulative = 0
+        for index, bound in enumerate(LATENCY_BUCKETS + (float("inf"),)):
+            cumulative += stats.get(f"probe_latency_bucket_{index}", 0)
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{name}_bucket{{{_format_labels(dict(base, le=le))}}} {_format_value(cumulative)}")
+        lines.append(f"{name}_sum{{{_format_labels(base)}}} {_format_value(stats.get('probe_time_total', 0))}")
+        lines.append(f"{name}_count{{{_format_labels(base)}}} {_format_value(stats.get('probe_calls', 0))}")
+
+    for key, name, help_text in (
+        ("connection_losses", "rtt2udp_connection_lost_total", "检测到的探针连接丢失次数"),
+        ("reconnects", "rtt2udp_reconnects_total", "连接丢失后重新启动会话的次数"),
+    ):
+        metric_header(name, help_text, "counter")
+        for serial, count in sorted(snapshot.get(key, {}).items()):
+            lines.append(f"{name}{{{_format_labels({'serial': serial})}}} {count}")
+
+    metric_header("rtt2udp_sessions", "运行中的会话数", "gauge")
+    lines.append(f"rtt2udp_sessions {len(sessions)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """指标请求处理器"""
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render_metrics(self.server.collect()).encode("utf-8")
+        except Exception as e:
+            logging.getLogger(__name__).error(f"生成指标失败: {str(e)}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """不输出每次抓取的访问日志"""
+        pass
+
+
+class MetricsServer:
+    def __init__(self, config, collect):
+        """创建指标服务
+
+        Args:
+            config: 配置，使用metrics_host和metrics_port
+            collect: 返回指标快照的回调函数，格式见render_metrics
+        """
+        self.config = config
+        self.collect = collect
+        self.logger = logging.getLogger(__name__)
+        self.server = None
+        self.server_thread = None
+
+    def start(self):
+        """启动指标服务"""
+        if self.server:
+            return False
+        try:
+            self.server = ThreadingHTTPServer((self.config.metrics_host, self.config.metrics_port), _MetricsHandler)
+        except OSError as e:
+            self.logger.error(f"启动指标服务失败: {str(e)}")
+            self.server = None
+            return False
+        self.server.daemon_threads = True
+        self.server.collect = self.collect
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        host, port = self.server.server_address[:2]
+        self.logger.info(f"指标服务已启动: http://{host}:{port}/metrics")
+        return True
+
+    def stop(self):
+        """停止指标服务"""
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server_thread:
+            self.server_thread.join(timeout=2.0)
+        self.server = None
+        self.server_thread = None
+        self.logger.info("指标服务已停止")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+探针会话池模块
+按序列号缓存已打开的JLink句柄，在启动/停止之间复用探针会话
+"""
+
+import logging
+import threading
+
+
+class ProbeHandle:
+    """已打开的JLink句柄及其目标连接参数"""
+    def __init__(self, serial_number, jlink):
+        self.serial_number = serial_number
+        self.jlink = jlink
+        self.target_key = None  # (调试接口, 调试速度, 目标设备)，None表示未连接目标
+        self.in_use = False
+
+
+class ProbePool:
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._enumerator = None  # 仅用于枚举探针的未打开JLink实例
+
+    def connected_emulators(self):
+        """获取已连接的JLink探针信息列表"""
+        import pylink
+        with self._lock:
+            if not self._enumerator:
+                self._enumerator = pylink.JLink()
+            return self._enumerator.connected_emulators()
+
+    def acquire(self, serial_number):
+        """获取指定序列号的探针句柄，已打开的句柄直接复用
+
+        Args:
+            serial_number: JLink设备序列号
+
+        Returns:
+            ProbeHandle: 已打开的探针句柄
+        """
+        import pylink
+        serial_number = str(serial_number)
+        with self._lock:
+            handle = self._handles.get(serial_number)
+            if handle and handle.in_use:
+                raise RuntimeError(f"JLink设备 {serial_number} 正在被使用")
+
+            if handle:
+                try:
+                    alive = handle.jlink.opened() and handle.jlink.connected()
+                except Exception:
+                    alive = False
+                if alive:
+                    self.logger.info(f"复用已打开的JLink设备 {serial_number}")
+                    handle.in_use = True
+                    return handle
+                self._close_handle(handle)
+
+            jlink = pylink.JLink()
+            jlink.open(serial_no=serial_number)
+            handle = ProbeHandle(serial_number, jlink)
+            handle.in_use = True
+            self._handles[serial_number] = handle
+            return handle
+
+    def release(self, serial_number):
+        """归还探针句柄，句柄保持打开以供下次复用"""
+        with self._lock:
+            handle = self._handles.get(str(serial_number))
+            if handle:
+                handle.in_use = False
+
+    def invalidate(self, serial_number):
+        """标记目标连接参数已失效，下次连接时重新连接目标"""
+        with self._lock:
+            handle = self._handles.get(str(serial_number))
+            if handle:
+                handle.target_key = None
+
+    def discard(self, serial_number):
+        """关闭并移除探针句柄，用于连接失败或探针断开后"""
+        with self._lock:
+            handle = self._handles.pop(str(serial_number), None)
+            if handle:
+                self._close_handle(handle)
+
+    def close_all(self):
+        """关闭所有探针句柄"""
+        with self._lock:
+            for handle in self._handles.values():
+                self._close_handle(handle)
+            self._handles.clear()
+            if self._enumerator:
+                try:
+                    self._enumerator.close()
+                except Exception:
+                    pass
+                self._enumerator = None
+
+    def _close_handle(self, handle):
+        """关闭单个探针句柄"""
+        try:
+            handle.jlink.close()
+            self.logger.info(f"已关闭JLink设备 {handle.serial_number}")
+        except Exception as e:
+            self.logger.error(f"关闭JLink设备 {handle.serial_number} 失败: {str(e)}")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+热路径性能分析模块
+数据路径各阶段以单调时钟纳秒计时，记录到对数线性分桶的直方图中，可随时输出分位数；
+另提供按需启用的采样分析器，定时采集各线程的调用栈，按时间窗口输出折叠栈文件
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+# 每个2的幂区间再细分的子桶数为 2**SUB_BUCKET_BITS，相对误差约为 1/16
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+# 桶总数，覆盖 0 到 2**64 纳秒
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS) * SUB_BUCKET_COUNT
+
+# 输出的分位数
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+# 采样分析器默认采样间隔，单位秒
+SAMPLE_INTERVAL = 0.005
+
+# 采样时最多展开的栈深度
+MAX_STACK_DEPTH = 64
+
+
+def _bucket_index(value):
+    """计算纳秒值所在的桶序号"""
+    if value < 2 * SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def _bucket_upper(index):
+    """桶内的最大值"""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    sub = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+    return ((sub + 1) << shift) - 1
+
+
+class SpanHistogram:
+    """对数线性分桶的耗时直方图，单位纳秒
+
+    记录时只做位运算和整数累加，不加锁，每个直方图只应由一个线程写入
+    """
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """记录一次耗时，单位纳秒"""
+        if value < 0:
+            value = 0
+        self.counts[_bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """获取分位数，返回所在桶的上界，单位纳秒"""
+        counts = list(self.counts)
+        count = sum(counts)
+        if not count:
+            return 0
+        target = max(1, count * percent / 100.0)
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def bucket_counts(self, bounds):
+        """按固定上界汇总计数，用于导出Prometheus直方图
+
+        跨越上界的桶按桶内最大值归入后一个区间，误差不超过一个桶宽
+
+        Args:
+            bounds: 递增的上界，单位纳秒
+
+        Returns:
+            list: 各区间的计数，最后一项为超过最大上界的计数
+        """
+        result = [0] * (len(bounds) + 1)
+        position = 0
+        for index, bucket_count in enumerate(list(self.counts)):
+            if not bucket_count:
+                continue
+            upper = _bucket_upper(index)
+            while position < len(bounds) and upper > bounds[position]:
+                position += 1
+            result[position] += bucket_count
+        return result
+
+    def summary(self):
+        """获取统计摘要，耗时单位为微秒"""
+        count = self.count
+        summary = {
+            "count": count,
+            "mean": self.total / count / 1000 if count else 0.0,
+            "max": self.max / 1000,
+        }
+        for percent in REPORT_PERCENTILES:
+            summary[f"p{percent:g}"] = self.percentile(percent) / 1000
+        return summary
+
+
+def format_spans(spans):
+    """将各阶段的直方图格式化为文本表格
+
+    Args:
+        spans: 阶段名称 -> SpanHistogram
+
+    Returns:
+        str: 每个阶段一行，耗时单位为微秒
+    """
+    headers = ["count", "mean"] + [f"p{percent:g}" for percent in REPORT_PERCENTILES] + ["max"]
+    width = max([len(name) for name in spans] + [5])
+    lines = [f"{'阶段':<{width - 2}} " + " ".join(f"{header:>10}" for header in headers)]
+    for name, histogram in spans.items():
+        summary = histogram.summary()
+        values = [f"{summary['count']:>10d}"] + [f"{summary[header]:>10.1f}" for header in headers[1:]]
+        lines.append(f"{name:<{width}} " + " ".join(values))
+    return "\n".join(lines)
+
+
+def profile_path(config, name):
+    """生成分析结果文件路径，位于配置目录下的profiles目录"""
+    directory = os.path.join(os.path.dirname(config.config_file), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+
+
+class SamplingProfiler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        """创建采样分析器
+
+        Args:
+            interval: 采样间隔，单位秒
+        """
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self.samples = collections.Counter()  # 折叠栈 -> 采样次数
+        self.sample_count = 0
+        self.running = False
+        self.thread = None
+        self.path = None
+        self._stop_event = threading.Event()
+
+    def start(self, path, duration=None):
+        """开始采样
+
+        Args:
+            path: 采样结束后写入的折叠栈文件路径
+            duration: 采样时长，单位秒，None表示直到调用stop
+
+        Returns:
+            bool: 是否已开始
+        """
+        if self.running:
+            self.logger.warning("采样分析已经在运行")
+            return False
+        self.path = path
+        self.samples = collections.Counter()
+        self.sample_count = 0
+        self._stop_event.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, args=(duration,), name="rtt2udp-profiler")
+        self.thread.daemon = True
+        self.thread.start()
+        self.logger.info(f"采样分析已开始，间隔 {self.interval * 1000:.0f}ms"
+                         + (f"，时长 {duration:g}秒" if duration else ""))
+        return True
+
+    def stop(self):
+        """停止采样并写入结果，可在采样线程以外的任意线程调用"""
+        if not self.running:
+            return
+        self._stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def _sample_loop(self, duration):
+        """采样循环"""
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        busy = 0.0
+        started = time.monotonic()
+        try:
+            while not self._stop_event.wait(self.interval):
+                if deadline and time.monotonic() >= deadline:
+                    break
+                sample_start = time.perf_counter()
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.samples[";".join(reversed(stack))] += 1
+                self.sample_count += 1
+                busy += time.perf_counter() - sample_start
+        finally:
+            self.running = False
+            elapsed = time.monotonic() - started
+            self._write(elapsed, busy)
+
+    def _write(self, elapsed, busy):
+        """写入折叠栈文件，可直接用于生成火焰图"""
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            overhead = busy * 100.0 / elapsed if elapsed > 0 else 0.0
+            self.logger.info(f"采样分析已结束，共 {self.sample_count} 次采样，"
+                             f"采样开销 {overhead:.2f}%，结果已写入: {self.path}")
+        except Exception as e:
+            self.logger.error(f"写入采样分析结果失败: {str(e)}")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+字节环形缓冲区模块
+固定容量，写满后覆盖最早的数据；读取方以累计写入位置作为游标，
+落后超过容量时跳过被覆盖的数据，写入方永远不会因读取方而等待
+"""
+
+import threading
+
+
+class ByteRing:
+    def __init__(self, capacity):
+        """创建字节环形缓冲区
+
+        Args:
+            capacity: 容量，单位字节
+        """
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._position = 0  # 累计写入的字节数
+        # 锁只保护内存复制，持有时间与数据块大小成正比
+        self._lock = threading.Lock()
+
+    @property
+    def position(self):
+        """累计写入的字节数，可作为从当前位置开始读取的游标"""
+        return self._position
+
+    def write(self, data):
+        """写入数据，超过容量的部分只保留最后capacity字节"""
+        size = len(data)
+        if not size:
+            return
+        with self._lock:
+            if size > self.capacity:
+                data = data[-self.capacity:]
+                self._position += size - self.capacity
+                size = self.capacity
+            start = self._position % self.capacity
+            first = min(size, self.capacity - start)
+            self._buffer[start:start + first] = data[:first]
+            if first < size:
+                self._buffer[:size - first] = data[first:]
+            self._position += size
+
+    def tap(self, data, timestamp):
+        """作为RTTUDPForwarder旁路监听器使用"""
+        self.write(data)
+
+    def read(self, cursor, max_size=None):
+        """从游标位置读取数据
+
+        Args:
+            cursor: 上一次读取返回的游标
+            max_size: 最多读取的字节数，None表示读取全部可用数据
+
+        Returns:
+            tuple: (数据, 新游标, 因被覆盖而跳过的字节数)
+        """
+        with self._lock:
+            position = self._position
+            oldest = max(0, position - self.capacity)
+            skipped = max(0, oldest - cursor)
+            cursor = max(cursor, oldest)
+            end = position if max_size is None else min(position, cursor + max_size)
+            size = end - cursor
+            if size <= 0:
+                return b"", cursor, skipped
+
+            start = cursor % self.capacity
+            first = min(size, self.capacity - start)
+            data = bytes(self._buffer[start:start + first])
+            if first < size:
+                data += bytes(self._buffer[:size - first])
+        return data, end, skipped
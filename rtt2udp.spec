@@ -57,12 +57,31 @@ except ImportError:
 
 # 收集项目模块
 project_modules = [
+    'binlog',
+    'cli',
     'config',
+    'device_catalog',
     'device_selector',
+    'elf_reader',
     'forwarder',
     'gui_manager',
+    'latency',
+    'memory_sampler',
+    'merger',
+    'metrics_server',
+    'probe_pool',
+    'profiling',
+    'ring_buffer',
     'rtt_manager',
-    'udp_manager'
+    'rtt_terminals',
+    'rules',
+    'session',
+    'startup_profile',
+    'stats',
+    'telemetry',
+    'tracing',
+    'udp_manager',
+    'worker'
 ]
 
 # 收集所有项目模块的依赖
@@ -111,10 +130,14 @@ a = Analysis(
         'socket',
         'select',
         'json',
+        'gzip',
         're',
         'threading',
         'queue',
-        'logging'
+        'logging',
+        'logging.handlers',
+        'http.server',
+        'multiprocessing'
     ] + project_modules + pylink_imports,
     hookspath=[],
     hooksconfig={},
@@ -6,12 +6,50 @@ RTT管理器模块
 负责与JLink设备通信并管理RTT连接
 """
 
+import collections
 import os
 import time
 import logging
-import pylink
 import re
-import threading
+from probe_pool import ProbePool
+from stats import WindowPeak
+from profiling import SpanHistogram
+from memory_sampler import MemorySampler
+from tracing import (
+    TraceRing, ErrorLimiter, EVT_BUFFER_STATUS, EVT_BUFFER_STATUS_UNAVAILABLE, EVT_RTT_READ,
+    EVT_RTT_READ_ERROR, EVT_RTT_WRITE, EVT_RTT_WRITE_ERROR, EVT_HALT_CHECK_ERROR, EVT_SLOW_PROBE_CALL,
+    EVT_MEMORY_SAMPLE
+)
+
+
+# RTT控制块起始处的标识字符串
+RTT_CB_SIGNATURE = b"SEGGER RTT"
+
+# 连接阶段名称，用于输出耗时分解
+CONNECT_PHASE_NAMES = {
+    "open": "打开JLink",
+    "connect": "连接目标",
+    "target_running": "等待目标运行",
+    "control_block": "等待控制块",
+    "rtt_start": "启动RTT",
+    "rtt_buffers": "等待RTT缓冲区",
+}
+
+
+# 表示探针已断开的J-Link DLL错误码
+# EMU_NO_CONNECTION, EMU_COMM_ERROR, DLL_NOT_OPEN, VCC_FAILURE, INVALID_HANDLE
+PROBE_LOST_ERROR_CODES = {-256, -257, -258, -259, -260}
+
+# 速度校准默认候选速度，单位kHz，从高到低
+CALIBRATION_SPEEDS = [50000, 33000, 25000, 20000, 15000, 12000, 10000, 8000, 6000, 4000, 2000, 1000]
+
+# 速度校准每次读取的最小字节数，过小的读取耗时由USB往返决定，各档速度测得的吞吐量几乎相同
+MIN_CALIBRATION_BLOCK_SIZE = 4096
+
+
+def calibration_key(serial_number, target_device):
+    """生成速度校准结果的存储键"""
+    return f"{serial_number}|{target_device}"
 
 
 def extract_serial_numbers(text):
@@ -57,29 +95,68 @@ def extract_rtt_address_from_map(map_file_path):
 
 
 class RTTManager:
-    def __init__(self, config):
+    def __init__(self, config, probe_pool=None, trace=None):
         self.config = config
+        self.probe_pool = probe_pool or ProbePool()
         self.jlink = None
+        self.serial_number = None
         self.logger = logging.getLogger(__name__)
+        
+        # 数据路径事件只写入追踪缓冲区，错误日志按间隔限流
+        self.trace = trace or TraceRing(config.trace_buffer_events)
+        self.error_limiter = ErrorLimiter(self.logger, self.trace, config.error_log_interval)
+        # 下行写入线程单独限流，与读取线程不共用限流状态
+        self.write_error_limiter = ErrorLimiter(self.logger, self.trace, config.error_log_interval)
         self.connected = False
         self.rtt_started = False
         self.last_buffer_info = None
         self.last_buffer_check_time = 0
+        self.buffer_status_error = None  # 最近一次查询缓冲区状态失败的原因，追踪缓冲区中的字符串编号
         self.buffer_check_interval = 0.001  # 缓冲区状态检查间隔，单位秒
+        self.sampler = None  # 内存采样模式下的采样器，None表示从RTT读取
         
-        # 连接状态监控
-        self.connection_monitor_thread = None
-        self.monitoring = False
-        self.connection_check_interval = 1.0  # 连接状态检查间隔，单位秒
+        # 连接健康检测，由读写数据路径驱动
         self.on_connection_lost = None  # 连接丢失回调函数
+        self.connection_lost = False  # 是否已检测到连接丢失
+        self.consecutive_failures = 0  # 连续探针调用失败次数
+        self.max_consecutive_failures = 3  # 连续失败达到该次数时确认连接状态
+        self.slow_call_threshold = 0.5  # 单次探针调用超过该耗时视为异常，单位秒
+        self.watchdog_interval = 0.05  # 数据路径空闲时的看门狗检查间隔，单位秒
+        self.last_probe_ok_time = 0  # 最近一次探针调用成功的时间
+        # 写入线程的探针调用失败，deque的append和popleft线程安全，由读取线程取出后计入连接健康状态
+        self.write_failures = collections.deque(maxlen=64)
+        
+        # 连接就绪探测
+        self.ready_poll_initial_delay = 0.001  # 就绪探测初始退避间隔，单位秒
+        self.ready_poll_max_delay = 0.05  # 就绪探测最大退避间隔，单位秒
+        self.connect_timings = {}  # 最近一次连接各阶段耗时，单位秒
+        
+        # 目标内核暂停状态跟踪
+        self.target_halted = False
+        self.last_halt_check_time = 0
+        self.halt_check_interval = 0.05  # 运行时无数据可读时检查暂停状态的最小间隔，单位秒
+        self.halt_heartbeat_interval = 0.25  # 目标暂停时的心跳检查间隔，单位秒
+        
+        # 运行统计，只做累加和峰值比较，由界面低频采样
+        self.read_errors = 0  # RTT读取失败次数
+        self.probe_histogram = SpanHistogram()  # 成功的探针调用耗时分布，单位纳秒
+        self.probe_latency = WindowPeak()  # 探针调用耗时峰值，单位秒
+        self.buffer_fill = WindowPeak()  # 单次读取时目标上行缓冲区中的数据量峰值，单位字节
+        self.buffer_size = 0  # 目标上行缓冲区容量，0表示未知
+        
+        # 数据路径各阶段耗时，单位纳秒
+        self.spans = {
+            "get_buf_status": SpanHistogram(),  # 查询缓冲区状态，包括不支持时的异常
+            "rtt_read": SpanHistogram(),  # 读取RTT上行通道
+            "to_bytes": SpanHistogram(),  # 读取结果转换为bytes
+            "rtt_write": SpanHistogram(),  # 写入RTT下行通道
+            "memory_read": SpanHistogram(),  # 内存采样模式下执行一次读取计划
+        }
         
     def get_jlink_list(self):
         """获取已连接的JLink设备列表"""
         try:
-            if not self.jlink:
-                self.jlink = pylink.JLink()
-            
-            jlink_list = self.jlink.connected_emulators()
+            jlink_list = self.probe_pool.connected_emulators()
             jlink_list_sn = []
             for i in jlink_list:
                 jlink_list_sn.append(extract_serial_numbers(str(i))[0])
@@ -95,73 +172,325 @@ class RTTManager:
             serial_number: JLink设备序列号
             on_connection_lost: 连接丢失时的回调函数
         """
+        self.connect_timings = {}
+        connect_start = time.perf_counter()
         try:
             if self.jlink:
-                self.jlink.close()
+                self.disconnect()
             
             # 保存连接丢失回调
             self.on_connection_lost = on_connection_lost
             
-            # 连接JLink
-            self.jlink = pylink.JLink()
-            self.jlink.open(serial_no=serial_number)
+            # 从探针会话池获取JLink，已打开的探针直接复用
+            phase_start = time.perf_counter()
+            handle = self.probe_pool.acquire(serial_number)
+            self.jlink = handle.jlink
+            self.serial_number = str(serial_number)
+            self._record_phase("open", phase_start)
             self.logger.info(f"已连接到JLink设备 {serial_number}")
             
             # 设置设备类型
             if not self.config.target_device:
                 raise ValueError("未选择目标设备")
             
-            # 设置调试接口
-            if self.config.debug_interface.upper() == "SWD":
-                self.jlink.set_tif(pylink.enums.JLinkInterfaces.SWD)
-                self.logger.info("使用SWD接口连接")
-            else:
-                self.jlink.set_tif(pylink.enums.JLinkInterfaces.JTAG)
-                self.logger.info("使用JTAG接口连接")
-            
-            # 设置调试速度
-            speed = self.config.debug_speed
-            if speed in ["auto", "adaptive"]:
-                self.logger.info(f"使用{speed}调试速度")
-                self.jlink.connect(self.config.target_device, speed)
+            # 调试接口、速度或目标设备未变化且目标仍连接时，跳过重新连接
+            phase_start = time.perf_counter()
+            interface = self.config.debug_interface.upper()
+            speed = self._resolve_speed(serial_number)
+            target_key = (interface, speed, self.config.target_device)
+            if handle.target_key == target_key and self.jlink.target_connected():
+                self.logger.info("连接参数未变化，复用已有目标连接")
             else:
-                try:
-                    speed_khz = int(speed)
-                    self.logger.info(f"设置调试速度为 {speed_khz} kHz")
-                    # 连接到目标设备
-                    self.jlink.connect(self.config.target_device, speed_khz)
-                except ValueError:
-                    self.logger.warning(f"无效的调试速度值: {speed}，使用auto模式")
-                    self.jlink.connect(self.config.target_device, "auto")
+                handle.target_key = None
+                self._connect_target(interface, speed)
+                handle.target_key = target_key
+            self._record_phase("connect", phase_start)
             
             self.logger.info(f"已连接到目标设备 {self.config.target_device}")
             
-            # 等待设备运行
-            self.logger.info("等待目标设备运行...")
-            time.sleep(1)
-            
-            # 启动RTT
-            self._setup_rtt()
+            if self.config.acquisition_mode == "memory":
+                # 内存采样模式不使用RTT，只需解析变量地址
+                self.sampler = MemorySampler.from_config(self.config)
+                self.sampler.start()
+            else:
+                # 等待设备运行
+                self.logger.info("等待目标设备运行...")
+                self._wait_for_ready()
             
-            # 启动连接状态监控
+            # 重置连接健康状态
             self.connected = True
-            self._start_connection_monitor()
+            self.connection_lost = False
+            self.consecutive_failures = 0
+            self.last_probe_ok_time = time.time()
             
+            self._record_phase("total", connect_start)
+            self._log_connect_timings()
             return True
         except Exception as e:
             self.logger.error(f"连接目标设备失败: {str(e)}")
-            self.disconnect()
+            self._log_connect_timings()
+            self.disconnect(close_probe=True)
             return False
 
-    def disconnect(self):
-        """断开与JLink的连接"""
+    def _resolve_speed(self, serial_number):
+        """解析配置中的调试速度
+        
+        Returns:
+            "auto"、"adaptive" 或速度数值(kHz)
+        """
+        speed = self.config.debug_speed
+        if speed == "calibrated":
+            speed = self._get_calibrated_speed(serial_number)
+        if speed in ["auto", "adaptive"]:
+            return speed
+        try:
+            return int(speed)
+        except ValueError:
+            self.logger.warning(f"无效的调试速度值: {speed}，使用auto模式")
+            return "auto"
+
+    def _connect_target(self, interface, speed):
+        """设置调试接口和速度并连接目标设备"""
+        import pylink
+        
+        # 设置调试接口
+        if interface == "SWD":
+            self.jlink.set_tif(pylink.enums.JLinkInterfaces.SWD)
+            self.logger.info("使用SWD接口连接")
+        else:
+            self.jlink.set_tif(pylink.enums.JLinkInterfaces.JTAG)
+            self.logger.info("使用JTAG接口连接")
+        
+        # 设置调试速度
+        if isinstance(speed, int):
+            self.logger.info(f"设置调试速度为 {speed} kHz")
+        else:
+            self.logger.info(f"使用{speed}调试速度")
+        
+        # 连接到目标设备
+        self.jlink.connect(self.config.target_device, speed)
+
+    def _get_calibrated_speed(self, serial_number):
+        """获取该探针与目标设备组合的已校准速度，没有记录时回退到auto"""
+        key = calibration_key(serial_number, self.config.target_device)
+        result = self.config.calibrated_speeds.get(key)
+        if not result:
+            self.logger.warning(f"没有 {key} 的速度校准记录，使用auto模式")
+            return "auto"
+        self.logger.info(f"使用已校准的调试速度 {result['speed']} kHz")
+        return str(result["speed"])
+
+    def calibrate_speed(self, serial_number, speeds=None, duration=0.2):
+        """校准调试接口速度
+        
+        依次设置各候选速度，在持续时间内反复读取RTT控制块所在的RAM，
+        统计读取吞吐量和错误率（读取异常或控制块标识不一致），
+        从最低速度往上，选出出现错误之前的最高一档并保存到配置中。
+        
+        Args:
+            serial_number: 当前连接的JLink序列号
+            speeds: 候选速度列表，单位kHz，默认使用CALIBRATION_SPEEDS
+            duration: 每档速度的测量时间，单位秒
+            
+        Returns:
+            tuple: (最佳速度kHz或None, 各速度测量结果列表)
+        """
+        if not self.jlink or not self.connected:
+            self.logger.error("速度校准需要先连接目标设备")
+            return None, []
+        
+        address = self.config.rtt_ctrl_block_addr
+        block_size = self.config.calibration_block_size
+        if block_size < MIN_CALIBRATION_BLOCK_SIZE:
+            self.logger.warning(f"速度校准读取长度 {block_size} 字节过小，使用 {MIN_CALIBRATION_BLOCK_SIZE} 字节")
+            block_size = MIN_CALIBRATION_BLOCK_SIZE
+        
+        # 控制块之后的RAM不一定有这么长，先以当前速度确认可读的长度
+        while block_size > len(RTT_CB_SIGNATURE):
+            try:
+                self.jlink.memory_read8(address, block_size)
+                break
+            except Exception:
+                block_size //= 2
+        self.logger.info(f"速度校准每次读取 {block_size} 字节")
+        results = []
+        
+        # 校准会改变探针速度，已缓存的目标连接参数不再可信
+        self.probe_pool.invalidate(serial_number)
+        
+        for speed in (speeds or CALIBRATION_SPEEDS):
+            try:
+                self.jlink.set_speed(speed)
+                actual_speed = self.jlink.speed
+            except Exception as e:
+                self.logger.warning(f"设置调试速度 {speed} kHz 失败: {str(e)}")
+                continue
+            
+            reads = 0
+            errors = 0
+            total_bytes = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < duration:
+                reads += 1
+                try:
+                    data = self.jlink.memory_read8(address, block_size)
+                    if bytes(data[:len(RTT_CB_SIGNATURE)]) != RTT_CB_SIGNATURE:
+                        errors += 1
+                    else:
+                        total_bytes += len(data)
+                except Exception:
+                    errors += 1
+            elapsed = time.perf_counter() - start
+            
+            result = {
+                "speed": speed,
+                "actual_speed": actual_speed,
+                "throughput": total_bytes / elapsed if elapsed > 0 else 0,
+                "reads": reads,
+                "errors": errors,
+                "error_rate": errors / reads if reads else 1.0,
+            }
+            results.append(result)
+            self.logger.info(
+                f"速度 {speed} kHz (实际 {actual_speed} kHz): "
+                f"{result['throughput'] / 1024:.1f} KB/s, 错误 {errors}/{reads}"
+            )
+        
+        # 从最低速度往上，取第一次出现错误之前的最高速度；
+        # 出错速度之上偶尔无错误的速度只是侥幸，不视为稳定
+        best = None
+        for result in sorted(results, key=lambda r: r["speed"]):
+            if result["errors"] or result["throughput"] <= 0:
+                break
+            best = result
+        if not best:
+            self.logger.error("速度校准失败，没有稳定的调试速度")
+            return None, results
+        
+        # 切换到最佳速度并保存结果
+        self.jlink.set_speed(best["speed"])
+        key = calibration_key(serial_number, self.config.target_device)
+        self.config.calibrated_speeds[key] = {
+            "speed": best["speed"],
+            "throughput": round(best["throughput"]),
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if self.config.auto_save:
+            self.config.save()
+        
+        self.logger.info(f"速度校准完成，最佳调试速度: {best['speed']} kHz ({best['throughput'] / 1024:.1f} KB/s)")
+        return best["speed"], results
+
+    def _record_phase(self, name, phase_start):
+        """记录连接阶段耗时"""
+        self.connect_timings[name] = time.perf_counter() - phase_start
+
+    def _log_connect_timings(self):
+        """输出连接阶段耗时分解"""
+        if not self.connect_timings:
+            return
+        parts = [
+            f"{CONNECT_PHASE_NAMES.get(name, name)} {elapsed * 1000:.1f}ms"
+            for name, elapsed in self.connect_timings.items()
+            if name != "total"
+        ]
+        if "total" in self.connect_timings:
+            parts.append(f"总计 {self.connect_timings['total'] * 1000:.1f}ms")
+        self.logger.info(f"连接耗时: {', '.join(parts)}")
+
+    def _poll_until(self, probe, timeout):
+        """以有界指数退避轮询就绪条件
+        
+        Args:
+            probe: 就绪检查函数，返回True表示已就绪
+            timeout: 最长等待时间，单位秒
+            
+        Returns:
+            bool: 超时前是否已就绪
+        """
+        deadline = time.perf_counter() + timeout
+        delay = self.ready_poll_initial_delay
+        while True:
+            try:
+                if probe():
+                    return True
+            except Exception as e:
+                self.logger.debug(f"就绪探测未通过: {str(e)}")
+            
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.ready_poll_max_delay)
+
+    def _wait_for_ready(self):
+        """等待目标运行、RTT控制块就绪并完成RTT缓冲区枚举
+        
+        替代固定延时：每个阶段以指数退避轮询，条件满足后立即进入下一阶段，
+        每个阶段各自以config.connect_timeout为超时，暂停或启动较慢的目标耗尽前一阶段的等待时间后，
+        后面的阶段仍有完整的等待时间。
+        """
+        timeout = self.config.connect_timeout
+        
+        # 目标处于运行状态
+        phase_start = time.perf_counter()
+        if not self._poll_until(lambda: not self.jlink.halted(), timeout):
+            self.logger.warning("目标设备处于暂停状态，继续启动RTT")
+        self._record_phase("target_running", phase_start)
+        
+        # 控制块标识已由固件写入RAM
+        address = self._resolve_rtt_address()
+        phase_start = time.perf_counter()
+        if not self._poll_until(lambda: self._control_block_present(address), timeout):
+            self.logger.warning(f"未在 0x{address:08X} 检测到RTT控制块标识，继续启动RTT")
+        self._record_phase("control_block", phase_start)
+        
+        # 启动RTT
+        phase_start = time.perf_counter()
+        if not self._setup_rtt(address):
+            raise RuntimeError("RTT启动失败")
+        self._record_phase("rtt_start", phase_start)
+        
+        # RTT缓冲区已枚举
+        phase_start = time.perf_counter()
+        if not self._poll_until(self._rtt_buffers_ready, timeout):
+            raise TimeoutError("等待RTT缓冲区超时")
+        self._record_phase("rtt_buffers", phase_start)
+        self.buffer_size = self._read_buffer_size()
+
+    def _read_buffer_size(self):
+        """读取目标上行缓冲区容量，用于计算缓冲区占用率"""
+        try:
+            descriptor = self.jlink.rtt_get_buf_descriptor(self.config.rtt_buffer_index, True)
+            return int(descriptor.SizeOfBuffer)
+        except Exception as e:
+            self.logger.debug(f"获取RTT缓冲区容量失败: {str(e)}")
+            return 0
+
+    def _control_block_present(self, address):
+        """检查RTT控制块标识是否已写入目标RAM"""
+        signature = self.jlink.memory_read8(address, len(RTT_CB_SIGNATURE))
+        return bytes(signature) == RTT_CB_SIGNATURE
+
+    def _rtt_buffers_ready(self):
+        """检查RTT缓冲区是否已完成枚举"""
+        num_up = self.jlink.rtt_get_num_up_buffers()
+        return num_up > self.config.rtt_buffer_index
+
+    def disconnect(self, close_probe=False):
+        """断开与JLink的连接
+        
+        Args:
+            close_probe: 是否关闭探针，默认归还探针会话池以便下次复用
+        """
         if not self.jlink:
             return
         
+        # 输出连接期间被限流的错误汇总
+        self.error_limiter.flush()
+        self.write_error_limiter.flush()
+        
         try:
-            # 停止连接监控
-            self._stop_connection_monitor()
-            
             # 停止RTT
             if self.rtt_started:
                 self.logger.info("停止RTT...")
@@ -171,17 +500,29 @@ class RTTManager:
                     self.logger.error(f"停止RTT失败: {str(e)}")
                 self.rtt_started = False
             
-            # 关闭JLink连接
-            self.logger.info("断开JLink连接...")
-            try:
-                self.jlink.close()
-            except Exception as e:
-                self.logger.error(f"关闭JLink连接失败: {str(e)}")
+            # 探针已断开时不再复用
+            if not close_probe:
+                try:
+                    close_probe = not self.jlink.connected()
+                except Exception:
+                    close_probe = True
+            
+            if close_probe:
+                # 关闭JLink连接
+                self.logger.info("断开JLink连接...")
+                self.probe_pool.discard(self.serial_number)
+            else:
+                self.logger.info("释放JLink连接，保留探针会话以便复用")
+                self.probe_pool.release(self.serial_number)
             
             # 清理资源
             self.jlink = None
+            self.serial_number = None
             self.connected = False
             self.last_buffer_info = None
+            self.buffer_status_error = None
+            self.target_halted = False
+            self.sampler = None
             
             self.logger.info("JLink连接已断开")
         except Exception as e:
@@ -201,89 +542,96 @@ class RTTManager:
             self.logger.error(f"检查目标设备连接状态失败: {str(e)}")
             return False
 
-    def _start_connection_monitor(self):
-        """启动连接状态监控线程"""
-        if self.connection_monitor_thread and self.connection_monitor_thread.is_alive():
+    def _note_probe_success(self, elapsed_ns):
+        """记录一次成功的探针调用，耗时异常时确认连接状态"""
+        self.consecutive_failures = 0
+        self.last_probe_ok_time = time.time()
+        self.probe_histogram.record(elapsed_ns)
+        elapsed = elapsed_ns / 1e9
+        self.probe_latency.update(elapsed)
+        if elapsed > self.slow_call_threshold:
+            self.trace.record(EVT_SLOW_PROBE_CALL, round(elapsed * 1000))
+            self.logger.warning(f"探针调用耗时异常: {elapsed * 1000:.0f}ms")
+            self._verify_connection()
+
+    def _note_probe_error(self, error):
+        """记录一次失败的探针调用，根据错误码和连续失败次数判断连接是否丢失"""
+        import pylink
+        if not isinstance(error, pylink.errors.JLinkException):
             return
+        if getattr(error, "code", None) in PROBE_LOST_ERROR_CODES:
+            self._report_connection_lost()
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.max_consecutive_failures:
+            self.consecutive_failures = 0
+            self._verify_connection()
+
+    def _watchdog(self, current_time):
+        """数据路径空闲时的低频看门狗，超过检查间隔没有成功的探针调用时确认连接状态"""
+        if (current_time - self.last_probe_ok_time) < self.watchdog_interval:
+            return
+        if self._verify_connection():
+            self.last_probe_ok_time = current_time
+
+    def _verify_connection(self):
+        """确认JLink是否仍然连接，已断开时触发连接丢失处理
         
-        self.monitoring = True
-        self.connection_monitor_thread = threading.Thread(target=self._connection_monitor_loop)
-        self.connection_monitor_thread.daemon = True
-        self.connection_monitor_thread.start()
-        self.logger.info("已启动连接状态监控")
-
-    def _stop_connection_monitor(self):
-        """停止连接状态监控线程"""
-        self.monitoring = False
-        if self.connection_monitor_thread and self.connection_monitor_thread.is_alive():
-            self.connection_monitor_thread.join(timeout=2.0)
-            if self.connection_monitor_thread.is_alive():
-                self.logger.warning("连接监控线程未能在超时时间内结束")
-        self.connection_monitor_thread = None
-
-    def _connection_monitor_loop(self):
-        """连接状态监控循环"""
-        last_jlink_status = True
-        
-        while self.monitoring and self.connected:
-            try:
-                # 检查JLink连接状态
-                current_jlink_status = self.is_connected()
-                
-                # 如果JLink连接丢失
-                if last_jlink_status and not current_jlink_status:
-                    self.logger.warning("检测到JLink连接丢失")
-                    self.logger.error("JLink连接已断开")
-                    
-                    # 调用连接丢失回调
-                    if self.on_connection_lost:
-                        self.logger.info("触发连接丢失回调")
-                        self.on_connection_lost()
-                    
-                    # 停止监控
-                    self.monitoring = False
-                    break
-                
-                # 更新状态
-                last_jlink_status = current_jlink_status
-                
-            except Exception as e:
-                self.logger.error(f"连接监控过程中发生错误: {str(e)}")
-                # 发生异常也视为连接丢失
-                if self.on_connection_lost:
-                    self.on_connection_lost()
-                self.monitoring = False
-                break
-            
-            # 等待下一次检查
-            time.sleep(self.connection_check_interval)
+        Returns:
+            bool: 是否仍然连接
+        """
+        try:
+            alive = self.jlink.connected()
+        except Exception:
+            alive = False
+        if not alive:
+            self._report_connection_lost()
+        return alive
+
+    def _report_connection_lost(self):
+        """报告连接丢失，每次连接只触发一次回调"""
+        if self.connection_lost:
+            return
+        self.connection_lost = True
+        self.logger.warning("检测到JLink连接丢失")
+        self.logger.error("JLink连接已断开")
+        
+        # 调用连接丢失回调
+        if self.on_connection_lost:
+            self.logger.info("触发连接丢失回调")
+            self.on_connection_lost()
 
-    def _setup_rtt(self):
+    def _resolve_rtt_address(self):
+        """获取RTT控制块地址，Map文件模式下从Map文件重新加载"""
+        # 根据RTT模式处理
+        if self.config.rtt_mode == "map":
+            # 如果是Map文件模式，尝试重新加载RTT地址
+            if self.config.map_file_path and os.path.exists(self.config.map_file_path):
+                address = extract_rtt_address_from_map(self.config.map_file_path)
+                if address > 0:
+                    self.config.rtt_ctrl_block_addr = address
+                    self.logger.info(f"已从Map文件重新加载RTT控制块地址: 0x{address:X}")
+                else:
+                    self.logger.error("无法从Map文件中提取RTT控制块地址")
+                    raise ValueError("无法从Map文件中提取RTT控制块地址")
+            else:
+                self.logger.error("Map文件路径无效或文件不存在")
+                raise ValueError("Map文件路径无效或文件不存在")
+        
+        if not self.config.rtt_ctrl_block_addr:
+            self.logger.error("未设置RTT控制块地址")
+            raise ValueError("未设置RTT控制块地址")
+        
+        return self.config.rtt_ctrl_block_addr
+
+    def _setup_rtt(self, address=None):
         """设置RTT"""
         try:
-            # 根据RTT模式处理
-            if self.config.rtt_mode == "map":
-                # 如果是Map文件模式，尝试重新加载RTT地址
-                if self.config.map_file_path and os.path.exists(self.config.map_file_path):
-                    address = extract_rtt_address_from_map(self.config.map_file_path)
-                    if address > 0:
-                        self.config.rtt_ctrl_block_addr = address
-                        self.logger.info(f"已从Map文件重新加载RTT控制块地址: 0x{address:X}")
-                    else:
-                        self.logger.error("无法从Map文件中提取RTT控制块地址")
-                        raise ValueError("无法从Map文件中提取RTT控制块地址")
-                else:
-                    self.logger.error("Map文件路径无效或文件不存在")
-                    raise ValueError("Map文件路径无效或文件不存在")
-            
             # 使用指定地址启动RTT
-            if self.config.rtt_ctrl_block_addr:
-                # 使用指定地址
-                self.jlink.rtt_start(self.config.rtt_ctrl_block_addr)
-                self.logger.info(f"RTT已启动，控制块地址: 0x{self.config.rtt_ctrl_block_addr:08X}")
-            else:
-                self.logger.error("未设置RTT控制块地址")
-                raise ValueError("未设置RTT控制块地址")
+            if address is None:
+                address = self._resolve_rtt_address()
+            self.jlink.rtt_start(address)
+            self.logger.info(f"RTT已启动，控制块地址: 0x{address:08X}")
             
             # 设置RTT状态
             self.rtt_started = True
@@ -294,31 +642,92 @@ class RTTManager:
             self.rtt_started = False
             return False
 
+    def _update_halt_state(self, current_time):
+        """查询目标内核是否暂停，并在状态变化时更新轮询策略
+        
+        Returns:
+            bool: 目标内核是否处于暂停状态
+        """
+        self.last_halt_check_time = current_time
+        call_start = time.perf_counter_ns()
+        halted = bool(self.jlink.halted())
+        self._note_probe_success(time.perf_counter_ns() - call_start)
+        if halted != self.target_halted:
+            self.target_halted = halted
+            # 状态切换后缓存的缓冲区状态已失效
+            self.last_buffer_info = None
+            if halted:
+                self.logger.info("目标内核已暂停，暂停RTT轮询，进入低频心跳检查")
+            else:
+                self.logger.info("目标内核已恢复运行，恢复全速RTT轮询")
+        return halted
+
+    def _check_halt_when_idle(self, current_time):
+        """读取无数据时顺带检查目标是否暂停，限制检查频率"""
+        if (current_time - self.last_halt_check_time) < self.halt_check_interval:
+            return
+        try:
+            self._update_halt_state(current_time)
+        except Exception as e:
+            self.trace.record(EVT_HALT_CHECK_ERROR, self.trace.intern_error(e))
+            self._note_probe_error(e)
+
+    def get_idle_interval(self):
+        """获取无数据时的轮询等待时间，目标暂停时使用心跳间隔"""
+        if self.target_halted:
+            return self.halt_heartbeat_interval
+        return self.config.polling_interval
+
     def read_data(self):
         """读取RTT数据，返回bytes"""
         try:
-            if not self.jlink:
+            if not self.jlink or self.connection_lost:
                 return None
             
+            if self.write_failures:
+                self._fold_write_failures()
+                if self.connection_lost:
+                    return None
+            
+            if self.sampler:
+                return self._read_samples()
+            
             current_time = time.time()
             
+            # 目标暂停时不访问RTT缓冲区，把探针让给调试器，只做低频心跳检查
+            if self.target_halted:
+                if (current_time - self.last_halt_check_time) < self.halt_heartbeat_interval:
+                    self._watchdog(current_time)
+                    return None
+                if self._update_halt_state(current_time):
+                    return None
+            
             # 检查是否需要更新缓冲区状态
             if self.last_buffer_info is None or (current_time - self.last_buffer_check_time) >= self.buffer_check_interval:
+                span_start = time.perf_counter_ns()
                 try:
                     # 尝试获取缓冲区状态
                     buffer_info = self.jlink.rtt_get_buf_status(self.config.rtt_buffer_index)
+                    self.spans["get_buf_status"].record(time.perf_counter_ns() - span_start)
                     self.last_buffer_info = buffer_info
                     self.last_buffer_check_time = current_time
                     
                     if not buffer_info or not hasattr(buffer_info, 'buffersize_used') or buffer_info.buffersize_used <= 0:
                         # 如果无法获取缓冲区状态或没有数据，返回None
+                        self._check_halt_when_idle(current_time)
                         return None
                     
                     # 获取可读取的数据长度，最大读取128KB
                     buffered = min(buffer_info.buffersize_used, 131072)
-                    self.logger.debug(f"RTT缓冲区已使用: {buffer_info.buffersize_used} 字节，读取: {buffered} 字节")
+                    self.buffer_fill.update(buffer_info.buffersize_used)
+                    self.trace.record(EVT_BUFFER_STATUS, buffer_info.buffersize_used, buffered)
                 except Exception as e:
-                    self.logger.debug(f"获取RTT缓冲区状态失败: {str(e)}，使用默认读取大小")
+                    self.spans["get_buf_status"].record(time.perf_counter_ns() - span_start)
+                    # 不支持查询缓冲区状态时每次都会失败，只在失败原因变化时记录
+                    error_id = self.trace.intern_error(e)
+                    if error_id != self.buffer_status_error:
+                        self.buffer_status_error = error_id
+                        self.trace.record(EVT_BUFFER_STATUS_UNAVAILABLE, error_id)
                     buffered = 65536
             else:
                 # 使用缓存的缓冲区状态
@@ -334,31 +743,79 @@ class RTTManager:
                 return None
             
             # 读取数据
+            call_start = time.perf_counter_ns()
             data = self.jlink.rtt_read(self.config.rtt_buffer_index, buffered)
+            elapsed = time.perf_counter_ns() - call_start
+            self.spans["rtt_read"].record(elapsed)
+            self._note_probe_success(elapsed)
             if not data:
+                self._check_halt_when_idle(current_time)
                 return None
             
+            # 一次读取会取走缓冲区中的全部数据，读取量即读取时的缓冲区占用
+            self.buffer_fill.update(len(data))
+            self.trace.record(EVT_RTT_READ, len(data))
+            
             # 转换为bytes
             if isinstance(data, list):
                 # 将列表转换为bytes
-                return bytes(data)
+                convert_start = time.perf_counter_ns()
+                data = bytes(data)
+                self.spans["to_bytes"].record(time.perf_counter_ns() - convert_start)
+                return data
             elif isinstance(data, bytes):
                 return data
             else:
                 return None
         except Exception as e:
-            self.logger.error(f"读取RTT数据失败: {str(e)}")
+            self.read_errors += 1
+            self.error_limiter.report_error(EVT_RTT_READ_ERROR, e)
+            self._note_probe_error(e)
+            if not self.connection_lost:
+                self._check_halt_when_idle(time.time())
             return None
 
+    def _fold_write_failures(self):
+        """在读取线程中将写入线程的探针调用失败计入连接健康状态"""
+        while self.write_failures:
+            try:
+                error = self.write_failures.popleft()
+            except IndexError:
+                return
+            self._note_probe_error(error)
+
+    def _read_samples(self):
+        """内存采样模式下等待到下一个采样时刻并执行读取计划，返回一个采样帧"""
+        self.sampler.wait()
+        call_start = time.perf_counter_ns()
+        frame = self.sampler.read(self.jlink.memory_read8)
+        elapsed = time.perf_counter_ns() - call_start
+        self.spans["memory_read"].record(elapsed)
+        self._note_probe_success(elapsed)
+        self.trace.record(EVT_MEMORY_SAMPLE, len(frame), len(self.sampler.reads))
+        return frame
+
     def write(self, data, buffer_index=None):
-        """写入数据到RTT缓冲区"""
+        """写入数据到RTT缓冲区
+
+        在下行转发线程中调用；探针调用失败放入write_failures，由读取线程在下一次轮询时
+        计入连接健康状态，探针调用统计和健康状态只由读取线程写入
+        """
+        if self.sampler:
+            self.logger.debug("内存采样模式没有RTT下行通道，忽略写入")
+            return False
         try:
             if buffer_index is None:
                 buffer_index = self.config.rtt_buffer_index
             if isinstance(data, str):
                 data = list(data.encode("ascii"))
+            call_start = time.perf_counter_ns()
             self.jlink.rtt_write(buffer_index, data)
+            elapsed = time.perf_counter_ns() - call_start
+            self.spans["rtt_write"].record(elapsed)
+            self.trace.record(EVT_RTT_WRITE, len(data))
             return True
         except Exception as e:
-            self.logger.error(f"写入RTT数据失败: {str(e)}")
+            self.write_failures.append(e)
+            self.write_error_limiter.report_error(EVT_RTT_WRITE_ERROR, e)
             return False
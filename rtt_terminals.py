@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RTT虚拟终端分离模块
+SEGGER_RTT_SetTerminal/SEGGER_RTT_TerminalOut在同一个上行缓冲区中以 0xFF 加终端编号字符
+切换虚拟终端，本模块按终端编号拆分数据流，配置了目标的终端单独发送，其余终端继续沿原转发路径输出
+"""
+
+import logging
+
+# 终端切换转义字节
+TERMINAL_ESCAPE = 0xFF
+TERMINAL_ESCAPE_BYTE = b"\xff"
+
+# 终端编号字符 -> 终端编号，与SEGGER_RTT.c中的_aTerminalId一致
+TERMINAL_IDS = {ord(char): index for index, char in enumerate("0123456789ABCDEF")}
+
+# 单个终端数据报的最大长度
+MAX_DATAGRAM_SIZE = 8192
+
+
+def parse_terminal_routes(routes):
+    """解析终端目标配置
+
+    Args:
+        routes: 终端编号(字符串或整数) -> [IP, 端口]
+
+    Returns:
+        dict: 终端编号 -> (IP, 端口)
+
+    Raises:
+        ValueError: 配置无效
+    """
+    parsed = {}
+    for terminal, target in routes.items():
+        terminal_id = int(terminal)
+        if not 0 <= terminal_id < len(TERMINAL_IDS):
+            raise ValueError(f"终端编号应为0到{len(TERMINAL_IDS) - 1}: {terminal}")
+        if len(target) != 2:
+            raise ValueError(f"终端 {terminal} 的目标应为 [IP, 端口]: {target!r}")
+        parsed[terminal_id] = (str(target[0]), int(target[1]))
+    return parsed
+
+
+class TerminalDemux:
+    def __init__(self, udp_manager, routes):
+        """创建虚拟终端分离器，作为RTTUDPForwarder的数据处理阶段使用
+
+        Args:
+            udp_manager: 会话的UDP管理器，与转发共用socket
+            routes: 终端编号 -> (IP, 端口)，未配置的终端沿原转发路径输出
+        """
+        self.udp_manager = udp_manager
+        self.routes = routes
+        self.logger = logging.getLogger(__name__)
+        self.terminal = 0  # 当前终端，固件复位后为0
+        self._escape_pending = False  # 上一次的数据以转义字节结尾，终端编号在下一次数据的开头
+        self.bytes_by_terminal = [0] * len(TERMINAL_IDS)  # 各终端的字节数，只由读取线程写入
+        self.datagrams_sent = 0
+        self.send_errors = 0
+
+    @classmethod
+    def from_config(cls, config, udp_manager):
+        """根据配置创建虚拟终端分离器
+
+        Returns:
+            TerminalDemux: 分离器，配置无效时返回None
+        """
+        try:
+            routes = parse_terminal_routes(config.terminal_routes)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"解析虚拟终端目标失败: {str(e)}")
+            return None
+        for terminal_id, (ip, port) in sorted(routes.items()):
+            logging.getLogger(__name__).info(f"虚拟终端 {terminal_id} 发送到 {ip}:{port}")
+        return cls(udp_manager, routes)
+
+    def process(self, data):
+        """按终端拆分一次读取的数据
+
+        以bytes.find查找转义字节，两个转义之间的数据整段归属当前终端
+
+        Args:
+            data: RTT上行数据
+
+        Returns:
+            bytes: 未配置目标的终端的数据，已移除终端切换转义
+        """
+        passthrough = []  # 未配置目标的终端的数据段，保持原有顺序
+        routed = {}  # 终端编号 -> 数据段列表
+        terminal = self.terminal
+        position = 0
+        size = len(data)
+
+        if self._escape_pending and size:
+            self._escape_pending = False
+            terminal = self._switch(terminal, data[0], passthrough, routed)
+            position = 1
+
+        while position < size:
+            escape = data.find(TERMINAL_ESCAPE_BYTE, position)
+            if escape < 0:
+                self._append(terminal, data[position:] if position else data, passthrough, routed)
+                break
+            if escape > position:
+                self._append(terminal, data[position:escape], passthrough, routed)
+            if escape + 1 >= size:
+                # 转义字节在读取边界上，终端编号在下一次数据中
+                self._escape_pending = True
+                break
+            terminal = self._switch(terminal, data[escape + 1], passthrough, routed)
+            position = escape + 2
+        self.terminal = terminal
+
+        for terminal_id, parts in routed.items():
+            self._send(b"".join(parts), self.routes[terminal_id])
+        if len(passthrough) == 1:
+            return passthrough[0]
+        return b"".join(passthrough)
+
+    def _append(self, terminal, segment, passthrough, routed):
+        """将一段数据归入所属终端"""
+        self.bytes_by_terminal[terminal] += len(segment)
+        if terminal in self.routes:
+            routed.setdefault(terminal, []).append(segment)
+        else:
+            passthrough.append(segment)
+
+    def _switch(self, terminal, id_byte, passthrough, routed):
+        """处理转义字节后的终端编号，编号无效时按普通数据保留两个字节"""
+        terminal_id = TERMINAL_IDS.get(id_byte)
+        if terminal_id is None:
+            self._append(terminal, bytes((TERMINAL_ESCAPE, id_byte)), passthrough, routed)
+            return terminal
+        return terminal_id
+
+    def _send(self, chunk, address):
+        """将一个终端的数据发送到其目标"""
+        for start in range(0, len(chunk), MAX_DATAGRAM_SIZE):
+            if self.udp_manager.send_to(chunk[start:start + MAX_DATAGRAM_SIZE], address):
+                self.datagrams_sent += 1
+            else:
+                self.send_errors += 1
+
+    def report(self):
+        """生成各终端的统计文本"""
+        counts = ", ".join(
+            f"{terminal_id}: {count}" for terminal_id, count in enumerate(self.bytes_by_terminal) if count
+        )
+        return (f"虚拟终端字节数: {counts or '无'}，单独发送 {self.datagrams_sent} 个数据报，"
+                f"发送失败 {self.send_errors} 次")
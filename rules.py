@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文本日志过滤和路由规则模块
+按行匹配规则文件中的规则，对匹配的行执行丢弃、路由、打标签或计数；
+所有规则的字面量（及正则表达式的字面量前缀）编译为一个前缀树正则表达式整块扫描，
+只有候选位置才逐条验证规则，规则文件修改后自动重新加载
+"""
+
+import json
+import logging
+import os
+import re
+import time
+
+# 规则动作
+ACTION_DROP = "drop"
+ACTION_ROUTE = "route"
+ACTION_TAG = "tag"
+ACTION_COUNT = "count"
+ACTIONS = (ACTION_DROP, ACTION_ROUTE, ACTION_TAG, ACTION_COUNT)
+
+# 检查规则文件是否修改的间隔，单位秒
+RULES_RELOAD_INTERVAL = 1.0
+
+# 不完整行的最大长度，超过后不等待换行直接按一行处理
+MAX_LINE_LENGTH = 4096
+
+# 不完整行等待换行的最长时间，单位秒，超时后按一行处理，提示符等不以换行结尾的输出不会滞留
+PARTIAL_LINE_TIMEOUT = 0.05
+
+# 正则表达式的字面量前缀至少这么长才参与前缀树预筛选，过短的前缀候选位置太多
+MIN_PREFIX_LENGTH = 3
+
+# 单个路由数据报的最大长度
+MAX_DATAGRAM_SIZE = 8192
+
+# 正则表达式中的元字符，其余字符按字面量处理
+REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+REGEX_QUANTIFIERS = set("*+?{")
+
+
+def literal_prefix(pattern):
+    """提取正则表达式开头的字面量
+
+    只做保守的提取：模式中含有 | 或以内联标志开头时不提取
+
+    Returns:
+        str: 字面量前缀，无法提取时为空字符串
+    """
+    if "|" in pattern or pattern.startswith("(?"):
+        return ""
+    prefix = []
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            if position + 1 < len(pattern) and pattern[position + 1] in REGEX_METACHARACTERS:
+                char = pattern[position + 1]
+                step = 2
+            else:
+                break
+        elif char in REGEX_METACHARACTERS:
+            break
+        else:
+            step = 1
+        if pattern[position + step:position + step + 1] in REGEX_QUANTIFIERS:
+            # 后面跟着量词的字符不一定出现
+            break
+        prefix.append(char)
+        position += step
+    return "".join(prefix)
+
+
+def trie_pattern(literals):
+    """将多个字面量合并为一个前缀树形式的正则表达式，公共前缀只比较一次"""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for byte in literal:
+            node = node.setdefault(byte, {})
+        node[None] = True
+
+    def build(node):
+        alternatives = []
+        single_bytes = []
+        for byte in sorted(key for key in node if key is not None):
+            child = build(node[byte])
+            escaped = re.escape(bytes((byte,)))
+            if child is None:
+                single_bytes.append(escaped)
+            else:
+                alternatives.append(escaped + child)
+        if single_bytes:
+            alternatives.append(single_bytes[0] if len(single_bytes) == 1 else b"[" + b"".join(single_bytes) + b"]")
+        if not alternatives:
+            return None
+        body = alternatives[0] if len(alternatives) == 1 else b"(?:" + b"|".join(alternatives) + b")"
+        if None in node:
+            body = b"(?:" + body + b")?"
+        return body
+
+    return re.compile(build(trie))
+
+
+class Rule:
+    """一条规则"""
+    def __init__(self, index, definition):
+        """解析规则定义
+
+        Args:
+            index: 规则序号，序号小的规则优先
+            definition: 规则定义，包含 literal 或 regex，以及 action，
+                route 动作需要 target: [IP, 端口]，tag 动作需要 tag
+
+        Raises:
+            ValueError: 规则无效
+        """
+        self.index = index
+        self.action = definition.get("action", ACTION_COUNT)
+        if self.action not in ACTIONS:
+            raise ValueError(f"规则 {index} 的动作无效: {self.action}，可选: {', '.join(ACTIONS)}")
+        self.name = definition.get("name") or definition.get("literal") or definition.get("regex") or ""
+
+        if "literal" in definition:
+            self.literal = definition["literal"].encode("utf-8")
+            self.regex = None
+            self.prefix = self.literal
+        elif "regex" in definition:
+            self.literal = None
+            self.regex = re.compile(definition["regex"].encode("utf-8"), re.MULTILINE)
+            self.prefix = literal_prefix(definition["regex"]).encode("utf-8")
+            if len(self.prefix) < MIN_PREFIX_LENGTH:
+                self.prefix = b""
+        else:
+            raise ValueError(f"规则 {index} 需要 literal 或 regex")
+        if self.literal is not None and (not self.literal or b"\n" in self.literal):
+            raise ValueError(f"规则 {index} 的字面量不能为空或包含换行")
+
+        self.target = None
+        self.tag = None
+        if self.action == ACTION_ROUTE:
+            target = definition.get("target")
+            if not target or len(target) != 2:
+                raise ValueError(f"规则 {index} 的 route 动作需要 target: [IP, 端口]")
+            self.target = (str(target[0]), int(target[1]))
+        elif self.action == ACTION_TAG:
+            if not definition.get("tag"):
+                raise ValueError(f"规则 {index} 的 tag 动作需要 tag")
+            self.tag = f"[{definition['tag']}] ".encode("utf-8")
+        self.matches = 0  # 命中的行数，只由读取线程写入
+
+    def match_at(self, data, position, end):
+        """规则是否在position处匹配，匹配范围限制在同一行内"""
+        if self.regex is None:
+            return True
+        return self.regex.match(data, position, end) is not None
+
+    def candidates(self, match):
+        """单独扫描该规则时，候选位置上只有该规则"""
+        return (self,)
+
+
+class RuleSet:
+    def __init__(self, definitions):
+        """编译一组规则
+
+        有字面量前缀的规则合并为一个前缀树扫描，其余规则各自扫描；
+        不合并为一个备选正则表达式，规则中的命名组和反向引用才能保持原意
+
+        Raises:
+            ValueError: 规则无效
+        """
+        self.rules = [Rule(index, definition) for index, definition in enumerate(definitions)]
+
+        # 前缀树匹配到的文本 -> 前缀是该文本前缀的规则，按规则顺序
+        prefixed = [rule for rule in self.rules if rule.prefix]
+        prefixes = sorted({rule.prefix for rule in prefixed})
+        self.prefix_scanner = trie_pattern(prefixes) if prefixes else None
+        self.candidates = {}
+        for text in prefixes:
+            self.candidates[text] = [rule for rule in prefixed if text.startswith(rule.prefix)]
+
+        # 没有字面量前缀的正则表达式，按规则顺序
+        self.unprefixed = [rule for rule in self.rules if not rule.prefix]
+
+    def next_hit(self, data, position, end):
+        """查找position之后最早匹配的规则
+
+        Returns:
+            tuple: (匹配位置, 规则)，同一位置有多条规则匹配时取序号最小的，没有匹配时返回None
+        """
+        best = self._scan(self.prefix_scanner, data, position, end, self._prefix_rules)
+        for rule in self.unprefixed:
+            # 其余规则只需在已有命中所在行及之前查找，更靠后的匹配不会更早
+            scan_end = end
+            if best:
+                line_end = data.find(b"\n", best[0], end)
+                scan_end = line_end + 1 if line_end >= 0 else end
+            hit = self._scan(rule.regex, data, position, scan_end, rule.candidates)
+            if hit and (not best or hit[0] < best[0] or (hit[0] == best[0] and rule.index < best[1].index)):
+                best = hit
+        return best
+
+    @staticmethod
+    def _scan(scanner, data, position, end, rules_at):
+        """用扫描器查找候选位置，并验证候选位置上的规则"""
+        if scanner is None:
+            return None
+        while position < end:
+            match = scanner.search(data, position, end)
+            if not match:
+                return None
+            start = match.start()
+            line_end = data.find(b"\n", start)
+            if line_end < 0:
+                line_end = len(data)
+            for rule in rules_at(match):
+                if rule.match_at(data, start, line_end):
+                    return start, rule
+            position = start + 1
+        return None
+
+    def _prefix_rules(self, match):
+        """前缀树匹配文本对应的候选规则"""
+        return self.candidates[match.group()]
+
+
+class RulesStage:
+    def __init__(self, path, udp_manager):
+        """创建过滤和路由规则阶段，作为RTTUDPForwarder的数据处理阶段使用
+
+        Args:
+            path: 规则文件路径，JSON数组，每项为一条规则
+            udp_manager: 会话的UDP管理器，route动作与转发共用socket
+
+        Raises:
+            ValueError: 规则无效
+            OSError: 规则文件无法读取
+        """
+        self.path = path
+        self.udp_manager = udp_manager
+        self.logger = logging.getLogger(__name__)
+        self.rule_set = None
+        self._mtime = None
+        self._last_check = time.monotonic()
+        self._partial = b""  # 不完整的行，与下一次数据拼接
+        self._partial_since = 0.0  # 不完整的行开始等待换行的时间
+        self.dropped_lines = 0
+        self.routed_lines = 0
+        self.tagged_lines = 0
+        self._load()
+
+    @classmethod
+    def from_config(cls, config, udp_manager):
+        """根据配置加载规则文件
+
+        Returns:
+            RulesStage: 规则阶段，规则文件无效时返回None
+        """
+        try:
+            return cls(config.rules_file, udp_manager)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"加载规则文件失败: {str(e)}")
+            return None
+
+    def _load(self):
+        """读取并编译规则文件，失败时抛出异常且保留原有规则"""
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r", encoding="utf-8") as f:
+            definitions = json.load(f)
+        if not isinstance(definitions, list):
+            raise ValueError("规则文件应为规则数组")
+        self.rule_set = RuleSet(definitions)
+        self._mtime = mtime
+        prefixed = len(self.rule_set.rules) - len(self.rule_set.unprefixed)
+        self.logger.info(f"已从 {self.path} 加载 {len(self.rule_set.rules)} 条规则，"
+                         f"{prefixed} 条使用字面量预筛选")
+
+    def _check_reload(self):
+        """规则文件修改后重新加载"""
+        now = time.monotonic()
+        if now - self._last_check < RULES_RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            if os.stat(self.path).st_mtime == self._mtime:
+                return
+            self._load()
+        except Exception as e:
+            # 保留原有规则，等文件再次修改后重试
+            try:
+                self._mtime = os.stat(self.path).st_mtime
+            except OSError:
+                pass
+            self.logger.error(f"重新加载规则文件失败，继续使用原有规则: {str(e)}")
+
+    def process(self, data):
+        """按行应用规则
+
+        Args:
+            data: 文本数据
+
+        Returns:
+            bytes: 处理后的数据，末尾不完整的行留到下一次或由flush取出
+        """
+        self._check_reload()
+        held = len(self._partial)
+        if held:
+            data = self._partial + data
+            self._partial = b""
+        last_newline = data.rfind(b"\n")
+        if last_newline + 1 < len(data):
+            if len(data) - last_newline - 1 < MAX_LINE_LENGTH:
+                if not held or last_newline >= held:
+                    # 原有的不完整行已经结束，新的不完整行从现在开始等待
+                    self._partial_since = time.monotonic()
+                self._partial = data[last_newline + 1:]
+                data = data[:last_newline + 1]
+        if not data:
+            return b""
+        return self._apply(data)
+
+    def flush(self):
+        """取出等待换行超时的不完整行，在读取线程空闲时调用
+
+        Returns:
+            bytes: 按一行应用规则后的数据，没有超时的不完整行时为空
+        """
+        if not self._partial or time.monotonic() - self._partial_since < PARTIAL_LINE_TIMEOUT:
+            return b""
+        data = self._partial
+        self._partial = b""
+        return self._apply(data)
+
+    def _apply(self, data):
+        """对完整的行应用规则，每行只执行序号最小的匹配规则"""
+        rule_set = self.rule_set
+        output = []
+        routed = {}  # 目标地址 -> 行列表
+        copied = 0  # 已复制到输出的位置
+        position = 0
+        size = len(data)
+        while position < size:
+            hit = rule_set.next_hit(data, position, size)
+            if hit is None:
+                break
+            start, rule = hit
+            line_start = data.rfind(b"\n", 0, start) + 1
+            line_end = data.find(b"\n", start) + 1 or size
+
+            # 同一行内可能还有序号更小的规则匹配
+            scan = start + 1
+            while rule.index and scan < line_end:
+                other = rule_set.next_hit(data, scan, line_end)
+                if other is None:
+                    break
+                if other[1].index < rule.index:
+                    rule = other[1]
+                scan = other[0] + 1
+
+            rule.matches += 1
+            position = line_end
+            if rule.action == ACTION_COUNT:
+                continue
+            output.append(data[copied:line_start])
+            copied = line_end
+            if rule.action == ACTION_TAG:
+                output.append(rule.tag)
+                output.append(data[line_start:line_end])
+                self.tagged_lines += 1
+            elif rule.action == ACTION_ROUTE:
+                routed.setdefault(rule.target, []).append(data[line_start:line_end])
+                self.routed_lines += 1
+            else:
+                self.dropped_lines += 1
+
+        for target, lines in routed.items():
+            self._send(b"".join(lines), target)
+        if not copied:
+            return data
+        output.append(data[copied:])
+        return b"".join(output)
+
+    def _send(self, chunk, target):
+        """发送路由的行"""
+        for start in range(0, len(chunk), MAX_DATAGRAM_SIZE):
+            self.udp_manager.send_to(chunk[start:start + MAX_DATAGRAM_SIZE], target)
+
+    def report(self):
+        """生成规则统计文本"""
+        lines = [f"规则: 丢弃 {self.dropped_lines} 行，路由 {self.routed_lines} 行，打标签 {self.tagged_lines} 行"]
+        for rule in self.rule_set.rules:
+            if rule.matches:
+                lines.append(f"  [{rule.index}] {rule.action} {rule.name}: {rule.matches}")
+        return "\n".join(lines)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+探针会话模块
+每个JLink探针对应一个独立的转发会话，拥有各自的配置、RTT通道和UDP目标
+"""
+
+import logging
+from rtt_manager import RTTManager
+from udp_manager import UDPManager
+from forwarder import RTTUDPForwarder, UDPRTTForwarder
+from ring_buffer import ByteRing
+from stats import LATENCY_BUCKETS, LATENCY_BUCKETS_NS
+from profiling import format_spans
+from tracing import TraceRing
+from binlog import BinaryLogDecoder
+from telemetry import TelemetryDecoder
+from memory_sampler import sample_layout
+from rtt_terminals import TerminalDemux
+from rules import RulesStage
+
+
+# 会话统计字段，顺序也用于进程模式下的共享内存布局
+STAT_FIELDS = (
+    "rtt_bytes_read",
+    "udp_bytes_sent",
+    "udp_datagrams_sent",
+    "udp_send_errors",
+    "udp_bytes_received",
+    "udp_datagrams_received",
+    "rtt_write_errors",
+    "rtt_read_errors",
+    "rtt_buffer_peak",
+    "rtt_buffer_size",
+    "send_queue_bytes",
+    "probe_calls",
+    "probe_time_total",
+    "probe_time_peak",
+    "poll_interval",
+) + tuple(f"probe_latency_bucket_{index}" for index in range(len(LATENCY_BUCKETS) + 1))
+
+
+# dump_trace默认输出的事件数
+TRACE_DUMP_EVENTS = 200
+
+
+class ProbeSession:
+    def __init__(self, serial_number, config, probe_pool, on_connection_lost=None, merger=None):
+        """创建探针会话
+
+        Args:
+            serial_number: JLink设备序列号
+            config: 该会话使用的配置，通常由Config.for_session生成
+            probe_pool: 所有会话共享的探针会话池
+            on_connection_lost: 连接丢失回调函数，参数为会话本身
+            merger: 所有会话共享的多探针合并流，None表示不参与合并
+        """
+        self.serial_number = str(serial_number)
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.on_connection_lost = on_connection_lost
+        self.merger = merger
+        self.merge_tap = None
+        self.demux = None  # 虚拟终端分离阶段
+        self.decoder = None  # 二进制日志解码阶段
+        self.rules = None  # 过滤和路由规则阶段
+        self.telemetry = None  # 遥测解码阶段
+        self.running = False
+
+        # 会话内各组件共用一个追踪缓冲区，事件按时间顺序交织
+        self.trace = TraceRing(config.trace_buffer_events)
+        self.trace_cursor = self.trace.position
+        
+        # 创建管理器
+        self.rtt_manager = RTTManager(config, probe_pool, trace=self.trace)
+        self.udp_manager = UDPManager(config, trace=self.trace)
+        self.rtt_to_udp_forwarder = RTTUDPForwarder(self.rtt_manager, self.udp_manager, config)
+        self.udp_to_rtt_forwarder = UDPRTTForwarder(self.rtt_manager, self.udp_manager, config)
+        
+        # RTT终端数据，由读取线程写入，界面按自己的节奏读取
+        self.terminal = ByteRing(config.terminal_buffer_size) if config.terminal_buffer_size > 0 else None
+        if self.terminal:
+            self.rtt_to_udp_forwarder.add_tap(self.terminal.tap)
+
+    def start(self):
+        """启动会话的转发服务"""
+        if self.running:
+            self.logger.warning(f"会话 {self.serial_number} 已经在运行")
+            return False
+
+        # 先创建数据处理阶段，固件文件或帧结构有问题时不占用探针
+        if self.config.binlog_enabled and self.config.telemetry_enabled:
+            self.logger.error("二进制日志和遥测解码不能同时启用")
+            return False
+        if self.config.rules_file and (self.config.telemetry_enabled or self.config.acquisition_mode == "memory"):
+            # 规则按行处理文本，会拆分和改写二进制帧
+            self.logger.error("过滤和路由规则不能与遥测解码或内存采样同时启用")
+            return False
+        if not self._attach_stages():
+            return False
+
+        # 连接RTT，传入连接丢失回调
+        if not self.rtt_manager.connect(self.serial_number, on_connection_lost=self._on_connection_lost):
+            self._detach_stages()
+            return False
+
+        # 设置UDP
+        if not self.udp_manager.setup():
+            self._detach_stages()
+            self.rtt_manager.disconnect()
+            return False
+
+        # 接入多探针合并流
+        if self.merger:
+            self.merge_tap = self.merger.add_source(self.serial_number)
+            self.rtt_to_udp_forwarder.add_tap(self.merge_tap)
+        
+        # 启动RTT到UDP转发
+        if not self.rtt_to_udp_forwarder.start():
+            self._detach_stages()
+            self._detach_merger()
+            self.udp_manager.close()
+            self.rtt_manager.disconnect()
+            return False
+
+        # 启动UDP到RTT转发
+        if not self.udp_to_rtt_forwarder.start():
+            self.rtt_to_udp_forwarder.stop()
+            self._detach_stages()
+            self._detach_merger()
+            self.udp_manager.close()
+            self.rtt_manager.disconnect()
+            return False
+
+        self.running = True
+        self.logger.info(f"会话 {self.serial_number} 已启动")
+        return True
+
+    def stop(self):
+        """停止会话的转发服务"""
+        self.running = False
+        self.rtt_to_udp_forwarder.stop()
+        self.udp_to_rtt_forwarder.stop()
+        self._detach_stages()
+        self._detach_merger()
+        self.udp_manager.close()
+        self.rtt_manager.disconnect()
+
+    def _attach_stages(self):
+        """按配置创建虚拟终端分离、二进制日志解码、过滤规则或遥测解码阶段并接入转发器
+
+        虚拟终端最先分离，后续阶段只处理未单独发送的终端；
+        二进制日志解码后，规则、旁路监听器和UDP目标收到的都是解码后的文本；
+        遥测帧由遥测输出端发布，不再转发
+        """
+        if self.config.terminal_routes:
+            self.demux = TerminalDemux.from_config(self.config, self.udp_manager)
+            if not self.demux:
+                return False
+            self.rtt_to_udp_forwarder.add_stage(self.demux)
+        if self.config.binlog_enabled:
+            self.decoder = BinaryLogDecoder.from_config(self.config)
+            if not self.decoder:
+                self._detach_stages()
+                return False
+            self.rtt_to_udp_forwarder.add_stage(self.decoder)
+        if self.config.rules_file:
+            self.rules = RulesStage.from_config(self.config, self.udp_manager)
+            if not self.rules:
+                self._detach_stages()
+                return False
+            self.rtt_to_udp_forwarder.add_stage(self.rules)
+        if self.config.telemetry_enabled:
+            # 内存采样帧本身就是定长帧，未配置帧结构时按采样变量解码
+            fields = sample_layout(self.config) if self.config.acquisition_mode == "memory" else None
+            self.telemetry = TelemetryDecoder.from_config(self.config, self.udp_manager, fields)
+            if not self.telemetry:
+                self._detach_stages()
+                return False
+            self.rtt_to_udp_forwarder.add_stage(self.telemetry)
+        return True
+
+    def _detach_stages(self):
+        """移除数据处理阶段，须在读取线程停止后调用"""
+        if self.demux:
+            self.rtt_to_udp_forwarder.remove_stage(self.demux)
+            self.demux = None
+        if self.decoder:
+            self.rtt_to_udp_forwarder.remove_stage(self.decoder)
+            self.decoder = None
+        if self.rules:
+            self.rtt_to_udp_forwarder.remove_stage(self.rules)
+            self.rules = None
+        if self.telemetry:
+            self.rtt_to_udp_forwarder.remove_stage(self.telemetry)
+            self.telemetry.close()
+            self.telemetry = None
+
+    def _detach_merger(self):
+        """从多探针合并流中移除本会话，须在读取线程停止后调用"""
+        if self.merge_tap:
+            self.rtt_to_udp_forwarder.remove_tap(self.merge_tap)
+            self.merger.remove_source(self.serial_number)
+            self.merge_tap = None
+
+    def write_terminal(self, data):
+        """将终端输入交给下行转发线程写入RTT，不在调用线程中访问探针
+        
+        Returns:
+            bool: 是否已加入写入队列
+        """
+        if not self.running:
+            return False
+        return self.udp_to_rtt_forwarder.submit(data)
+    
+    def stats(self):
+        """获取会话统计计数"""
+        up = self.rtt_to_udp_forwarder
+        down = self.udp_to_rtt_forwarder
+        rtt = self.rtt_manager
+        stats = {
+            "rtt_bytes_read": up.bytes_read,
+            "udp_bytes_sent": up.bytes_sent,
+            "udp_datagrams_sent": up.datagrams_sent,
+            "udp_send_errors": up.send_errors,
+            "udp_bytes_received": down.bytes_received,
+            "udp_datagrams_received": down.datagrams_received,
+            "rtt_write_errors": down.write_errors,
+            "rtt_read_errors": rtt.read_errors,
+            "rtt_buffer_peak": rtt.buffer_fill.value,
+            "rtt_buffer_size": rtt.buffer_size,
+            "send_queue_bytes": up.pending_bytes,
+            "probe_calls": rtt.probe_histogram.count,
+            "probe_time_total": rtt.probe_histogram.total / 1e9,
+            "probe_time_peak": rtt.probe_latency.value,
+            "poll_interval": rtt.get_idle_interval(),
+        }
+        for index, count in enumerate(rtt.probe_histogram.bucket_counts(LATENCY_BUCKETS_NS)):
+            stats[f"probe_latency_bucket_{index}"] = count
+        return stats
+
+    def profile_spans(self):
+        """获取数据路径各阶段的耗时直方图，键为 组件.阶段"""
+        spans = {}
+        for prefix, component in (
+            ("rtt", self.rtt_manager),
+            ("forward", self.rtt_to_udp_forwarder),
+            ("udp", self.udp_manager),
+        ):
+            for name, histogram in component.spans.items():
+                spans[f"{prefix}.{name}"] = histogram
+        return spans
+
+    def dump_profile(self):
+        """将各阶段耗时分位数输出到日志，单位微秒"""
+        self.logger.info(f"会话 {self.serial_number} 数据路径阶段耗时(us):\n{format_spans(self.profile_spans())}")
+        if self.demux:
+            self.logger.info(f"会话 {self.serial_number} {self.demux.report()}")
+        if self.decoder:
+            self.logger.info(f"会话 {self.serial_number} {self.decoder.report()}")
+        if self.rules:
+            self.logger.info(f"会话 {self.serial_number} {self.rules.report()}")
+        if self.telemetry:
+            self.logger.info(f"会话 {self.serial_number} {self.telemetry.report()}")
+        if self.rtt_manager.sampler:
+            self.logger.info(f"会话 {self.serial_number} {self.rtt_manager.sampler.report()}")
+        latency = self.rtt_to_udp_forwarder.latency
+        if latency:
+            self.logger.info(f"会话 {self.serial_number} 端到端延迟(us):\n{latency.report()}")
+
+    def dump_trace(self, count=TRACE_DUMP_EVENTS):
+        """将最近的追踪事件格式化后输出到日志"""
+        lines = [self.trace.format(event) for event in self.trace.recent(count)]
+        if self.trace.evicted_strings:
+            lines.append(f"字符串参数表已淘汰 {self.trace.evicted_strings} 个最早的字符串")
+        self.logger.info(f"会话 {self.serial_number} 最近 {len(lines)} 个追踪事件:\n" + "\n".join(lines))
+
+    def tail_trace(self):
+        """将上次调用以来的新追踪事件输出到日志"""
+        events, self.trace_cursor, skipped = self.trace.read(self.trace_cursor)
+        if skipped:
+            self.logger.info(f"[{self.serial_number}] 跳过 {skipped} 个已被覆盖的追踪事件")
+        for event in events:
+            self.logger.info(f"[{self.serial_number}] {self.trace.format(event)}")
+
+    def sample_profile(self, path, duration):
+        """在会话所在进程中采样分析
+
+        线程模式的会话与控制进程共用进程，已由控制进程的采样覆盖
+        """
+        return False
+
+    def describe(self):
+        """获取会话的显示信息"""
+        return {
+            "serial": self.serial_number,
+            "target_device": self.config.target_device,
+            "destination": f"{self.config.udp_ip}:{self.config.udp_port}",
+            "status": "运行中" if self.running else "已停止",
+        }
+
+    def _on_connection_lost(self):
+        """RTT管理器检测到连接丢失"""
+        if self.on_connection_lost:
+            self.on_connection_lost(self)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时分析模块
+记录从进程启动到首个窗口显示、设备列表就绪和开始转发的时间线，
+通过 --startup-profile 参数或 RTT2UDP_STARTUP_PROFILE 环境变量启用
+"""
+
+import logging
+import os
+import sys
+import time
+
+# 进程内的时间基准，本模块应在主程序中最先导入
+_T0 = time.perf_counter()
+
+# 启用启动耗时分析的命令行参数和环境变量
+PROFILE_FLAG = "--startup-profile"
+PROFILE_ENV = "RTT2UDP_STARTUP_PROFILE"
+
+# 里程碑名称，用于输出时间线
+MILESTONE_NAMES = {
+    "imports": "模块导入完成",
+    "window": "首个窗口显示",
+    "device_list": "JLink设备列表就绪",
+    "forwarding": "开始转发",
+}
+
+
+class StartupProfiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+        self.marks = []  # (名称, 距进程启动的秒数)
+        self._seen = set()
+
+    def mark(self, name):
+        """记录一个里程碑，同名里程碑只记录第一次"""
+        if not self.enabled or name in self._seen:
+            return
+        self._seen.add(name)
+        elapsed = time.perf_counter() - _T0
+        self.marks.append((name, elapsed))
+        self.logger.info(f"启动耗时: {MILESTONE_NAMES.get(name, name)} {elapsed * 1000:.0f}ms")
+
+    def timeline(self):
+        """获取时间线，每项为 (名称, 距进程启动的毫秒数, 距上一里程碑的毫秒数)"""
+        result = []
+        previous = 0.0
+        for name, elapsed in self.marks:
+            result.append((name, elapsed * 1000, (elapsed - previous) * 1000))
+            previous = elapsed
+        return result
+
+    def report(self):
+        """输出完整的启动时间线"""
+        if not self.enabled or not self.marks:
+            return
+        lines = [
+            f"  {MILESTONE_NAMES.get(name, name)}: {total:.0f}ms (+{delta:.0f}ms)"
+            for name, total, delta in self.timeline()
+        ]
+        self.logger.info("启动时间线:\n" + "\n".join(lines))
+
+
+def _enabled_from_environment():
+    """根据命令行参数和环境变量判断是否启用"""
+    if PROFILE_FLAG in sys.argv[1:]:
+        return True
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+
+# 全局启动耗时分析器
+profiler = StartupProfiler(_enabled_from_environment())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+运行统计模块
+数据路径只做整数累加和峰值比较，不加锁；界面以低频率采样累计值，
+计算速率、缓冲区占用率和探针延迟，并保留最近的历史用于趋势图
+"""
+
+import collections
+import time
+
+# 导出探针调用耗时直方图时的桶上界，单位秒
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LATENCY_BUCKETS_NS = tuple(round(bound * 1e9) for bound in LATENCY_BUCKETS)
+
+
+class WindowPeak:
+    """按时间窗口统计的峰值
+
+    只由一个线程调用update；每个窗口结束时发布该窗口的峰值，读取方只读，无需加锁
+    """
+    def __init__(self, window=1.0):
+        self.window = window  # 窗口长度，单位秒
+        self.peak = 0  # 上一个完整窗口的峰值
+        self._current = 0
+        self._window_start = time.monotonic()
+
+    def update(self, value):
+        """记录一个值"""
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self.peak = self._current
+            self._current = 0
+            self._window_start = now
+        if value > self._current:
+            self._current = value
+
+    @property
+    def value(self):
+        """最近一个窗口内的峰值，长时间没有记录时为0"""
+        if time.monotonic() - self._window_start >= 2 * self.window:
+            return 0
+        return max(self.peak, self._current)
+
+
+# 按速率显示的累计计数字段，键为派生指标名称
+RATE_FIELDS = {
+    "rtt_read_rate": "rtt_bytes_read",
+    "udp_send_rate": "udp_bytes_sent",
+    "udp_datagram_rate": "udp_datagrams_sent",
+    "udp_receive_rate": "udp_bytes_received",
+    "udp_receive_datagram_rate": "udp_datagrams_received",
+}
+
+# 计入丢弃和错误总数的累计计数字段
+DROP_FIELDS = ("udp_send_errors", "rtt_write_errors", "rtt_read_errors")
+
+
+class StatsHistory:
+    def __init__(self, length=60):
+        """创建会话统计的采样历史
+
+        Args:
+            length: 每个指标保留的采样点数
+        """
+        self.length = length
+        self.history = collections.defaultdict(lambda: collections.deque(maxlen=self.length))
+        self.latest = {}
+        self._previous = None
+        self._previous_time = None
+
+    def sample(self, stats, now=None):
+        """采样一次会话统计
+
+        Args:
+            stats: 会话的stats()返回的累计计数
+            now: 采样时间，None表示当前单调时钟
+
+        Returns:
+            dict: 派生指标，第一次采样时速率为0
+        """
+        now = time.monotonic() if now is None else now
+        previous = self._previous or stats
+        elapsed = (now - self._previous_time) if self._previous_time is not None else 0
+
+        metrics = {}
+        for name, field in RATE_FIELDS.items():
+            delta = stats.get(field, 0) - previous.get(field, 0)
+            metrics[name] = delta / elapsed if elapsed > 0 else 0.0
+
+        buffer_size = stats.get("rtt_buffer_size", 0)
+        metrics["buffer_fill"] = (
+            min(100.0, stats.get("rtt_buffer_peak", 0) * 100.0 / buffer_size) if buffer_size else None
+        )
+        metrics["send_queue"] = stats.get("send_queue_bytes", 0)
+        metrics["drops"] = sum(stats.get(field, 0) for field in DROP_FIELDS)
+
+        calls = stats.get("probe_calls", 0) - previous.get("probe_calls", 0)
+        total = stats.get("probe_time_total", 0) - previous.get("probe_time_total", 0)
+        metrics["probe_latency_avg"] = total / calls * 1000 if calls > 0 else 0.0  # 毫秒
+        metrics["probe_latency_peak"] = stats.get("probe_time_peak", 0) * 1000  # 毫秒
+
+        for name, value in metrics.items():
+            self.history[name].append(value or 0)
+        self.latest = metrics
+        self._previous = dict(stats)
+        self._previous_time = now
+        return metrics
+
+
+def format_rate(value):
+    """格式化字节速率"""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if value < 1024 or unit == "MB/s":
+            return f"{value:.0f} {unit}" if unit == "B/s" else f"{value:.1f} {unit}"
+        value /= 1024
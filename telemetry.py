@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+遥测数据解码模块
+RTT通道传输定长的二进制采样帧时，按配置的帧结构以NumPy结构化类型整块解码，
+不完整的帧留到下一次读取，配置了帧同步标记时校验每帧开头并在错位后重新同步，解码后的各信号数组按信号分别发送到UDP目标或写入CSV文件；
+可另外按窗口计算各信号的最小值、最大值和均值，将降采样后的数据发送到单独的UDP目标
+"""
+
+import logging
+import os
+import struct
+
+# 信号类型名称 -> NumPy类型（小端），顺序也是UDP数据报中的类型编号
+SIGNAL_TYPES = (
+    ("u8", "u1"),
+    ("i8", "i1"),
+    ("u16", "<u2"),
+    ("i16", "<i2"),
+    ("u32", "<u4"),
+    ("i32", "<i4"),
+    ("u64", "<u8"),
+    ("i64", "<i8"),
+    ("f32", "<f4"),
+    ("f64", "<f8"),
+)
+SIGNAL_TYPE_CODES = {name: code for code, (name, _) in enumerate(SIGNAL_TYPES)}
+
+# 信号数据报头：信号序号(uint8)、类型编号(uint8)、采样数(uint16)、首个采样的帧序号(uint32)，小端
+SIGNAL_HEADER = struct.Struct("<BBHI")
+
+# 单个信号数据报的最大负载，避免IP分片
+MAX_SIGNAL_PAYLOAD = 1400
+
+# 降采样数据报中每个窗口的值：最小值、最大值、均值，均为float64
+DECIMATED_VALUES = 3
+DECIMATED_TYPE_CODE = SIGNAL_TYPE_CODES["f64"]
+
+# 帧序号回绕周期
+FRAME_NUMBER_WRAP = 1 << 32
+
+
+def parse_sync(text):
+    """解析帧同步标记配置
+
+    Args:
+        text: 十六进制字符串，如 "A55A"，为空表示没有同步标记
+
+    Returns:
+        bytes: 同步标记
+
+    Raises:
+        ValueError: 不是有效的十六进制字符串
+    """
+    return bytes.fromhex(text.replace("0x", "").replace(" ", "")) if text else b""
+
+
+class TelemetryLayout:
+    def __init__(self, fields, sync=b""):
+        """根据配置创建帧结构
+
+        Args:
+            fields: 帧内各信号，每项为 [名称, 类型]，类型见SIGNAL_TYPES
+            sync: 每帧开头的同步标记，位于各信号之前，为空表示没有同步标记
+
+        Raises:
+            ValueError: 帧结构无效
+        """
+        import numpy
+        if not fields:
+            raise ValueError("未配置遥测帧结构telemetry_layout")
+        types = dict(SIGNAL_TYPES)
+        self.names = []
+        self.type_names = []
+        for field in fields:
+            if len(field) != 2:
+                raise ValueError(f"遥测帧字段应为 [名称, 类型]: {field!r}")
+            name, type_name = field
+            if type_name not in types:
+                raise ValueError(f"未知的信号类型 {type_name}，可选: {', '.join(types)}")
+            if name in self.names:
+                raise ValueError(f"信号名称重复: {name}")
+            self.names.append(name)
+            self.type_names.append(type_name)
+        # 同步标记不作为信号，各信号按偏移排在其后
+        formats = [types[type_name] for type_name in self.type_names]
+        offsets = []
+        position = len(sync)
+        for type_format in formats:
+            offsets.append(position)
+            position += numpy.dtype(type_format).itemsize
+        self.dtype = numpy.dtype({"names": self.names, "formats": formats, "offsets": offsets, "itemsize": position})
+        self.frame_size = self.dtype.itemsize
+        self.sync = sync
+
+    def describe(self):
+        """生成帧结构说明文本"""
+        fields = ", ".join(f"{name}:{type_name}" for name, type_name in zip(self.names, self.type_names))
+        sync = f"同步标记 {self.sync.hex().upper()}, " if self.sync else ""
+        return f"{self.frame_size} 字节/帧 ({sync}{fields})"
+
+
+class UDPSignalSink:
+    def __init__(self, udp_manager, address, layout):
+        """将各信号数组分别发送到UDP目标
+
+        每个数据报只含一个信号的连续采样，以SIGNAL_HEADER开头，之后是小端的采样数组
+
+        Args:
+            udp_manager: 会话的UDP管理器，与转发共用socket
+            address: 目标地址 (IP, 端口)
+            layout: 帧结构
+        """
+        self.udp_manager = udp_manager
+        self.address = address
+        self.signals = [
+            (index, name, SIGNAL_TYPE_CODES[type_name], MAX_SIGNAL_PAYLOAD // layout.dtype[name].itemsize)
+            for index, (name, type_name) in enumerate(zip(layout.names, layout.type_names))
+        ]
+        self.datagrams_sent = 0
+
+    def write(self, frames, first_frame):
+        """发送一批帧的各信号数组"""
+        for index, name, type_code, max_samples in self.signals:
+            # 结构化数组的字段是跨步视图，tobytes一次复制为连续数组
+            column = frames[name].tobytes()
+            itemsize = len(column) // len(frames)
+            for start in range(0, len(frames), max_samples):
+                count = min(max_samples, len(frames) - start)
+                header = SIGNAL_HEADER.pack(index, type_code, count, (first_frame + start) % FRAME_NUMBER_WRAP)
+                payload = column[start * itemsize:(start + count) * itemsize]
+                if self.udp_manager.send_to(header + payload, self.address):
+                    self.datagrams_sent += 1
+
+    def close(self):
+        """UDP socket由会话关闭"""
+        pass
+
+
+class CSVSignalSink:
+    def __init__(self, path, layout):
+        """将解码后的帧追加写入CSV文件，新文件先写入表头
+
+        Args:
+            path: CSV文件路径
+            layout: 帧结构
+        """
+        import numpy
+        self.path = path
+        self._savetxt = numpy.savetxt
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        if new_file:
+            self.file.write(",".join(layout.names) + "\n")
+        self.formats = ["%.9g" if type_name.startswith("f") else "%d" for type_name in layout.type_names]
+
+    def write(self, frames, first_frame):
+        """追加一批帧"""
+        self._savetxt(self.file, frames, fmt=self.formats, delimiter=",")
+
+    def close(self):
+        """关闭CSV文件"""
+        self.file.close()
+
+
+class DecimationSink:
+    def __init__(self, udp_manager, address, layout, factor):
+        """按窗口降采样后发送到UDP目标
+
+        每factor帧为一个窗口，计算各信号的最小值、最大值和均值；数据报格式与UDPSignalSink相同，
+        类型编号为f64，采样数为窗口数，每个窗口依次为最小值、最大值、均值，帧序号为首个窗口的首帧
+
+        Args:
+            udp_manager: 会话的UDP管理器，与转发共用socket
+            address: 目标地址 (IP, 端口)
+            layout: 帧结构
+            factor: 每个窗口的帧数
+        """
+        import numpy
+        self.udp_manager = udp_manager
+        self.address = address
+        self.names = layout.names
+        self.factor = factor
+        self.max_windows = MAX_SIGNAL_PAYLOAD // (DECIMATED_VALUES * 8)
+        self._numpy = numpy
+        self._carry = None  # 不足一个窗口的帧，与下一批帧拼接
+        self._carry_first = 0
+        self.datagrams_sent = 0
+
+    def write(self, frames, first_frame):
+        """累积帧并发送完整窗口的降采样结果"""
+        numpy = self._numpy
+        if self._carry is not None:
+            frames = numpy.concatenate((self._carry, frames))
+            first_frame = self._carry_first
+            self._carry = None
+        windows = len(frames) // self.factor
+        full = windows * self.factor
+        if full < len(frames):
+            self._carry = frames[full:].copy()
+            self._carry_first = first_frame + full
+        if not windows:
+            return
+
+        reduced = numpy.empty((windows, DECIMATED_VALUES), dtype="<f8")
+        for index, name in enumerate(self.names):
+            blocks = frames[name][:full].reshape(windows, self.factor)
+            reduced[:, 0] = blocks.min(axis=1)
+            reduced[:, 1] = blocks.max(axis=1)
+            reduced[:, 2] = blocks.mean(axis=1, dtype=numpy.float64)
+            data = reduced.tobytes()
+            row_size = DECIMATED_VALUES * 8
+            for start in range(0, windows, self.max_windows):
+                count = min(self.max_windows, windows - start)
+                header = SIGNAL_HEADER.pack(index, DECIMATED_TYPE_CODE, count,
+                                            (first_frame + start * self.factor) % FRAME_NUMBER_WRAP)
+                if self.udp_manager.send_to(header + data[start * row_size:(start + count) * row_size], self.address):
+                    self.datagrams_sent += 1
+
+    def close(self):
+        """丢弃不足一个窗口的帧"""
+        self._carry = None
+
+
+class TelemetryDecoder:
+    def __init__(self, layout):
+        """创建遥测解码器，作为RTTUDPForwarder的数据处理阶段使用
+
+        解码后的原始帧不再转发到会话的UDP目标，由各输出端发布。
+        没有同步标记时无法发现错位：从帧中间开始接收（如连接到已在运行的目标）或RTT缓冲区溢出丢失字节后，
+        之后的帧都按错误的边界解码
+
+        Args:
+            layout: 帧结构
+        """
+        import numpy
+        self.layout = layout
+        self.logger = logging.getLogger(__name__)
+        self.sinks = []  # 输出端，在读取线程中以 (帧数组, 首帧序号) 调用write
+        self._numpy = numpy
+        self._frombuffer = numpy.frombuffer
+        self._sync = numpy.frombuffer(layout.sync, dtype="u1")
+        self._pending = b""  # 未完整接收的帧
+        self._synced = True  # 是否已对齐帧边界，错位后在找到同步标记前为False
+        self.frames = 0  # 已解码的帧数
+        self.misalignments = 0  # 发现帧错位的次数
+        self.skipped_bytes = 0  # 重新同步时跳过的字节数
+
+    @classmethod
+    def from_config(cls, config, udp_manager, fields=None):
+        """根据配置创建遥测解码器和输出端
+
+        Args:
+            config: 会话配置
+            udp_manager: 会话的UDP管理器
+            fields: 未配置telemetry_layout时使用的帧结构
+
+        Returns:
+            TelemetryDecoder: 解码器，缺少NumPy、帧结构无效或输出端创建失败时返回None
+        """
+        logger = logging.getLogger(__name__)
+        try:
+            import numpy
+        except ImportError:
+            logger.error("遥测解码需要NumPy，请先安装: pip install numpy")
+            return None
+        try:
+            # 内存采样帧由主机生成，不含同步标记
+            sync = parse_sync(config.telemetry_sync) if config.acquisition_mode != "memory" else b""
+            layout = TelemetryLayout(config.telemetry_layout or fields, sync)
+        except Exception as e:
+            logger.error(f"解析遥测帧结构失败: {str(e)}")
+            return None
+
+        decoder = cls(layout)
+        if config.telemetry_port:
+            decoder.add_sink(UDPSignalSink(udp_manager, (config.telemetry_ip, config.telemetry_port), layout))
+        if config.telemetry_decimation > 1 and config.telemetry_decimated_port:
+            decoder.add_sink(DecimationSink(
+                udp_manager, (config.telemetry_ip, config.telemetry_decimated_port), layout, config.telemetry_decimation
+            ))
+        if config.telemetry_csv_path:
+            try:
+                decoder.add_sink(CSVSignalSink(config.telemetry_csv_path, layout))
+            except Exception as e:
+                logger.error(f"打开遥测CSV文件失败: {str(e)}")
+                decoder.close()
+                return None
+        if not decoder.sinks:
+            logger.warning("未配置遥测输出端，解码后的数据将被丢弃")
+        logger.info(f"遥测帧结构: {layout.describe()}")
+        return decoder
+
+    def add_sink(self, sink):
+        """添加输出端，须在转发开始前调用"""
+        self.sinks.append(sink)
+
+    def process(self, data):
+        """解码一次读取的数据中的完整帧
+
+        Args:
+            data: RTT上行的二进制数据
+
+        Returns:
+            bytes: 空数据，帧只由输出端发布
+        """
+        if self._pending:
+            data = self._pending + data
+        frame_size = self.layout.frame_size
+        sync = self.layout.sync
+        start = 0
+        while True:
+            count = (len(data) - start) // frame_size
+            if not count:
+                break
+            if sync:
+                valid = self._valid_frames(data, start, count)
+                if valid < count:
+                    # 发布错位之前的帧，从错位帧之后查找下一个同步标记
+                    self._publish(data, start, valid)
+                    bad = start + valid * frame_size
+                    if self._synced or valid:
+                        self.misalignments += 1
+                    self._synced = False
+                    found = data.find(sync, bad + 1)
+                    if found < 0:
+                        # 末尾可能是被截断的同步标记，留到下一次
+                        start = max(bad + 1, len(data) - len(sync) + 1)
+                        self.skipped_bytes += start - bad
+                        break
+                    self.skipped_bytes += found - bad
+                    start = found
+                    continue
+                self._synced = True
+            self._publish(data, start, count)
+            start += count * frame_size
+            break
+        self._pending = data[start:]
+        return b""
+
+    def _valid_frames(self, data, start, count):
+        """检查从start开始的count帧的同步标记，返回第一个错位帧之前的帧数"""
+        numpy = self._numpy
+        rows = self._frombuffer(data, dtype="u1", count=count * self.layout.frame_size, offset=start)
+        matches = (rows.reshape(count, self.layout.frame_size)[:, :len(self._sync)] == self._sync).all(axis=1)
+        if matches.all():
+            return count
+        return int(numpy.argmin(matches))
+
+    def _publish(self, data, start, count):
+        """将从start开始的count帧交给各输出端"""
+        if not count:
+            return
+        frames = self._frombuffer(data, dtype=self.layout.dtype, count=count, offset=start)
+        first_frame = self.frames
+        self.frames += count
+        for sink in self.sinks:
+            try:
+                sink.write(frames, first_frame)
+            except Exception as e:
+                self.logger.error(f"发布遥测数据失败: {str(e)}")
+
+    def close(self):
+        """关闭所有输出端，须在读取线程停止后调用"""
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                self.logger.error(f"关闭遥测输出端失败: {str(e)}")
+        self.sinks = []
+
+    def report(self):
+        """生成解码统计文本"""
+        datagrams = sum(getattr(sink, "datagrams_sent", 0) for sink in self.sinks)
+        if self.layout.sync:
+            alignment = f"帧错位 {self.misalignments} 次，重新同步跳过 {self.skipped_bytes} 字节"
+        else:
+            alignment = "未配置同步标记，无法发现帧错位"
+        return (f"遥测: 已解码 {self.frames} 帧，发送 {datagrams} 个信号数据报，"
+                f"未完整帧 {len(self._pending)} 字节，{alignment}")
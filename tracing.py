@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数据路径追踪模块
+数据路径只把事件编号、数值参数和时间戳写入固定容量的二进制环形缓冲区，
+只有在输出或实时跟踪时才格式化为文本；重复的相同错误按时间间隔限流并汇总次数
+"""
+
+import array
+import logging
+import threading
+import time
+
+# 每条事件占用的槽位：时间戳、事件编号和三个数值参数
+RECORD_SIZE = 5
+
+# 字符串参数表的最大条目数，超过后淘汰最早的字符串，编号不复用
+MAX_STRINGS = 256
+
+# 事件编号
+EVT_BUFFER_STATUS = 1
+EVT_BUFFER_STATUS_UNAVAILABLE = 2
+EVT_RTT_READ = 3
+EVT_RTT_READ_ERROR = 4
+EVT_RTT_WRITE = 5
+EVT_RTT_WRITE_ERROR = 6
+EVT_HALT_CHECK_ERROR = 7
+EVT_SLOW_PROBE_CALL = 8
+EVT_UDP_SEND = 9
+EVT_UDP_SEND_ERROR = 10
+EVT_MEMORY_SAMPLE = 11
+
+# 事件编号 -> (名称, 日志级别, 格式模板, 字符串参数的位置)
+EVENTS = {
+    EVT_BUFFER_STATUS: ("buffer_status", logging.DEBUG, "RTT缓冲区已使用: {0} 字节，读取: {1} 字节", ()),
+    EVT_BUFFER_STATUS_UNAVAILABLE: (
+        "buffer_status_unavailable", logging.DEBUG, "获取RTT缓冲区状态失败: {0}，使用默认读取大小", (0,)
+    ),
+    EVT_RTT_READ: ("rtt_read", logging.DEBUG, "RTT读取 {0} 字节", ()),
+    EVT_RTT_READ_ERROR: ("rtt_read_error", logging.ERROR, "读取RTT数据失败: {0}", (0,)),
+    EVT_RTT_WRITE: ("rtt_write", logging.DEBUG, "RTT写入 {0} 字节", ()),
+    EVT_RTT_WRITE_ERROR: ("rtt_write_error", logging.ERROR, "写入RTT数据失败: {0}", (0,)),
+    EVT_HALT_CHECK_ERROR: ("halt_check_error", logging.DEBUG, "检查目标暂停状态失败: {0}", (0,)),
+    EVT_SLOW_PROBE_CALL: ("slow_probe_call", logging.WARNING, "探针调用耗时异常: {0}ms", ()),
+    EVT_UDP_SEND: ("udp_send", logging.DEBUG, "UDP发送 {0} 字节", ()),
+    EVT_UDP_SEND_ERROR: ("udp_send_error", logging.ERROR, "发送数据失败: {0}", (0,)),
+    EVT_MEMORY_SAMPLE: ("memory_sample", logging.DEBUG, "内存采样 {0} 字节，{1} 次读取", ()),
+}
+
+
+class TraceRing:
+    def __init__(self, capacity=4096):
+        """创建追踪事件环形缓冲区
+
+        Args:
+            capacity: 保留的事件数，写满后覆盖最早的事件
+        """
+        self.capacity = max(1, capacity)
+        self._buffer = array.array("d", bytes(8 * RECORD_SIZE * self.capacity))
+        self._position = 0  # 累计写入的事件数
+        # 读取线程、发送线程和接收线程共用一个缓冲区，锁只保护一次槽位写入
+        self._lock = threading.Lock()
+        self._strings = {}  # 字符串编号 -> 字符串，按编号顺序淘汰
+        self._string_ids = {}
+        self._next_string_id = 0
+        self._error_ids = {}  # (异常类型, 错误码) -> 字符串编号
+        self.evicted_strings = 0  # 被淘汰的字符串数
+        # 单调时钟到系统时间的偏移，仅在格式化时使用
+        self._wall_offset = time.time() - time.monotonic()
+
+    @property
+    def position(self):
+        """累计写入的事件数，可作为从当前位置开始读取的游标"""
+        return self._position
+
+    def intern(self, text):
+        """将字符串参数转换为数值，相同的字符串只保存一次
+
+        表满时淘汰最早的字符串，不同的字符串始终得到不同的编号，限流不会把不同的错误合并
+        """
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            with self._lock:
+                string_id = self._string_ids.get(text)
+                if string_id is None:
+                    if len(self._strings) >= MAX_STRINGS:
+                        oldest = next(iter(self._strings))
+                        del self._string_ids[self._strings.pop(oldest)]
+                        self.evicted_strings += 1
+                    string_id = self._next_string_id
+                    self._next_string_id += 1
+                    self._strings[string_id] = text
+                    self._string_ids[text] = string_id
+        return string_id
+
+    def intern_error(self, error):
+        """将异常转换为字符串参数
+
+        有错误码的异常按 (类型, 错误码) 缓存编号，重复出现时不再格式化异常消息；
+        没有错误码的异常按消息文本转换
+        """
+        code = getattr(error, "code", None)
+        if code is None:
+            code = getattr(error, "errno", None)
+        if code is None:
+            return self.intern(str(error))
+        key = (type(error), code)
+        string_id = self._error_ids.get(key)
+        if string_id is None or string_id not in self._strings:
+            string_id = self.intern(str(error))
+            self._error_ids[key] = string_id
+        return string_id
+
+    def record(self, event_id, arg0=0, arg1=0, arg2=0):
+        """记录一个事件，参数只能是数值"""
+        timestamp = time.monotonic()
+        with self._lock:
+            index = (self._position % self.capacity) * RECORD_SIZE
+            buffer = self._buffer
+            buffer[index] = timestamp
+            buffer[index + 1] = event_id
+            buffer[index + 2] = arg0
+            buffer[index + 3] = arg1
+            buffer[index + 4] = arg2
+            self._position += 1
+
+    def read(self, cursor, max_count=None):
+        """从游标位置读取事件
+
+        Args:
+            cursor: 上一次读取返回的游标
+            max_count: 最多读取的事件数，None表示读取全部可用事件
+
+        Returns:
+            tuple: (事件列表, 新游标, 因被覆盖而跳过的事件数)，
+                每个事件为 (时间戳, 事件编号, 参数0, 参数1, 参数2)
+        """
+        with self._lock:
+            position = self._position
+            oldest = max(0, position - self.capacity)
+            skipped = max(0, oldest - cursor)
+            cursor = max(cursor, oldest)
+            end = position if max_count is None else min(position, cursor + max_count)
+            events = []
+            for sequence in range(cursor, end):
+                index = (sequence % self.capacity) * RECORD_SIZE
+                events.append(tuple(self._buffer[index:index + RECORD_SIZE]))
+        return events, end, skipped
+
+    def recent(self, count):
+        """读取最近的count个事件"""
+        events, _, _ = self.read(max(0, self._position - count))
+        return events
+
+    def message(self, event_id, args):
+        """将事件编号和参数格式化为日志消息"""
+        name, _, template, string_args = EVENTS.get(int(event_id), (None, None, "未知事件 {0} {1} {2}", ()))
+        values = []
+        for position, value in enumerate(args):
+            if position in string_args:
+                value = int(value)
+                values.append(self._strings.get(value, f"<已淘汰的字符串 #{value}>"))
+            else:
+                values.append(int(value) if float(value).is_integer() else round(value, 3))
+        return template.format(*values)
+
+    def format(self, event):
+        """将一个事件格式化为一行文本"""
+        timestamp, event_id = event[0], event[1]
+        wall = timestamp + self._wall_offset
+        name = EVENTS.get(int(event_id), ("unknown",))[0]
+        clock = time.strftime("%H:%M:%S", time.localtime(wall)) + f".{int(wall % 1 * 1e6):06d}"
+        return f"{clock} [{name}] {self.message(event_id, event[2:])}"
+
+
+class ErrorLimiter:
+    def __init__(self, logger, trace, interval=5.0):
+        """创建错误日志限流器
+
+        每个事件都写入追踪缓冲区；相同事件和参数的日志在interval秒内只输出一次，
+        期间被抑制的次数在下一次输出或flush时汇总
+
+        Args:
+            logger: 输出日志的记录器
+            trace: 追踪事件环形缓冲区
+            interval: 相同错误的最小日志间隔，单位秒
+        """
+        self.logger = logger
+        self.trace = trace
+        self.interval = interval
+        self._states = {}  # (事件编号, 参数) -> [上次输出时间, 之后被抑制的次数]
+
+    def report(self, event_id, arg0=0, arg1=0, arg2=0):
+        """记录一个错误事件，按限流规则输出日志"""
+        self.trace.record(event_id, arg0, arg1, arg2)
+        key = (event_id, arg0, arg1, arg2)
+        now = time.monotonic()
+        state = self._states.get(key)
+        if state is not None and now - state[0] < self.interval:
+            state[1] += 1
+            return
+
+        suppressed = state[1] if state is not None else 0
+        self._states[key] = [now, 0]
+        message = self.trace.message(event_id, (arg0, arg1, arg2))
+        if suppressed:
+            message += f"（过去 {now - state[0]:.1f} 秒内另有 {suppressed} 次相同错误）"
+        self.logger.log(EVENTS[event_id][1], message)
+
+    def report_error(self, event_id, error):
+        """以异常作为字符串参数记录错误事件"""
+        self.report(event_id, self.trace.intern_error(error))
+
+    def flush(self):
+        """输出所有被抑制的错误的汇总"""
+        for key, (_, suppressed) in list(self._states.items()):
+            if suppressed:
+                message = self.trace.message(key[0], key[1:])
+                self.logger.log(EVENTS[key[0]][1], f"{message}（另有 {suppressed} 次相同错误未输出）")
+        self._states.clear()
@@ -9,12 +9,25 @@ UDP管理器模块
 import socket
 import logging
 import select
+import time
+from profiling import SpanHistogram
+from tracing import TraceRing, ErrorLimiter, EVT_UDP_SEND, EVT_UDP_SEND_ERROR
 
 class UDPManager:
-    def __init__(self, config):
+    def __init__(self, config, trace=None):
         self.config = config
         self.socket = None
         self.logger = logging.getLogger(__name__)
+        
+        # 发送事件只写入追踪缓冲区，发送错误日志按间隔限流
+        self.trace = trace or TraceRing(config.trace_buffer_events)
+        self.error_limiter = ErrorLimiter(self.logger, self.trace, config.error_log_interval)
+        
+        # 发送耗时，单位纳秒，每个直方图只由一个线程写入
+        self.spans = {
+            "sendto": SpanHistogram(),  # 发送线程发送到目标地址
+            "stage_sendto": SpanHistogram(),  # 读取线程中数据处理阶段发送到各自的目标
+        }
     
     def setup(self):
         """设置UDP socket"""
@@ -51,15 +64,31 @@ class UDPManager:
             return False
     
     def send_data(self, data):
-        """发送数据"""
+        """发送数据到目标地址，由发送线程调用"""
+        return self._send(data, self.target_addr, self.spans["sendto"])
+    
+    def send_to(self, data, addr):
+        """发送数据到指定地址，由读取线程中的数据处理阶段调用
+        
+        Args:
+            data: 要发送的数据
+            addr: 目标地址 (IP, 端口)
+        """
+        return self._send(data, addr, self.spans["stage_sendto"])
+    
+    def _send(self, data, addr, span):
+        """发送数据并记录耗时到调用线程对应的直方图"""
         if not self.socket or not data:
             return False
         
         try:
-            self.socket.sendto(data, self.target_addr)
+            send_start = time.perf_counter_ns()
+            self.socket.sendto(data, addr)
+            span.record(time.perf_counter_ns() - send_start)
+            self.trace.record(EVT_UDP_SEND, len(data))
             return True
         except Exception as e:
-            self.logger.error(f"发送数据失败: {str(e)}")
+            self.error_limiter.report_error(EVT_UDP_SEND_ERROR, e)
             return False
     
     def receive_data(self, timeout=0.1, max_size=8192):
@@ -101,6 +130,7 @@ class UDPManager:
         """关闭UDP socket"""
         try:
             if self.socket:
+                self.error_limiter.flush()
                 self.logger.info("关闭UDP socket...")
                 try:
                     self.socket.close()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程模式会话模块
+每个探针的RTT读取和UDP发送在独立的工作进程中运行，避免多个高速探针和GUI争用GIL；
+控制进程只通过控制消息和共享内存统计与工作进程通信，数据不经过控制进程
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+from config import Config
+from probe_pool import ProbePool
+from session import ProbeSession, STAT_FIELDS
+from profiling import SamplingProfiler
+
+# 工作进程发布统计的间隔，单位秒
+STATS_PUBLISH_INTERVAL = 0.2
+
+# 控制消息
+CMD_STOP = "stop"
+CMD_DUMP_PROFILE = "dump_profile"
+CMD_DUMP_TRACE = "dump_trace"
+CMD_SAMPLE_PROFILE = "sample_profile"  # 以 (命令, 结果文件路径, 时长) 发送
+CMD_WRITE = "write"  # 以 (命令, 数据) 发送，由工作进程的下行转发线程写入RTT
+
+# 事件消息
+EVENT_STARTED = "started"
+EVENT_CONNECTION_LOST = "connection_lost"
+EVENT_STOPPED = "stopped"
+
+
+def _publish_stats(session, stats_array):
+    """将会话统计写入共享内存"""
+    stats = session.stats()
+    for index, name in enumerate(STAT_FIELDS):
+        stats_array[index] = stats[name]
+
+
+def _worker_main(serial_number, config_file, config_data, log_level, control_queue, event_queue, stats_array):
+    """工作进程入口
+
+    Args:
+        config_file: 控制进程使用的配置文件路径
+        config_data: 控制进程序列化的会话配置，工作进程只使用该配置，不读取或写入配置文件
+    """
+    # 日志记录通过事件队列交给控制进程输出
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [logging.handlers.QueueHandler(event_queue)]
+    root_logger.setLevel(log_level)
+
+    config = Config(config_file, load=False)
+    config.update_from_dict(config_data)
+    config.auto_save = False
+    config.terminal_buffer_size = 0
+
+    connection_lost = threading.Event()
+    probe_pool = ProbePool()
+    session = ProbeSession(serial_number, config, probe_pool,
+                           on_connection_lost=lambda _: connection_lost.set())
+
+    started = session.start()
+    event_queue.put((EVENT_STARTED, started))
+    if not started:
+        probe_pool.close_all()
+        event_queue.put((EVENT_STOPPED,))
+        return
+
+    sampler = SamplingProfiler(config.profile_sample_interval)
+    try:
+        while True:
+            _publish_stats(session, stats_array)
+            if config.trace_tail:
+                session.tail_trace()
+            if connection_lost.is_set():
+                event_queue.put((EVENT_CONNECTION_LOST,))
+                break
+            try:
+                command = control_queue.get(timeout=STATS_PUBLISH_INTERVAL)
+            except queue.Empty:
+                continue
+            if command == CMD_STOP:
+                break
+            if command == CMD_DUMP_PROFILE:
+                session.dump_profile()
+            elif command == CMD_DUMP_TRACE:
+                session.dump_trace()
+            elif isinstance(command, tuple) and command[0] == CMD_SAMPLE_PROFILE:
+                sampler.start(command[1], command[2])
+            elif isinstance(command, tuple) and command[0] == CMD_WRITE:
+                session.write_terminal(command[1])
+    finally:
+        sampler.stop()
+        session.stop()
+        probe_pool.close_all()
+        _publish_stats(session, stats_array)
+        event_queue.put((EVENT_STOPPED,))
+
+
+class ProcessProbeSession:
+    def __init__(self, serial_number, config, probe_pool=None, on_connection_lost=None):
+        """创建进程模式探针会话，接口与ProbeSession一致
+
+        Args:
+            serial_number: JLink设备序列号
+            config: 该会话使用的配置，通常由Config.for_session生成
+            probe_pool: 控制进程的探针会话池，启动前关闭其中该探针的句柄，由工作进程独占打开
+            on_connection_lost: 连接丢失回调函数，参数为会话本身
+        """
+        self.serial_number = str(serial_number)
+        self.config = config
+        self.probe_pool = probe_pool
+        self.logger = logging.getLogger(__name__)
+        self.on_connection_lost = on_connection_lost
+        self.running = False
+        self.terminal = None  # 数据不经过控制进程，不提供终端数据
+
+        self._context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.control_queue = None
+        self.event_queue = None
+        self.stats_array = None
+        self.event_thread = None
+        self._started_event = threading.Event()
+        self._start_result = False
+
+    def start(self):
+        """启动工作进程并等待会话连接完成"""
+        if self.running:
+            self.logger.warning(f"会话 {self.serial_number} 已经在运行")
+            return False
+
+        # JLink探针只能被一个进程打开，控制进程中复用的句柄须先关闭
+        if self.probe_pool:
+            self.probe_pool.discard(self.serial_number)
+
+        self.control_queue = self._context.Queue()
+        self.event_queue = self._context.Queue()
+        # 统计写入方只有工作进程，读取方容忍撕裂，无需加锁
+        self.stats_array = self._context.Array("d", len(STAT_FIELDS), lock=False)
+        self._started_event.clear()
+        self._start_result = False
+
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                self.serial_number,
+                self.config.config_file,
+                self.config.to_dict(),
+                logging.getLogger().getEffectiveLevel(),
+                self.control_queue,
+                self.event_queue,
+                self.stats_array,
+            ),
+            name=f"rtt2udp-{self.serial_number}",
+        )
+        self.process.daemon = True
+        self.process.start()
+
+        self.event_thread = threading.Thread(target=self._event_loop)
+        self.event_thread.daemon = True
+        self.event_thread.start()
+
+        # 等待工作进程完成连接，超时包含三个就绪等待阶段以及进程启动和模块导入时间
+        timeout = 3 * self.config.connect_timeout + 15.0
+        if not self._started_event.wait(timeout) or not self._start_result:
+            self.logger.error(f"会话 {self.serial_number} 的工作进程启动失败")
+            self._shutdown_process()
+            return False
+
+        self.running = True
+        self.logger.info(f"会话 {self.serial_number} 已在独立进程中启动 (PID {self.process.pid})")
+        return True
+
+    def stop(self):
+        """停止工作进程"""
+        self.running = False
+        self._shutdown_process()
+
+    def stats(self):
+        """从共享内存读取会话统计计数"""
+        if self.stats_array is None:
+            return {name: 0 for name in STAT_FIELDS}
+        return {name: self.stats_array[index] for index, name in enumerate(STAT_FIELDS)}
+
+    def dump_profile(self):
+        """请求工作进程将各阶段耗时输出到日志"""
+        if self.running:
+            self.control_queue.put(CMD_DUMP_PROFILE)
+
+    def dump_trace(self):
+        """请求工作进程将最近的追踪事件输出到日志"""
+        if self.running:
+            self.control_queue.put(CMD_DUMP_TRACE)
+
+    def tail_trace(self):
+        """追踪事件由工作进程按trace_tail配置自行输出"""
+        pass
+
+    def write_terminal(self, data):
+        """将数据发送给工作进程写入RTT下行通道
+
+        Returns:
+            bool: 是否已加入控制队列
+        """
+        if not self.running:
+            return False
+        self.control_queue.put((CMD_WRITE, bytes(data)))
+        return True
+
+    def sample_profile(self, path, duration):
+        """请求工作进程采样分析，结果写入path"""
+        if not self.running:
+            return False
+        self.control_queue.put((CMD_SAMPLE_PROFILE, path, duration))
+        return True
+
+    def describe(self):
+        """获取会话的显示信息"""
+        return {
+            "serial": self.serial_number,
+            "target_device": self.config.target_device,
+            "destination": f"{self.config.udp_ip}:{self.config.udp_port}",
+            "status": "运行中(进程)" if self.running else "已停止",
+        }
+
+    def _shutdown_process(self):
+        """请求工作进程退出，超时后强制结束"""
+        if self.process is None:
+            return
+
+        if self.process.is_alive():
+            self.control_queue.put(CMD_STOP)
+            self.process.join(timeout=10.0)
+            if self.process.is_alive():
+                self.logger.warning(f"会话 {self.serial_number} 的工作进程未能在超时时间内结束，强制终止")
+                self.process.terminate()
+                self.process.join(timeout=2.0)
+
+        if self.event_thread and self.event_thread.is_alive():
+            self.event_thread.join(timeout=2.0)
+        self.event_thread = None
+        self.process = None
+
+    def _event_loop(self):
+        """转发工作进程的日志和事件"""
+        while True:
+            try:
+                item = self.event_queue.get(timeout=0.5)
+            except queue.Empty:
+                process = self.process
+                if process is None or not process.is_alive():
+                    break
+                continue
+            except (EOFError, OSError):
+                break
+
+            if isinstance(item, logging.LogRecord):
+                logging.getLogger(item.name).handle(item)
+                continue
+
+            event = item[0]
+            if event == EVENT_STARTED:
+                self._start_result = item[1]
+                self._started_event.set()
+            elif event == EVENT_CONNECTION_LOST:
+                if self.on_connection_lost:
+                    self.on_connection_lost(self)
+            elif event == EVENT_STOPPED:
+                break
+
+        # 工作进程意外退出时不再等待启动结果
+        self._started_event.set()